@@ -287,6 +287,16 @@ MEDIA_ROOT = get_environment_variable(
     default_value=str(pathlib.Path(BASE_DIR).parent / "media"),
 )
 
+# collected points older than POINT_ARCHIVE_AGE_DAYS are moved to compressed
+# monthly files in this directory by the ``archivepoints`` command
+POINT_ARCHIVE_DIR = get_environment_variable(
+    "DJANGO_POINT_ARCHIVE_DIR",
+    default_value=str(pathlib.Path(BASE_DIR).parent / "archive" / "points"),
+)
+
+POINT_ARCHIVE_AGE_DAYS = int(
+    get_environment_variable("DJANGO_POINT_ARCHIVE_AGE_DAYS", "365"))
+
 FCM_DJANGO_SETTINGS = {
     "FCM_SERVER_KEY": get_environment_variable("FCM_SERVER_KEY"),
     "ONE_DEVICE_PER_USER": False,
@@ -10,6 +10,7 @@
 
 from collections import namedtuple
 from functools import partial
+import itertools
 import logging
 import pathlib
 
@@ -33,7 +34,17 @@ FieldDef = namedtuple("FieldDef", [
 
 
 def export_collected_points(collected_points, output_path: pathlib.Path,
-                            driver_name="CSV"):
+                            driver_name="CSV", archived_points=None):
+    """Export collected points with OGR
+
+    ``archived_points`` are points read back from the cold archive, see
+    ``tracks.archive.iter_archived_points``. They are exported before the
+    ``collected_points``, as they are older.
+
+    """
+
+    if archived_points is not None:
+        collected_points = itertools.chain(archived_points, collected_points)
     geom_attribute_name = "the_geom"
     fields = [
         FieldDef(
@@ -137,8 +148,14 @@ def export_collected_points(collected_points, output_path: pathlib.Path,
 
 
 def export_segments(segments, output_path: pathlib.Path,
-                    driver_name="ESRI Shapefile"):
-    """Export segments with OGR"""
+                    driver_name="ESRI Shapefile",
+                    resolution=tracks.models.FULL_RESOLUTION):
+    """Export segments with OGR
+
+    ``resolution`` selects which of the segment geometries is exported.
+
+    """
+
     fields = [
         FieldDef(
             "track", ogr.OFTInteger,
@@ -175,70 +192,73 @@ def export_segments(segments, output_path: pathlib.Path,
             get_speed, None),
         FieldDef(
             "so2_spent", ogr.OFTReal,
-            _get_related_model, ("emission", "so2",)),
+            _get_related_model, ("metrics", "so2",)),
         FieldDef(
             "nox_spent", ogr.OFTReal,
-            _get_related_model, ("emission", "nox",)),
+            _get_related_model, ("metrics", "nox",)),
         FieldDef(
             "co2_spent", ogr.OFTReal,
-            _get_related_model, ("emission", "co2",)),
+            _get_related_model, ("metrics", "co2",)),
         FieldDef(
             "co_spent", ogr.OFTReal,
-            _get_related_model, ("emission", "co",)),
+            _get_related_model, ("metrics", "co",)),
         FieldDef(
             "pm10_spent", ogr.OFTReal,
-            _get_related_model, ("emission", "pm10",)
+            _get_related_model, ("metrics", "pm10",)
         ),
         FieldDef(
             "so2_saved", ogr.OFTReal,
-            _get_related_model, ("emission", "so2_saved",)
+            _get_related_model, ("metrics", "so2_saved",)
         ),
         FieldDef(
             "nox_saved", ogr.OFTReal,
-            _get_related_model, ("emission", "nox_saved",)
+            _get_related_model, ("metrics", "nox_saved",)
         ),
         FieldDef(
             "co2_saved", ogr.OFTReal,
-            _get_related_model, ("emission", "co2_saved",)
+            _get_related_model, ("metrics", "co2_saved",)
         ),
         FieldDef(
             "co_saved", ogr.OFTReal,
-            _get_related_model, ("emission", "co_saved",)
+            _get_related_model, ("metrics", "co_saved",)
         ),
         FieldDef(
             "pm10_saved", ogr.OFTReal,
-            _get_related_model, ("emission", "pm10_saved",)
+            _get_related_model, ("metrics", "pm10_saved",)
         ),
         FieldDef(
             "cost_fuel", ogr.OFTReal,
-            _get_related_model, ("cost", "fuel_cost",)
+            _get_related_model, ("metrics", "fuel_cost",)
         ),
         FieldDef(
             "cost_time", ogr.OFTReal,
-            _get_related_model, ("cost", "time_cost",)
+            _get_related_model, ("metrics", "time_cost",)
         ),
         FieldDef(
             "cost_depreciation"[:10], ogr.OFTReal,
-            _get_related_model, ("cost", "depreciation_cost",)
+            _get_related_model, ("metrics", "depreciation_cost",)
         ),
         FieldDef(
             "cost_operation"[:10], ogr.OFTReal,
-            _get_related_model, ("cost", "operation_cost",)
+            _get_related_model, ("metrics", "operation_cost",)
         ),
         FieldDef(
             "cost_total", ogr.OFTReal,
-            _get_related_model, ("cost", "total_cost",)
+            _get_related_model, ("metrics", "total_cost",)
         ),
         FieldDef(
             "calories_consumed"[:10], ogr.OFTReal,
-            _get_related_model, ("health", "calories_consumed",)
+            _get_related_model, ("metrics", "calories_consumed",)
         ),
         FieldDef(
             "benefit_index"[:10], ogr.OFTReal,
-            _get_related_model, ("health", "benefit_index",)
+            _get_related_model, ("metrics", "benefit_index",)
         ),
     ]
-    return _export_model_with_ogr(segments, output_path, fields, driver_name)
+    return _export_model_with_ogr(
+        segments, output_path, fields, driver_name,
+        geom_getter=partial(_get_resolution_geom, resolution=resolution)
+    )
 
 
 def export_observations(observations, output_path: pathlib.Path,
@@ -387,10 +407,7 @@ def get_coordinate(model_obj, coordinate: str, geometry_attribute_name):
 
 
 def get_minutes(segment: tracks.models.Segment):
-    duration = segment.duration
-    day_minutes = duration.days * 24 * 60
-    second_minutes = duration.seconds / 60
-    return day_minutes + second_minutes
+    return segment.get_duration_seconds() / 60
 
 
 def get_segment_owner_info(segment: tracks.models.Segment, attribute,
@@ -429,7 +446,7 @@ def get_competition_age_groups(winner: prizes.models.Winner):
 
 def _export_model_with_ogr(objects, output_path: pathlib.Path,
                            field_definitions, driver_name="ESRI Shapefile",
-                           geom_attribute_name="geom"):
+                           geom_attribute_name="geom", geom_getter=None):
     driver = ogr.GetDriverByName(driver_name)
     data_source = driver.CreateDataSource(str(output_path))
     layer = data_source.CreateLayer(
@@ -440,7 +457,10 @@ def _export_model_with_ogr(objects, output_path: pathlib.Path,
     for obj in objects:
         feature_def = layer.GetLayerDefn()
         feature = ogr.Feature(feature_def)
-        django_geom = getattr(obj, geom_attribute_name, None)
+        if geom_getter is not None:
+            django_geom = geom_getter(obj)
+        else:
+            django_geom = getattr(obj, geom_attribute_name, None)
         if django_geom is not None:
             ogr_geom = ogr.CreateGeometryFromWkb(bytes(django_geom.wkb))
             feature.SetGeometry(ogr_geom)
@@ -452,6 +472,10 @@ def _export_model_with_ogr(objects, output_path: pathlib.Path,
     data_source = None
 
 
+def _get_resolution_geom(obj, resolution: str):
+    return obj.get_geom(resolution)
+
+
 def _get_field_value(obj, field_def):
     handler = partial(field_def.value_getter, obj)
     args = field_def.value_getter_args
@@ -11,6 +11,7 @@
 import datetime as dt
 from functools import partial
 import io
+import itertools
 import pathlib
 import logging
 import shutil
@@ -26,7 +27,9 @@ from django.http import HttpResponse
 
 from dashboard import exporter
 from prizes.models import Winner
+from tracks import archive
 from tracks.models import CollectedPoint
+from tracks.models import PackedPoints
 from tracks.models import Segment
 from tracks.models import Track
 from vehicles.models import Bike
@@ -163,11 +166,14 @@ def _get_observations(start_date: Optional[dt.datetime],
 def _get_segments(start_date: dt.datetime, end_date: dt.datetime):
     output_dir = pathlib.Path(tempfile.mkdtemp())
     output_path = output_dir / "segments.shp"
-    segments_qs = Segment.objects.all()
+    segments_qs = Segment.objects.select_related("metrics")
     if start_date is not None:
         segments_qs = segments_qs.filter(start_date__gte=start_date)
     if end_date is not None:
-        segments_qs = segments_qs.filter(end_date__lte=end_date)
+        # filtering on start_date too lets postgres skip the partitions of
+        # later months
+        segments_qs = segments_qs.filter(
+            start_date__lte=end_date, end_date__lte=end_date)
     exporter.export_segments(segments_qs, output_path)
     zip_buffer = io.BytesIO()
     with zipfile.ZipFile(zip_buffer, mode="w") as zh:
@@ -230,7 +236,23 @@ def _get_points(start_date: dt.datetime, end_date: dt.datetime,
         points_qs = points_qs.filter(track__in=tracks)
     if len(vehicle_types) != 0:
         points_qs = points_qs.filter(vehicle_type__in=vehicle_types)
-    exporter.export_collected_points(points_qs, output_path)
+    # tracks ingested with the packed storage mode have no point rows
+    packed_points = PackedPoints.objects.iter_points(
+        start_date=start_date,
+        end_date=end_date,
+        vehicle_types=vehicle_types,
+        tracks=tracks
+    )
+    archived_points = archive.iter_archived_points(
+        start_date=start_date,
+        end_date=end_date,
+        vehicle_types=vehicle_types,
+        tracks=tracks
+    )
+    exporter.export_collected_points(
+        itertools.chain(points_qs, packed_points), output_path,
+        archived_points=archived_points
+    )
     contents = io.BytesIO()
     with output_path.open("rb") as fh:
         contents.write(fh.read())
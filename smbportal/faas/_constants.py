@@ -25,6 +25,17 @@ class VehicleType(Enum):
     unknown = 9
 
 
+# mapping between the smb-app's vehicle modes and the portal's vehicle types
+APP_VEHICLE_TYPES = {
+    "1": VehicleType.foot,
+    "2": VehicleType.bike,
+    "3": VehicleType.bus,
+    "4": VehicleType.car,
+    "5": VehicleType.average_motorbike,  # moped
+    "6": VehicleType.train,
+}
+
+
 class Pollutant(Enum):
     so2 = 1
     nox = 2
@@ -203,3 +214,35 @@ HEALTH_BENEFIT_INDEX = {
         "maximum_percentage": 0.45
     },
 }
+
+# thresholds used by the ingestion validation pipeline
+
+MAXIMUM_AVERAGE_SPEED = {
+    "unit": "km/h",
+    VehicleType.foot: 20,
+    VehicleType.bike: 50,
+    VehicleType.scooter: 120,
+    VehicleType.motorbike: 200,
+    VehicleType.average_motorbike: 160,
+    VehicleType.bus: 120,
+    VehicleType.car: 200,
+    VehicleType.train: 350,
+}
+
+# consecutive points farther than this, at a speed that no vehicle reaches,
+# are considered a jump of the GPS position
+GPS_JUMP = {
+    "distance": (1000, "m"),
+    "speed": (500, "km/h"),
+}
+
+MINIMUM_TRACK_DURATION = (60, "s")
+
+MINIMUM_TRACK_LENGTH = (100, "m")
+
+# tracks whose median GPS accuracy is worse than this are not valid
+MAXIMUM_MEDIAN_ACCURACY = (50, "m")
+
+# tracks with a higher fraction of points whose timestamp is earlier than
+# the one of the previous point are not valid
+MAXIMUM_NON_MONOTONIC_FRACTION = 0.1
@@ -0,0 +1,107 @@
+#########################################################################
+#
+# Copyright 2018, GeoSolutions Sas.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+#
+#########################################################################
+
+"""Settings for the data ingestion functions
+
+These are read from environment variables, in order to keep the ``faas``
+package usable outside of the django project (e.g. as a cloud function).
+
+"""
+
+import os
+
+
+def get_environment_variable(var_name, default_value):
+    value = os.getenv(var_name)
+    return value if value is not None else default_value
+
+
+POINT_INSERTION_STRATEGY = get_environment_variable(
+    "SMB_POINT_INSERTION_STRATEGY", "copy")
+
+POINT_BATCH_SIZE = int(
+    get_environment_variable("SMB_POINT_BATCH_SIZE", "5000"))
+
+# objects larger than this (in bytes) are downloaded to a temporary file
+MAX_IN_MEMORY_DOWNLOAD_SIZE = int(
+    get_environment_variable("SMB_MAX_IN_MEMORY_DOWNLOAD_SIZE", "1048576"))
+
+DOWNLOAD_CHUNK_SIZE = int(
+    get_environment_variable("SMB_DOWNLOAD_CHUNK_SIZE", "65536"))
+
+# disable when connecting through a pooler that does not support prepared
+# statements, such as pgbouncer in transaction mode
+PREPARE_QUERIES = get_environment_variable(
+    "SMB_PREPARE_QUERIES", "true").lower() in ("true", "1")
+
+# either "s3" or "local"
+STORAGE_BACKEND = get_environment_variable("SMB_STORAGE_BACKEND", "s3")
+
+LOCAL_STORAGE_ROOT = get_environment_variable("SMB_LOCAL_STORAGE_ROOT", ".")
+
+# tolerances (in degrees) used when generating the simplified versions of
+# track and segment geometries
+SIMPLIFICATION_TOLERANCE_MEDIUM = float(
+    get_environment_variable("SMB_SIMPLIFICATION_TOLERANCE_MEDIUM", "0.00005"))
+
+SIMPLIFICATION_TOLERANCE_LOW = float(
+    get_environment_variable("SMB_SIMPLIFICATION_TOLERANCE_LOW", "0.0002"))
+
+# number of objects being downloaded at the same time by the asyncio fetcher
+MAX_CONCURRENT_DOWNLOADS = int(
+    get_environment_variable("SMB_MAX_CONCURRENT_DOWNLOADS", "8"))
+
+# number of downloaded objects that may wait to be ingested before the
+# fetcher stops starting new downloads
+DOWNLOAD_QUEUE_SIZE = int(
+    get_environment_variable("SMB_DOWNLOAD_QUEUE_SIZE", "4"))
+
+# when enabled, points are filtered before being stored in
+# tracks_collectedpoint. Segments and track data are still calculated from
+# all the points and the uploaded data files are kept unchanged
+FILTER_POINTS = get_environment_variable(
+    "SMB_FILTER_POINTS", "false").lower() in ("true", "1")
+
+# points with an accuracy (in meters) worse than this are not stored
+POINT_FILTER_MAX_ACCURACY = float(
+    get_environment_variable("SMB_POINT_FILTER_MAX_ACCURACY", "50"))
+
+# points that are closer than this (in seconds) to the previous stored
+# point are not stored
+POINT_FILTER_MIN_INTERVAL = float(
+    get_environment_variable("SMB_POINT_FILTER_MIN_INTERVAL", "1"))
+
+# points that are closer than this (in meters) to the previous stored point
+# are only stored once every SMB_POINT_FILTER_MAX_STATIONARY_INTERVAL
+# seconds
+POINT_FILTER_MIN_DISTANCE = float(
+    get_environment_variable("SMB_POINT_FILTER_MIN_DISTANCE", "5"))
+
+POINT_FILTER_MAX_STATIONARY_INTERVAL = float(
+    get_environment_variable(
+        "SMB_POINT_FILTER_MAX_STATIONARY_INTERVAL", "30"))
+
+# when enabled, the batches of tracks of ``datareceiver.ingest_objects`` (and
+# ``handle_track_uploads``) are loaded into UNLOGGED staging tables and then
+# moved to the real tables at the end of the transaction. Tracks that are
+# ingested one at a time stream their points straight into the real tables
+BATCH_USE_STAGING_TABLES = get_environment_variable(
+    "SMB_BATCH_USE_STAGING_TABLES", "false").lower() in ("true", "1")
+
+# seconds between the checks of a backfill ingestion that is waiting for
+# interactive ingestions to finish
+BACKFILL_POLL_INTERVAL = float(
+    get_environment_variable("SMB_BACKFILL_POLL_INTERVAL", "1"))
+
+# either "rows", which stores each point in tracks_collectedpoint, or
+# "packed", which stores all of a track's points as a single compressed row
+# of tracks_packedpoints
+POINT_STORAGE_MODE = get_environment_variable(
+    "SMB_POINT_STORAGE_MODE", "rows")
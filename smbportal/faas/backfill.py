@@ -0,0 +1,345 @@
+#########################################################################
+#
+# Copyright 2018, GeoSolutions Sas.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+#
+#########################################################################
+
+"""Recalculation of the segment metrics of existing tracks
+
+Segment emissions, costs and health data depend on the coefficients defined
+in ``_constants``. When those change, the metrics that have already been
+stored can be recalculated with:
+
+>>> report = recompute_metrics(
+...     db_params={"dbname": "smb", "user": "smb", "password": "smb"},
+...     since=dt.datetime(2018, 1, 1, tzinfo=pytz.utc),
+...     num_workers=4,
+...     checkpoint_path="recompute-checkpoint.json"
+... )
+>>> print(format_report(report))
+
+Tracks are processed in chunks, ordered by id. For each chunk, the
+segments' lengths and durations are read with a single query, metrics are
+calculated with the vectorized functions of the ``metrics`` module and then
+written with one multi-row upsert into the combined ``tracks_segmentmetrics``
+table, plus a single UPDATE for the tracks' ``aggregated_*`` data. Each
+chunk is committed on its own.
+
+After each chunk, the id of the last track whose chunk (and all of the
+previous ones) has been committed is saved to the checkpoint file. A later
+run with the same date range resumes after that track.
+
+"""
+
+from collections import namedtuple
+import datetime as dt
+import json
+import logging
+import multiprocessing
+import os
+import pathlib
+import time
+from typing import Callable
+from typing import List
+from typing import Optional
+from typing import Sequence
+
+import numpy as np
+
+from . import datareceiver
+from . import metrics
+from . import queries
+from ._constants import VehicleType
+
+logger = logging.getLogger(__name__)
+
+Checkpoint = namedtuple("Checkpoint", [
+    "since",
+    "until",
+    "last_track_id",
+])
+
+ChunkResult = namedtuple("ChunkResult", [
+    "last_track_id",
+    "tracks",
+    "segments",
+    "seconds",
+])
+
+BackfillReport = namedtuple("BackfillReport", [
+    "tracks",
+    "segments",
+    "seconds",
+    "segments_per_second",
+])
+
+# state of each worker process, set by the pool's initializer
+_worker_state = {}
+
+
+def recompute_metrics(db_params: dict, since: dt.datetime = None,
+                      until: dt.datetime = None, chunk_size: int = 500,
+                      num_workers: int = 1, checkpoint_path: str = None,
+                      progress: Callable[[ChunkResult], None] = None
+                      ) -> BackfillReport:
+    """Recalculate the segment metrics of tracks that started in a range
+
+    ``since`` is inclusive and ``until`` is exclusive. When neither is
+    given, all tracks are processed. ``db_params`` are passed to
+    ``datareceiver.get_db_connection``. When ``num_workers`` is greater
+    than one, chunks are distributed among a pool of worker processes.
+
+    If ``checkpoint_path`` points to a checkpoint of a previous run with the
+    same date range, tracks up to its ``last_track_id`` are skipped. The
+    checkpoint is removed once all tracks have been processed.
+
+    ``progress`` is called with the result of each chunk, in order.
+
+    """
+
+    after_id = 0
+    if checkpoint_path is not None:
+        checkpoint = load_checkpoint(checkpoint_path)
+        if checkpoint is not None:
+            if (checkpoint.since, checkpoint.until) != (
+                    _format_date(since), _format_date(until)):
+                raise RuntimeError(
+                    "Checkpoint {} belongs to a different date range".format(
+                        checkpoint_path)
+                )
+            after_id = checkpoint.last_track_id
+            logger.info("Resuming after track {}".format(after_id))
+    start = time.perf_counter()
+    connection = datareceiver.get_db_connection(**db_params)
+    try:
+        track_ids = get_track_ids(connection, since, until, after_id)
+    finally:
+        connection.close()
+    chunks = [
+        track_ids[index:index + chunk_size]
+        for index in range(0, len(track_ids), chunk_size)
+    ]
+    num_tracks = 0
+    num_segments = 0
+    pool = None
+    if num_workers > 1:
+        pool = multiprocessing.Pool(
+            processes=num_workers,
+            initializer=_init_worker,
+            initargs=(db_params,)
+        )
+        chunk_results = pool.imap(_recompute_chunk, chunks)
+    else:
+        _init_worker(db_params)
+        chunk_results = (_recompute_chunk(chunk) for chunk in chunks)
+    try:
+        # results come back in the same order as the chunks, so each one
+        # can move the checkpoint forward
+        for chunk_result in chunk_results:
+            num_tracks += chunk_result.tracks
+            num_segments += chunk_result.segments
+            if checkpoint_path is not None:
+                save_checkpoint(
+                    checkpoint_path,
+                    Checkpoint(
+                        since=_format_date(since),
+                        until=_format_date(until),
+                        last_track_id=chunk_result.last_track_id
+                    )
+                )
+            if progress is not None:
+                progress(chunk_result)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        else:
+            _close_worker()
+    if checkpoint_path is not None:
+        remove_checkpoint(checkpoint_path)
+    seconds = time.perf_counter() - start
+    return BackfillReport(
+        tracks=num_tracks,
+        segments=num_segments,
+        seconds=seconds,
+        segments_per_second=num_segments / seconds if seconds > 0 else 0
+    )
+
+
+def format_report(report: BackfillReport) -> str:
+    return (
+        "Recomputed {0.segments} segments of {0.tracks} tracks in "
+        "{0.seconds:.2f}s ({0.segments_per_second:.0f} segments/s)".format(
+            report)
+    )
+
+
+def get_track_ids(db_connection, since: dt.datetime = None,
+                  until: dt.datetime = None, after_id: int = 0) -> List[int]:
+    with db_connection:
+        with db_connection.cursor() as cursor:
+            queries.registry.execute(
+                cursor,
+                "get-backfill-track-ids.sql",
+                {"since": since, "until": until, "after_id": after_id}
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+def recompute_track_metrics(track_ids: Sequence[int], db_cursor) -> int:
+    """Recalculate the segment metrics and aggregated data of some tracks
+
+    Returns the number of segments that have been updated.
+
+    """
+
+    queries.registry.execute(
+        db_cursor,
+        "get-backfill-segments.sql",
+        {"track_ids": list(track_ids)}
+    )
+    rows = db_cursor.fetchall()
+    segment_ids = [row[0] for row in rows]
+    segment_track_ids = np.array([row[1] for row in rows], dtype=np.int64)
+    lengths_km = np.array([row[3] for row in rows], dtype=np.float64) / 1000
+    durations_hours = np.array(
+        [row[4] for row in rows], dtype=np.float64) / (60 * 60)
+    speeds_km_h = np.divide(
+        lengths_km,
+        durations_hours,
+        out=np.zeros_like(lengths_km),
+        where=durations_hours > 0
+    )
+    segment_metrics = metrics.calculate_segment_metrics(
+        vehicle_types=[VehicleType[row[2]].value for row in rows],
+        lengths_km=lengths_km,
+        durations_hours=durations_hours,
+        speeds_km_h=speeds_km_h,
+    )
+    values = [
+        segment_metrics[column].tolist()
+        for column in metrics.SEGMENT_METRICS_COLUMNS
+    ]
+    queries.registry.execute_values(
+        db_cursor,
+        "upsert-segmentmetrics-values.sql",
+        list(zip(*values, segment_ids)),
+        page_size=1000
+    )
+    aggregated = get_aggregated_metrics_by_track(
+        segment_track_ids, segment_metrics)
+    queries.registry.execute_values(
+        db_cursor,
+        "update-track-aggregated-values.sql",
+        [
+            (
+                track_id,
+                _get_json(aggregated.get(track_id), "emissions"),
+                _get_json(aggregated.get(track_id), "costs"),
+                _get_json(aggregated.get(track_id), "health"),
+            ) for track_id in track_ids
+        ],
+        page_size=1000
+    )
+    return len(segment_ids)
+
+
+def get_aggregated_metrics_by_track(track_ids: np.ndarray,
+                                    segment_metrics: dict) -> dict:
+    """Sum segment metrics for each track
+
+    ``track_ids`` holds the track of each segment and must be sorted.
+    Returns a mapping of track ids to the output of
+    ``metrics.get_aggregated_metrics``. Tracks without segments are not
+    included.
+
+    """
+
+    if len(track_ids) == 0:
+        return {}
+    unique_ids, starts = np.unique(track_ids, return_index=True)
+    sums = {
+        column: np.add.reduceat(values, starts)
+        for column, values in segment_metrics.items()
+    }
+    return {
+        int(track_id): metrics.get_aggregated_metrics(
+            {column: values[index:index + 1]
+             for column, values in sums.items()}
+        ) for index, track_id in enumerate(unique_ids)
+    }
+
+
+def load_checkpoint(path: str) -> Optional[Checkpoint]:
+    try:
+        with open(path, encoding="utf-8") as fh:
+            return Checkpoint(**json.load(fh))
+    except FileNotFoundError:
+        return None
+
+
+def save_checkpoint(path: str, checkpoint: Checkpoint):
+    # the checkpoint is replaced atomically, so that an interruption never
+    # leaves a partially written file
+    temporary_path = "{}.tmp".format(path)
+    with open(temporary_path, "w", encoding="utf-8") as fh:
+        json.dump(checkpoint._asdict(), fh)
+    os.replace(temporary_path, path)
+
+
+def remove_checkpoint(path: str):
+    try:
+        pathlib.Path(path).unlink()
+    except FileNotFoundError:
+        pass
+
+
+def _get_json(aggregated: Optional[dict], name: str):
+    value = aggregated[name] if aggregated is not None else None
+    return json.dumps(value) if value is not None else None
+
+
+def _format_date(value: Optional[dt.datetime]) -> Optional[str]:
+    return value.isoformat() if value is not None else None
+
+
+def _init_worker(db_params: dict):
+    # the connection is opened by the first chunk: should the initializer
+    # fail, the pool would keep replacing the worker and never return
+    _worker_state.update({
+        "db_params": db_params,
+        "db_connection": None,
+    })
+
+
+def _get_worker_connection():
+    connection = _worker_state["db_connection"]
+    if connection is None or connection.closed:
+        connection = datareceiver.get_db_connection(
+            **_worker_state["db_params"])
+        _worker_state["db_connection"] = connection
+    return connection
+
+
+def _close_worker():
+    connection = _worker_state.pop("db_connection", None)
+    if connection is not None:
+        connection.close()
+
+
+def _recompute_chunk(track_ids: List[int]) -> ChunkResult:
+    start = time.perf_counter()
+    connection = _get_worker_connection()
+    with connection:  # changes are committed when `with` block exits
+        with connection.cursor() as cursor:
+            num_segments = recompute_track_metrics(track_ids, cursor)
+    return ChunkResult(
+        last_track_id=track_ids[-1],
+        tracks=len(track_ids),
+        segments=num_segments,
+        seconds=time.perf_counter() - start
+    )
@@ -28,25 +28,48 @@ Workflow is something like:
 
 """
 
+import array
 from collections import namedtuple
+import contextlib
 import datetime as dt
 import io
+import itertools
 import logging
-import os
-import pathlib
 import re
+from typing import Iterable
+from typing import Iterator
 from typing import List
+from typing import Optional
+from typing import Tuple
 import zipfile
 
-import boto3
+import numpy as np
 import psycopg2
+from psycopg2.extras import Json
 import pytz
 
 from . import _constants
+from . import _settings
+from . import instrumentation
+from . import metrics
+from . import pointarrays
+from . import pointfilter
+from . import priorities
+from . import queries
+from . import segmentation
+from . import validation
 from ._constants import VehicleType
+from .priorities import INTERACTIVE
+from .storage import get_storage
+from .storage import ObjectMetadata
+from .storage import TrackStorage
 
 logger = logging.getLogger(__name__)
 
+# values of the SMB_POINT_STORAGE_MODE setting
+ROWS_STORAGE = "rows"
+PACKED_STORAGE = "packed"
+
 _DATA_FIELDS = [
     "accelerationX",
     "accelerationY",
@@ -74,14 +97,148 @@ _DATA_FIELDS = [
 ]
 
 PointData = namedtuple("PointData", _DATA_FIELDS)
-SegmentInfo = namedtuple("SegmentInfo", [
-    "id",
-    "vehicle_type",
-    "length_km",
-    "duration_hours",
-    "speed_km_h"
+
+# column of each PointData field in a data file that has the app's header.
+# Fields that are missing from a file's header have no column
+_DEFAULT_FIELD_COLUMNS = list(range(len(_DATA_FIELDS)))
+
+# database columns of tracks_collectedpoint and the PointData fields that
+# hold their values
+_POINT_SENSOR_FIELDS = pointarrays.SENSOR_FIELDS
+
+_POINT_VALUES_TEMPLATE = "({})".format(", ".join(
+    ["%s", "%s", "ST_SetSRID(ST_MakePoint(%s, %s), 4326)"] +
+    ["%s"] * (len(_POINT_SENSOR_FIELDS) + 2)
+))
+
+_COPY_ESCAPES = str.maketrans({
+    "\\": "\\\\",
+    "\t": "\\t",
+    "\n": "\\n",
+    "\r": "\\r",
+})
+
+IngestionResult = namedtuple("IngestionResult", [
+    "track_id",
+    "session_id",
+    "num_points",  # stored points, which may be fewer than the parsed ones
+    "num_segments",
+])
+
+BatchItemResult = namedtuple("BatchItemResult", [
+    "object_key",
+    "result",  # IngestionResult, or None if the object was not ingested
+    "error",  # the exception that prevented ingestion, if any
 ])
 
+# a track of a batch, whose points and segments have not been saved yet
+_BatchTrack = namedtuple("_BatchTrack", [
+    "object_key",
+    "track_id",
+    "track_owner",
+    "session_id",
+    "track_points",  # pointarrays.TrackPointArrays
+    "copy_data",  # None when points are stored packed
+    "packed_points_row",  # None when points are stored as rows
+    "num_stored_points",
+    "validation_error",
+    "segments",
+    "segment_metrics",
+])
+
+
+class DuplicateTrackError(RuntimeError):
+    pass
+
+
+class TrackPointsSummary:
+    """Keeps the coordinates, timestamps and vehicle types of a track's points
+
+    Points are recorded while they are being inserted, which allows
+    validating the track and computing its segments, geometry, dates and
+    duration without reading the collected points back from the database.
+
+    Memory is linear in the number of points, about 25 bytes for each one.
+    This is all that is kept of a track on the streaming path, where parsed
+    points are otherwise held only in batches of ``SMB_POINT_BATCH_SIZE``.
+    GPS accuracies are only needed for their median, which is kept as a
+    running ``validation.AccuracyHistogram``.
+
+    """
+
+    def __init__(self):
+        self._coordinates = array.array("d")
+        self._timestamps = array.array("q")
+        self._vehicle_types = array.array("b")
+        self._accuracies = validation.AccuracyHistogram()
+
+    def __len__(self):
+        return len(self._timestamps)
+
+    def iter_points(self, points: Iterable[PointData]) -> Iterator[PointData]:
+        for pt in points:
+            self._coordinates.append(float(pt.longitude))
+            self._coordinates.append(float(pt.latitude))
+            self._timestamps.append(int(pt.timeStamp))
+            self._vehicle_types.append(_get_vehicle_type(pt.vehicleMode).value)
+            self._accuracies.add(_get_float(pt.accuracy))
+            yield pt
+
+    def get_sorted_arrays(self):
+        """Return the timestamps, coordinates and vehicle types of the points
+
+        Points are sorted by timestamp. Coordinates are returned as an array
+        of (longitude, latitude) pairs.
+
+        """
+
+        timestamps = np.frombuffer(self._timestamps, dtype=np.int64)
+        order = np.argsort(timestamps, kind="mergesort")
+        coordinates = np.frombuffer(
+            self._coordinates, dtype=np.float64).reshape(-1, 2)
+        vehicle_types = np.frombuffer(self._vehicle_types, dtype=np.int8)
+        return timestamps[order], coordinates[order], vehicle_types[order]
+
+    def get_segments(self) -> List[segmentation.TrackSegment]:
+        return segmentation.get_segments(*self.get_sorted_arrays())
+
+    def get_validation_error(self) -> Optional[str]:
+        return validation.get_validation_error(
+            timestamps=np.frombuffer(self._timestamps, dtype=np.int64),
+            coordinates=np.frombuffer(
+                self._coordinates, dtype=np.float64).reshape(-1, 2),
+            vehicle_types=np.frombuffer(self._vehicle_types, dtype=np.int8),
+            median_accuracy=self._accuracies.get_median()
+        )
+
+    def get_wkb(self) -> Optional[bytes]:
+        """Return the track's line as WKB, with points sorted by timestamp
+
+        Returns ``None`` if there are not enough points for making a line.
+
+        """
+
+        if len(self) < 2:
+            result = None
+        else:
+            coordinates = self.get_sorted_arrays()[1]
+            result = segmentation.get_linestring_wkb(coordinates)
+        return result
+
+    def get_start_date(self) -> Optional[dt.datetime]:
+        return _get_datetime(min(self._timestamps)) if len(self) else None
+
+    def get_end_date(self) -> Optional[dt.datetime]:
+        return _get_datetime(max(self._timestamps)) if len(self) else None
+
+    def get_duration_minutes(self) -> Optional[float]:
+        if len(self) == 0:
+            result = None
+        else:
+            milliseconds = max(self._timestamps) - min(self._timestamps)
+            result = milliseconds / (1000 * 60)
+        return result
+
 
 def get_db_connection(dbname, user, password, host="localhost", port="5432"):
     return psycopg2.connect(
@@ -94,92 +251,687 @@ def get_db_connection(dbname, user, password, host="localhost", port="5432"):
 
 
 def handle_track_upload(s3_bucket_name: str, object_key: str,
-                        db_connection) -> int:
-    """Ingest track data into smb database"""
-    try:
-        track_owner = get_track_owner_uuid(object_key)
-    except AttributeError:
-        raise RuntimeError(
-            "Could not determine track owner for object {}".format(object_key))
-    logger.debug("Retrieving data from S3 bucket...")
-    raw_data = retrieve_track_data(s3_bucket_name, object_key)
-    logger.debug("Parsing retrieved track data...")
-    parsed_data = parse_track_data(raw_data)
+                        db_connection,
+                        storage: TrackStorage = None,
+                        priority: str = INTERACTIVE) -> int:
+    """Ingest track data into smb database
+
+    Data is read from ``storage``. When it is not provided, the storage
+    backend defined by the ``SMB_STORAGE_BACKEND`` setting is used.
+    ``priority`` is one of the classes defined in ``priorities``.
+
+    """
+
+    storage = storage or get_storage(s3_bucket_name)
+    result = ingest_object(
+        object_key, storage, db_connection, priority=priority)
+    return result.track_id
+
+
+def ingest_object(object_key: str, storage: TrackStorage,
+                  db_connection,
+                  priority: str = INTERACTIVE) -> IngestionResult:
+    """Ingest a track data file, unless it is a duplicate
+
+    The object's metadata is checked against the ledger of ingested objects
+    and the existing tracks before downloading it, so that duplicate
+    uploads are rejected as soon as possible.
+
+    Raises ``DuplicateTrackError`` if the object or its session has already
+    been ingested.
+
+    """
+
+    with instrumentation.instrument_upload(object_key):
+        with priorities.ingestion_slot(priority, db_connection):
+            with instrumentation.stage("metadata"):
+                metadata = storage.get_metadata(object_key)
+            with instrumentation.stage("duplicate_check"):
+                is_duplicate = is_duplicate_object(metadata, db_connection)
+            if is_duplicate:
+                raise DuplicateTrackError(
+                    "Object {} has already been ingested".format(object_key))
+            logger.debug("Retrieving data from storage...")
+            with contextlib.ExitStack() as exit_stack:
+                with instrumentation.stage("download") as stage:
+                    data_file = exit_stack.enter_context(
+                        storage.open(object_key))
+                    stage.bytes = metadata.size
+                result = ingest_track_data(
+                    data_file,
+                    object_key,
+                    db_connection,
+                    content_hash=metadata.content_hash
+                )
+    return result
+
+
+def is_duplicate_object(metadata: ObjectMetadata, db_connection) -> bool:
+    """Check whether an object's contents or session have been ingested"""
+    if metadata.content_hash is None and metadata.session_id is None:
+        result = False
+    else:
+        with db_connection:
+            with db_connection.cursor() as cursor:
+                result = _is_duplicate_object(metadata, cursor)
+    return result
+
+
+def _is_duplicate_object(metadata: ObjectMetadata, db_cursor) -> bool:
+    queries.registry.execute(
+        db_cursor,
+        "get-ingested-object-duplicate.sql",
+        {
+            "content_hash": metadata.content_hash,
+            "session_id": metadata.session_id,
+        }
+    )
+    return db_cursor.fetchone()[0]
+
+
+def ingest_track_data(data_file, object_key: str, db_connection,
+                      content_hash: str = None) -> IngestionResult:
+    """Ingest the track data read from a zipped data file
+
+    ``object_key`` is the S3 key (or the local path) of the data file. It is
+    used for finding out the owner of the track. When ``content_hash`` is
+    provided, the object is recorded in the ledger of ingested objects.
+
+    Raises ``DuplicateTrackError`` if the track's session has already been
+    ingested or if it is being ingested by some other DB connection.
+
+    """
+
+    if is_packed_storage():
+        return _ingest_packed_track_data(
+            data_file, object_key, db_connection, content_hash)
+    track_owner, first_point, points = _open_track_points(
+        data_file, object_key)
+    session_id = first_point.sessionId
     logger.debug("Performing calculations and creating database records...")
     with db_connection:  # changes are committed when `with` block exits
         with db_connection.cursor() as cursor:
-            user_id = get_track_owner_internal_id(track_owner, cursor)
-            track_id = insert_track(parsed_data, user_id, cursor)
-            insert_collected_points(track_id, parsed_data, cursor)
-            insert_segments(track_id, track_owner, cursor)
-            segments_info = get_segments_info(track_id, cursor)
-            for index, info in enumerate(segments_info):
-                emissions = calculate_emissions(
-                    info.vehicle_type, info.length_km)
-                costs = calculate_costs(
-                    info.vehicle_type, info.length_km, info.duration_hours)
-                duration_minutes = info.duration_hours * 60
-                health = calculate_health(
-                    info.vehicle_type, duration_minutes, info.speed_km_h)
-                insert_segment_data(info.id, emissions, costs, health, cursor)
-            update_track_aggregated_data(track_id, cursor)
-    return track_id
+            track_id = _create_track(
+                object_key, track_owner, session_id, content_hash, cursor)
+            track_points = TrackPointsSummary()
+            point_filter = pointfilter.get_point_filter()
+            with instrumentation.stage("insert_points") as stage:
+                num_points = insert_collected_points(
+                    track_id,
+                    pointfilter.filter_points(
+                        track_points.iter_points(
+                            itertools.chain([first_point], points)),
+                        point_filter
+                    ),
+                    cursor
+                )
+                stage.rows = num_points
+            logger.debug("Inserted {} of {} points".format(
+                num_points, len(track_points)))
+            num_segments = _process_track_segments(
+                track_id, track_owner, track_points, cursor)
+    return IngestionResult(
+        track_id=track_id,
+        session_id=session_id,
+        num_points=num_points,
+        num_segments=num_segments
+    )
 
 
-def update_track_aggregated_data(track_id, db_cursor):
-    query_kwargs = {"track_id": track_id}
-    queries = [
-        "update-track-aggregated-emissions.sql",
-        "update-track-aggregated-costs.sql",
-        "update-track-aggregated-health.sql",
-        "update-track-info.sql",
-    ]
-    for query_file in queries:
-        db_cursor.execute(_get_query(query_file), query_kwargs)
+def _ingest_packed_track_data(data_file, object_key: str, db_connection,
+                              content_hash: Optional[str]) -> IngestionResult:
+    """Ingest a data file, storing all of its points in a single row"""
+    track_owner = _get_track_owner(object_key)
+    track_points = _read_track_point_arrays(data_file, object_key)
+    session_id = track_points.get_session_id()
+    with db_connection:  # changes are committed when `with` block exits
+        with db_connection.cursor() as cursor:
+            track_id = _create_track(
+                object_key, track_owner, session_id, content_hash, cursor)
+            stored_points = _filter_point_arrays(track_points)
+            with instrumentation.stage("insert_points") as stage:
+                insert_packed_points(
+                    [_get_packed_points_row(track_id, stored_points)],
+                    cursor
+                )
+                stage.rows = len(stored_points)
+            num_segments = _process_track_segments(
+                track_id, track_owner, track_points, cursor)
+    return IngestionResult(
+        track_id=track_id,
+        session_id=session_id,
+        num_points=len(stored_points),
+        num_segments=num_segments
+    )
 
 
-def insert_segment_data(segment_id, emissions, costs, health, db_cursor):
-    _perform_segment_insert(
-        "insert-emission.sql", segment_id, emissions, db_cursor)
-    _perform_segment_insert(
-        "insert-cost.sql", segment_id, costs, db_cursor)
-    _perform_segment_insert(
-        "insert-health.sql", segment_id, health, db_cursor)
+def handle_track_uploads(
+        s3_bucket_name: str,
+        object_keys: Iterable[str],
+        db_connection,
+        storage: TrackStorage = None,
+        priority: str = INTERACTIVE
+) -> List[BatchItemResult]:
+    """Ingest several uploads at once, such as those of an SNS burst
 
+    Data is read from ``storage``. When it is not provided, the storage
+    backend defined by the ``SMB_STORAGE_BACKEND`` setting is used.
+    ``priority`` is one of the classes defined in ``priorities``.
 
-def get_segments_info(track_id, db_cursor):
-    db_cursor.execute(
-        _get_query("get-segment-info.sql"),
-        {"track_id": track_id}
+    """
+
+    storage = storage or get_storage(s3_bucket_name)
+    return ingest_objects(
+        object_keys, storage, db_connection, priority=priority)
+
+
+def ingest_objects(object_keys: Iterable[str], storage: TrackStorage,
+                   db_connection,
+                   priority: str = INTERACTIVE) -> List[BatchItemResult]:
+    """Ingest several track data files in a single transaction
+
+    Each object is downloaded and parsed, and its track is inserted, inside
+    a savepoint, so an object that fails is rolled back without affecting
+    the others. Points, segments and segment metrics of all the remaining
+    tracks are then inserted together and the transaction is committed
+    once. Points of the whole batch are kept in memory until then.
+
+    When the ``SMB_BATCH_USE_STAGING_TABLES`` setting is enabled, rows go
+    through the staging tables first (see ``_insert_batch_tracks_staged``).
+
+    Should inserting the batch fail, objects are ingested again one at a
+    time, each in its own transaction.
+
+    The whole batch is ingested with the ``priority`` class.
+
+    Returns a result for each of the unique input keys, in the same order.
+
+    """
+
+    unique_keys = list(dict.fromkeys(object_keys))
+    with priorities.ingestion_slot(priority, db_connection):
+        results = _ingest_batch(
+            unique_keys, storage, db_connection, priority)
+    return [results[object_key] for object_key in unique_keys]
+
+
+def _ingest_batch(unique_keys: List[str], storage: TrackStorage,
+                  db_connection, priority: str) -> dict:
+    results = {}
+    batch_tracks = []
+    try:
+        with db_connection:  # changes are committed when `with` block exits
+            with db_connection.cursor() as cursor:
+                for object_key in unique_keys:
+                    cursor.execute("SAVEPOINT smb_batch_object")
+                    try:
+                        with instrumentation.instrument_upload(object_key):
+                            batch_track = _prepare_batch_track(
+                                object_key, storage, cursor)
+                    except Exception as exc:
+                        if not isinstance(exc, DuplicateTrackError):
+                            logger.exception(
+                                "Could not ingest {}".format(object_key))
+                        cursor.execute(
+                            "ROLLBACK TO SAVEPOINT smb_batch_object")
+                        results[object_key] = BatchItemResult(
+                            object_key, None, exc)
+                    else:
+                        cursor.execute("RELEASE SAVEPOINT smb_batch_object")
+                        batch_tracks.append(batch_track)
+                with instrumentation.instrument_upload(
+                        "batch of {} objects".format(len(batch_tracks))):
+                    if _settings.BATCH_USE_STAGING_TABLES:
+                        _insert_batch_tracks_staged(batch_tracks, cursor)
+                    else:
+                        _insert_batch_tracks(batch_tracks, cursor)
+    except Exception:
+        logger.exception(
+            "Could not ingest batch, ingesting objects one at a time")
+        for batch_track in batch_tracks:
+            object_key = batch_track.object_key
+            try:
+                result = ingest_object(
+                    object_key, storage, db_connection, priority=priority)
+            except Exception as exc:
+                results[object_key] = BatchItemResult(object_key, None, exc)
+            else:
+                results[object_key] = BatchItemResult(object_key, result, None)
+    else:
+        for batch_track in batch_tracks:
+            results[batch_track.object_key] = BatchItemResult(
+                object_key=batch_track.object_key,
+                result=IngestionResult(
+                    track_id=batch_track.track_id,
+                    session_id=batch_track.session_id,
+                    num_points=batch_track.num_stored_points,
+                    num_segments=len(batch_track.segments)
+                ),
+                error=None
+            )
+    return results
+
+
+def _prepare_batch_track(object_key: str, storage: TrackStorage,
+                         db_cursor) -> _BatchTrack:
+    """Insert an object's track and prepare its points and segments"""
+    with instrumentation.stage("metadata"):
+        metadata = storage.get_metadata(object_key)
+    with instrumentation.stage("duplicate_check"):
+        is_duplicate = _is_duplicate_object(metadata, db_cursor)
+    if is_duplicate:
+        raise DuplicateTrackError(
+            "Object {} has already been ingested".format(object_key))
+    track_owner = _get_track_owner(object_key)
+    with contextlib.ExitStack() as exit_stack:
+        with instrumentation.stage("download") as stage:
+            data_file = exit_stack.enter_context(storage.open(object_key))
+            stage.bytes = metadata.size
+        track_points = _read_track_point_arrays(data_file, object_key)
+    session_id = track_points.get_session_id()
+    track_id = _create_track(
+        object_key, track_owner, session_id, metadata.content_hash, db_cursor)
+    stored_points = _filter_point_arrays(track_points)
+    if is_packed_storage():
+        copy_data = None
+        packed_points_row = _get_packed_points_row(track_id, stored_points)
+    else:
+        copy_data = stored_points.get_copy_data(track_id)
+        packed_points_row = None
+    validation_error, segments = _get_valid_segments(track_points)
+    with instrumentation.stage("calculate_metrics"):
+        segment_metrics = _calculate_segment_metrics(segments)
+    return _BatchTrack(
+        object_key=object_key,
+        track_id=track_id,
+        track_owner=track_owner,
+        session_id=session_id,
+        track_points=track_points,
+        copy_data=copy_data,
+        packed_points_row=packed_points_row,
+        num_stored_points=len(stored_points),
+        validation_error=validation_error,
+        segments=segments,
+        segment_metrics=segment_metrics
     )
-    result = []
-    for row in db_cursor.fetchall():
-        segment_id, vehicle_type, length_meters, duration = row
-        length_km = length_meters / 1000
-        duration_hours = duration.days * 24 + duration.seconds / (60 * 60)
-        avg_speed = length_km / duration_hours  # km/h
-        result.append(
-            SegmentInfo(
-                id=segment_id,
-                vehicle_type=VehicleType[vehicle_type],
-                length_km=length_km,
-                duration_hours=duration_hours,
-                speed_km_h=avg_speed
+
+
+def _insert_batch_tracks(batch_tracks: List[_BatchTrack], db_cursor):
+    """Insert the points, segments and metrics of several tracks together"""
+    if len(batch_tracks) == 0:
+        return
+    with instrumentation.stage("insert_points") as stage:
+        _insert_batch_points(
+            batch_tracks, "copy-collectedpoints.sql", db_cursor)
+        stage.rows = sum(track.num_stored_points for track in batch_tracks)
+    with instrumentation.stage("insert_segments") as stage:
+        segment_ids = _insert_segment_rows(
+            [
+                _get_segment_row(track.track_id, track.track_owner, segment)
+                for track in batch_tracks for segment in track.segments
+            ],
+            db_cursor
+        )
+        stage.rows = len(segment_ids)
+    with instrumentation.stage("insert_metrics") as stage:
+        metrics.insert_segment_metrics(
+            segment_ids, _get_batch_segment_metrics(batch_tracks), db_cursor)
+        stage.rows = len(segment_ids)
+    _update_batch_track_summaries(batch_tracks, db_cursor)
+
+
+def _insert_batch_tracks_staged(batch_tracks: List[_BatchTrack], db_cursor):
+    """Insert several tracks' rows by way of the staging tables
+
+    Points, segments and metrics are first loaded into UNLOGGED staging
+    tables, which have no indexes and are not written to the WAL.
+    Segments' simplified geometries are also generated there. Rows are then
+    moved to the real tables with one ``INSERT ... SELECT`` per table, at
+    the very end of the transaction.
+
+    Segment ids are taken from the ``tracks_segment`` sequence in advance,
+    so that metrics can reference them before segments are moved. Packed
+    points are a single row per track and skip the staging tables.
+
+    """
+
+    if len(batch_tracks) == 0:
+        return
+    track_ids = [track.track_id for track in batch_tracks]
+    with instrumentation.stage("stage_points") as stage:
+        _insert_batch_points(
+            batch_tracks, "copy-staging-collectedpoints.sql", db_cursor)
+        stage.rows = sum(track.num_stored_points for track in batch_tracks)
+    with instrumentation.stage("stage_segments") as stage:
+        segment_rows = [
+            _get_segment_row(track.track_id, track.track_owner, segment)
+            for track in batch_tracks for segment in track.segments
+        ]
+        segment_ids = _get_new_segment_ids(len(segment_rows), db_cursor)
+        if len(segment_rows) > 0:
+            queries.registry.execute_values(
+                db_cursor,
+                "insert-staging-segments-values.sql",
+                [
+                    (segment_id, *row)
+                    for segment_id, row in zip(segment_ids, segment_rows)
+                ],
+                page_size=len(segment_rows)
             )
+        stage.rows = len(segment_ids)
+    with instrumentation.stage("stage_metrics") as stage:
+        metrics.insert_segment_metrics(
+            segment_ids, _get_batch_segment_metrics(batch_tracks), db_cursor,
+            staging=True
+        )
+        stage.rows = len(segment_ids)
+    with instrumentation.stage("merge_staging"):
+        for query_name, query_kwargs in [
+            ("merge-staging-collectedpoints.sql", {"track_ids": track_ids}),
+            ("merge-staging-segments.sql", {"track_ids": track_ids}),
+            ("merge-staging-segmentmetrics.sql",
+             {"segment_ids": segment_ids}),
+        ]:
+            queries.registry.execute(db_cursor, query_name, query_kwargs)
+    _update_batch_track_summaries(batch_tracks, db_cursor)
+
+
+def _insert_batch_points(batch_tracks: List[_BatchTrack], copy_query_name: str,
+                         db_cursor):
+    if is_packed_storage():
+        insert_packed_points(
+            [track.packed_points_row for track in batch_tracks], db_cursor)
+    else:
+        queries.registry.copy(
+            db_cursor,
+            copy_query_name,
+            io.StringIO("".join(track.copy_data for track in batch_tracks))
         )
+
+
+def _get_new_segment_ids(count: int, db_cursor) -> List[int]:
+    if count == 0:
+        return []
+    queries.registry.execute(
+        db_cursor, "get-segment-ids.sql", {"count": count})
+    return [row[0] for row in db_cursor.fetchall()]
+
+
+def _get_batch_segment_metrics(batch_tracks: List[_BatchTrack]) -> dict:
+    return {
+        column: np.concatenate(
+            [track.segment_metrics[column] for track in batch_tracks])
+        for column in batch_tracks[0].segment_metrics
+    }
+
+
+def _update_batch_track_summaries(batch_tracks: List[_BatchTrack],
+                                  db_cursor):
+    with instrumentation.stage("update_track") as stage:
+        for track in batch_tracks:
+            update_track_summary(
+                track.track_id, track.segment_metrics, track.track_points,
+                db_cursor, validation_error=track.validation_error
+            )
+        stage.rows = len(batch_tracks)
+
+
+def _read_track_point_arrays(data_file, object_key: str):
+    with instrumentation.stage("decode") as stage:
+        track_points = pointarrays.read_track_data_file(data_file)
+        stage.rows = len(track_points)
+        stage.bytes = track_points.nbytes
+    if len(track_points) == 0:
+        raise RuntimeError(
+            "Object {} does not have any points".format(object_key))
+    return track_points
+
+
+def _filter_point_arrays(track_points: pointarrays.TrackPointArrays):
+    """Return the points that are to be stored"""
+    result = track_points
+    point_filter = pointfilter.get_point_filter()
+    if point_filter is not None:
+        with instrumentation.stage("filter_points") as stage:
+            result = track_points.select(
+                pointfilter.get_filter_mask(track_points, point_filter))
+            stage.rows = len(result)
     return result
 
 
-def _perform_segment_insert(query_filename, segment_id, query_params: dict,
-                            db_cursor):
-    all_query_params = query_params.copy()
-    all_query_params["segment_id"] = segment_id
-    db_cursor.execute(
-        _get_query(query_filename),
-        all_query_params
+def _open_track_points(data_file, object_key: str):
+    """Return the owner, the first point and an iterator over other points"""
+    track_owner = _get_track_owner(object_key)
+    # points are parsed while they are being inserted, so the time spent in
+    # the "decode" stage is also part of the "insert_points" stage
+    points = instrumentation.iter_stage(
+        "decode", iter_track_points(iter_track_data_lines(data_file)))
+    first_point = next(points, None)
+    if first_point is None:
+        raise RuntimeError(
+            "Object {} does not have any points".format(object_key))
+    return track_owner, first_point, points
+
+
+def _get_track_owner(object_key: str) -> str:
+    try:
+        return get_track_owner_uuid(object_key)
+    except AttributeError:
+        raise RuntimeError(
+            "Could not determine track owner for object {}".format(object_key))
+
+
+def _create_track(object_key: str, track_owner: str, session_id: str,
+                  content_hash: Optional[str], db_cursor) -> int:
+    """Reserve the track's session and insert the track
+
+    Raises ``DuplicateTrackError`` if either the session or the object have
+    already been ingested.
+
+    """
+
+    with instrumentation.stage("claim_session"):
+        is_claimed = claim_track_session(session_id, db_cursor)
+    if not is_claimed:
+        raise DuplicateTrackError(
+            "Session {} has already been ingested".format(session_id))
+    with instrumentation.stage("insert_track"):
+        user_id = get_track_owner_internal_id(track_owner, db_cursor)
+        track_id = insert_track(session_id, user_id, db_cursor)
+    if content_hash is not None:
+        with instrumentation.stage("record_object"):
+            is_recorded = record_ingested_object(
+                track_id, content_hash, object_key, db_cursor)
+        if not is_recorded:
+            raise DuplicateTrackError(
+                "Object {} has already been ingested".format(object_key))
+    return track_id
+
+
+def record_ingested_object(track_id: int, content_hash: str,
+                           object_key: str, db_cursor) -> bool:
+    """Add an object to the ledger of ingested objects
+
+    Returns ``False`` if an object with the same contents is already there.
+
+    """
+
+    queries.registry.execute(
+        db_cursor,
+        "insert-ingested-object.sql",
+        {
+            "track_id": track_id,
+            "content_hash": content_hash,
+            "object_key": object_key,
+        }
+    )
+    return db_cursor.fetchone() is not None
+
+
+def claim_track_session(session_id: str, db_cursor) -> bool:
+    """Reserve a track session for ingestion by the current transaction
+
+    Returns ``False`` if the session is already being ingested by another
+    transaction, or if it has been ingested before. The reservation is
+    released when the current transaction ends.
+
+    """
+
+    queries.registry.execute(
+        db_cursor, "lock-track-session.sql", {"session_id": session_id})
+    if not db_cursor.fetchone()[0]:
+        result = False
+    else:
+        result = not track_session_exists(session_id, db_cursor)
+    return result
+
+
+def track_session_exists(session_id: str, db_cursor) -> bool:
+    queries.registry.execute(
+        db_cursor, "get-track-session-exists.sql",
+        {"session_id": session_id}
+    )
+    return db_cursor.fetchone()[0]
+
+
+def _process_track_segments(track_id: int, track_owner: str,
+                            track_points: TrackPointsSummary, cursor):
+    validation_error, segments = _get_valid_segments(track_points)
+    with instrumentation.stage("calculate_metrics"):
+        segment_metrics = _calculate_segment_metrics(segments)
+    with instrumentation.stage("insert_segments") as stage:
+        segment_ids = insert_track_segments(
+            track_id, track_owner, segments, cursor)
+        stage.rows = len(segment_ids)
+    with instrumentation.stage("insert_metrics") as stage:
+        metrics.insert_segment_metrics(segment_ids, segment_metrics, cursor)
+        stage.rows = len(segment_ids)
+    with instrumentation.stage("update_track"):
+        update_track_summary(
+            track_id, segment_metrics, track_points, cursor,
+            validation_error=validation_error
+        )
+    return len(segments)
+
+
+def _get_valid_segments(track_points: TrackPointsSummary):
+    """Validate a track and split it into segments, if it is valid
+
+    Invalid tracks get no segments, so that their metrics are neither
+    calculated nor stored. Returns the validation error, which is ``None``
+    for valid tracks, and the segments.
+
+    """
+
+    with instrumentation.stage("validation"):
+        validation_error = track_points.get_validation_error()
+    if validation_error is None:
+        with instrumentation.stage("segmentation") as stage:
+            segments = track_points.get_segments()
+            stage.rows = len(segments)
+    else:
+        logger.debug("Track is not valid: {}".format(validation_error))
+        segments = []
+    return validation_error, segments
+
+
+def _calculate_segment_metrics(segments: List[segmentation.TrackSegment]):
+    return metrics.calculate_segment_metrics(
+        vehicle_types=[seg.vehicle_type.value for seg in segments],
+        lengths_km=[seg.length_km for seg in segments],
+        durations_hours=[seg.duration_hours for seg in segments],
+        speeds_km_h=[seg.speed_km_h for seg in segments],
+    )
+
+
+def insert_track_segments(track_id: int, owner_uuid: str,
+                          segments: List[segmentation.TrackSegment],
+                          db_cursor) -> List[int]:
+    """Insert segments that have been computed in-process
+
+    The segments' simplified geometries are generated by the same query.
+    Returns the ids of the new segments, in the same order as ``segments``.
+
+    """
+
+    return _insert_segment_rows(
+        [_get_segment_row(track_id, owner_uuid, seg) for seg in segments],
+        db_cursor
+    )
+
+
+def _get_segment_row(track_id: int, owner_uuid: str,
+                     segment: segmentation.TrackSegment) -> tuple:
+    return (
+        track_id,
+        owner_uuid,
+        segment.vehicle_type.name,
+        psycopg2.Binary(segmentation.get_linestring_wkb(segment.coordinates)),
+        _settings.SIMPLIFICATION_TOLERANCE_MEDIUM,
+        _settings.SIMPLIFICATION_TOLERANCE_LOW,
+        _get_datetime(segment.start_timestamp),
+        _get_datetime(segment.end_timestamp),
+        segment.length_km * 1000,
+        segment.duration_hours * 3600,
+        segment.speed_km_h,
     )
 
 
+def _insert_segment_rows(rows: List[tuple], db_cursor) -> List[int]:
+    if len(rows) == 0:
+        return []
+    inserted = queries.registry.execute_values(
+        db_cursor,
+        "insert-segments-values.sql",
+        rows,
+        page_size=len(rows),
+        fetch=True
+    )
+    return [row[0] for row in inserted]
+
+
+def update_track_summary(track_id: int, segment_metrics: dict,
+                         track_points: TrackPointsSummary, db_cursor,
+                         validation_error: str = None):
+    """Update a track's aggregated data with a single query
+
+    This uses the segment metrics and points that are already in memory,
+    instead of reading them back from the database. The track's simplified
+    geometries, ``is_valid`` and ``validation_error`` are set by the same
+    query.
+
+    """
+
+    aggregated = metrics.get_aggregated_metrics(segment_metrics)
+    wkb = track_points.get_wkb()
+    query_kwargs = _get_simplification_params(track_id)
+    query_kwargs.update({
+        "aggregated_emissions": _get_json(aggregated["emissions"]),
+        "aggregated_costs": _get_json(aggregated["costs"]),
+        "aggregated_health": _get_json(aggregated["health"]),
+        "geom": psycopg2.Binary(wkb) if wkb is not None else None,
+        "start_date": track_points.get_start_date(),
+        "end_date": track_points.get_end_date(),
+        "duration": track_points.get_duration_minutes(),
+        "is_valid": validation_error is None,
+        "validation_error": validation_error or "",
+    })
+    queries.registry.execute(db_cursor, "update-track-summary.sql",
+                             query_kwargs)
+
+
+def _get_simplification_params(track_id) -> dict:
+    return {
+        "track_id": track_id,
+        "medium_tolerance": _settings.SIMPLIFICATION_TOLERANCE_MEDIUM,
+        "low_tolerance": _settings.SIMPLIFICATION_TOLERANCE_LOW,
+    }
+
+
+def _get_json(value: Optional[dict]):
+    return Json(value) if value is not None else None
+
+
 def calculate_emissions(vehicle_type: VehicleType,
                         segment_length:float) -> dict:
     result = {}
@@ -294,93 +1046,258 @@ def _get_consumed_calories(speed_km_h, duration_minutes, vehicle_type):
     return result
 
 
-def insert_segments(track_id: str, owner_uuid: str, db_cursor):
-    db_cursor.execute(
-        _get_query("insert-track-segments.sql"),
-        {
-            "user_uuid": owner_uuid,
-            "track_id": track_id,
-        }
-    )
-    segment_ids = db_cursor.fetchall()
-    return [item[0] for item in segment_ids]
-
-
-def insert_track(track_data: List[PointData], owner: str, db_cursor) -> int:
+def insert_track(session_id: str, owner: str, db_cursor) -> int:
     """Insert track data into the main database"""
-    session_id = list(set([pt.sessionId for pt in track_data]))[0]
-    query = _get_query("insert-track.sql")
-    db_cursor.execute(
-        query,
+    queries.registry.execute(
+        db_cursor,
+        "insert-track.sql",
         (owner, session_id, dt.datetime.now(pytz.utc))
     )
     track_id = db_cursor.fetchone()[0]
     return track_id
 
 
-def insert_collected_points(track_id: str, track_data: List[PointData],
-                            db_cursor):
-    query = _get_query("insert-collectedpoint.sql")
-    for pt in track_data:
-        vehicle_type = _get_vehicle_type(pt.vehicleMode)
-        db_cursor.execute(
-            query,
-            {
-                "vehicle_type": vehicle_type.name,
-                "track_id": track_id,
-                "longitude": pt.longitude,
-                "latitude": pt.latitude,
-                "accelerationx": pt.accelerationX,
-                "accelerationy": pt.accelerationY,
-                "accelerationz": pt.accelerationZ,
-                "accuracy": pt.accuracy,
-                "batconsumptionperhour": pt.batConsumptionPerHour,
-                "batterylevel": pt.batteryLevel,
-                "devicebearing": pt.deviceBearing,
-                "devicepitch": pt.devicePitch,
-                "deviceroll": pt.deviceRoll,
-                "elevation": pt.elevation,
-                "gps_bearing": pt.gps_bearing,
-                "humidity": pt.humidity,
-                "lumen": pt.lumen,
-                "pressure": pt.pressure,
-                "proximity": pt.proximity,
-                "speed": pt.speed,
-                "temperature": pt.temperature,
-                "sessionid": pt.sessionId,
-                "timestamp": dt.datetime.fromtimestamp(
-                    int(pt.timeStamp) / 1000,
-                    pytz.utc
-                ),
-            }
+def insert_collected_points(track_id: str, track_data: Iterable[PointData],
+                            db_cursor, strategy: str = None,
+                            batch_size: int = None) -> int:
+    """Insert the collected points of a track into the database
+
+    Points can be inserted with one of the following strategies:
+
+    - ``copy``: points are streamed to the DB using PostgreSQL's ``COPY``
+      command. This is the fastest option;
+    - ``values``: points are inserted with multi-row ``INSERT`` statements,
+      by using psycopg2's ``execute_values``;
+    - ``row``: each point is inserted with its own ``INSERT`` statement.
+
+    When no strategy is provided, the ``SMB_POINT_INSERTION_STRATEGY``
+    setting is used. Both ``copy`` and ``values`` send points in batches of
+    ``batch_size`` points. Returns the number of inserted points.
+
+    """
+
+    strategy = strategy or _settings.POINT_INSERTION_STRATEGY
+    batch_size = batch_size or _settings.POINT_BATCH_SIZE
+    handler = {
+        "copy": _copy_collected_points,
+        "values": _insert_collected_points_values,
+        "row": _insert_collected_points_row_by_row,
+    }.get(strategy)
+    if handler is None:
+        raise RuntimeError(
+            "Invalid point insertion strategy: {!r}".format(strategy))
+    return handler(track_id, track_data, db_cursor, batch_size)
+
+
+def is_packed_storage() -> bool:
+    """Return whether points are stored with the packed storage mode
+
+    The mode is defined by the ``SMB_POINT_STORAGE_MODE`` setting.
+
+    """
+
+    mode = _settings.POINT_STORAGE_MODE
+    if mode not in (ROWS_STORAGE, PACKED_STORAGE):
+        raise RuntimeError("Invalid point storage mode: {!r}".format(mode))
+    return mode == PACKED_STORAGE
+
+
+def insert_packed_points(rows: List[tuple], db_cursor):
+    """Insert rows of ``tracks_packedpoints``
+
+    Each track's points are stored as a single blob, see
+    ``pointarrays.pack_points``. Rows are made by ``_get_packed_points_row``.
+
+    """
+
+    if len(rows) > 0:
+        queries.registry.execute_values(
+            db_cursor,
+            "insert-packed-points-values.sql",
+            rows,
+            page_size=len(rows)
+        )
+
+
+def _get_packed_points_row(track_id: int,
+                           points: pointarrays.TrackPointArrays) -> tuple:
+    return (
+        track_id,
+        len(points),
+        points.get_start_date(),
+        points.get_end_date(),
+        psycopg2.Binary(pointarrays.pack_points(points)),
+    )
+
+
+def _copy_collected_points(track_id: str, track_data: Iterable[PointData],
+                           db_cursor, batch_size: int) -> int:
+    total = 0
+    for batch in _get_batches(track_data, batch_size):
+        buffer = io.StringIO()
+        for pt in batch:
+            buffer.write(_get_point_copy_line(track_id, pt))
+        buffer.seek(0)
+        queries.registry.copy(
+            db_cursor, "copy-collectedpoints.sql", buffer)
+        total += len(batch)
+    return total
+
+
+def _insert_collected_points_values(track_id: str,
+                                    track_data: Iterable[PointData],
+                                    db_cursor, batch_size: int) -> int:
+    total = 0
+    for batch in _get_batches(track_data, batch_size):
+        queries.registry.execute_values(
+            db_cursor,
+            "insert-collectedpoints-values.sql",
+            [_get_point_values(track_id, pt) for pt in batch],
+            template=_POINT_VALUES_TEMPLATE,
+            page_size=batch_size
         )
+        total += len(batch)
+    return total
+
+
+def _insert_collected_points_row_by_row(track_id: str,
+                                        track_data: Iterable[PointData],
+                                        db_cursor, batch_size: int) -> int:
+    total = 0
+    for pt in track_data:
+        query_params = {
+            "vehicle_type": _get_vehicle_type(pt.vehicleMode).name,
+            "track_id": track_id,
+            "longitude": pt.longitude,
+            "latitude": pt.latitude,
+            "sessionid": pt.sessionId,
+            "timestamp": _get_point_timestamp(pt),
+        }
+        for column, field in _POINT_SENSOR_FIELDS:
+            query_params[column] = getattr(pt, field)
+        queries.registry.execute(
+            db_cursor, "insert-collectedpoint.sql", query_params)
+        total += 1
+    return total
+
+
+def _get_point_values(track_id: str, pt: PointData) -> tuple:
+    """Return a point's values, ordered as expected by the bulk queries
+
+    Longitude and latitude are kept as separate values, they are combined
+    into the point geometry by the query.
+
+    """
+
+    return (
+        _get_vehicle_type(pt.vehicleMode).name,
+        track_id,
+        pt.longitude,
+        pt.latitude,
+        *(getattr(pt, field) for _, field in _POINT_SENSOR_FIELDS),
+        pt.sessionId,
+        _get_point_timestamp(pt),
+    )
 
 
-def retrieve_track_data(s3_bucket: str, object_key: str) -> str:
-    """Download track data file from S3 and return the data"""
-    s3 = boto3.resource("s3")
-    obj = s3.Object(s3_bucket, object_key)
-    response = obj.get()
-    input_buffer = io.BytesIO(response["Body"].read())
-    # TODO: do some integrity checks to the data
-    result = ""
-    with zipfile.ZipFile(input_buffer) as zip_handler:
+def _get_point_copy_line(track_id: str, pt: PointData) -> str:
+    """Format a point as a line of the ``COPY`` text format"""
+    vehicle_type, track_id, longitude, latitude, *others = _get_point_values(
+        track_id, pt)
+    timestamp = others.pop()
+    values = [
+        vehicle_type,
+        str(track_id),
+        "SRID=4326;POINT({} {})".format(longitude, latitude),
+        *others,
+        timestamp.isoformat(),
+    ]
+    return "\t".join(
+        r"\N" if value is None else value.translate(_COPY_ESCAPES)
+        for value in values
+    ) + "\n"
+
+
+def _get_point_timestamp(pt: PointData) -> dt.datetime:
+    return _get_datetime(int(pt.timeStamp))
+
+
+def _get_float(value: Optional[str]) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+def _get_datetime(milliseconds: int) -> dt.datetime:
+    return dt.datetime.fromtimestamp(milliseconds / 1000, pytz.utc)
+
+
+def _get_batches(iterable: Iterable, batch_size: int):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, batch_size))
+        if len(batch) == 0:
+            break
+        yield batch
+
+
+def iter_track_data_lines(data_file) -> Iterator[Tuple[List, str]]:
+    """Yield the data lines of each member of a zipped track data file
+
+    The first line of each member is the file header. It is used for
+    locating the columns of each ``PointData`` field, which are yielded
+    together with each of the member's lines.
+
+    """
+
+    with zipfile.ZipFile(data_file) as zip_handler:
         for member_name in zip_handler.namelist():
-            result += zip_handler.read(member_name).decode("utf-8")
-    return result
+            with zip_handler.open(member_name) as member_handler:
+                lines = io.TextIOWrapper(member_handler, encoding="utf-8")
+                header = next(lines, None)
+                if header is None:
+                    continue
+                field_columns = get_field_columns(header)
+                for line in lines:
+                    line = line.rstrip("\r\n")
+                    if line != "":
+                        yield field_columns, line
 
 
-def parse_track_data(raw_track_data: str) -> List[PointData]:
-    result = []
-    for index, line in enumerate(raw_track_data.splitlines()):
-        if index > 0 and line != "":  # ignoring first line, it is file header
-            result.append(parse_track_data_line(line))
-    return result
+def get_field_columns(header: str) -> List[Optional[int]]:
+    """Return the column of each ``PointData`` field in a CSV header
+
+    Columns are located with the same field names as ``pointarrays``, so
+    both ingestion paths decode a data file the same way.
+
+    """
+
+    field_indexes = pointarrays.get_field_indexes(header)
+    return [field_indexes.get(field) for field in _DATA_FIELDS]
+
+
+def iter_track_points(lines: Iterable[Tuple[List, str]]
+                      ) -> Iterator[PointData]:
+    for field_columns, line in lines:
+        yield parse_track_data_line(line, field_columns)
 
 
-def parse_track_data_line(line: str) -> PointData:
+def parse_track_data_line(
+        line: str,
+        field_columns: List[Optional[int]] = _DEFAULT_FIELD_COLUMNS
+) -> PointData:
+    """Parse a CSV line, taking each field from its column
+
+    Fields without a column are ``None``.
+
+    """
+
     info = line.split(",")
-    return PointData(*info[:len(_DATA_FIELDS)])
+    return PointData(*(
+        info[column] if column is not None and column < len(info) else None
+        for column in field_columns
+    ))
 
 
 def get_track_owner_uuid(object_key: str) -> str:
@@ -399,14 +1316,6 @@ def get_track_owner_internal_id(keycloak_uuid: str, db_cursor):
         raise RuntimeError("Could not determine track owner internal ID")
 
 
-def _get_query(filename) -> str:
-    base_dir = pathlib.Path(os.path.abspath(__file__)).parent
-    query_path = base_dir / "sqlqueries" / filename
-    with query_path.open(encoding="utf-8") as fh:
-        query = fh.read()
-    return query
-
-
 def _get_vehicle_type(raw_vehicle_type: str) -> VehicleType:
     """Return the vehicle type as used in the portal DB
 
@@ -421,11 +1330,5 @@ def _get_vehicle_type(raw_vehicle_type: str) -> VehicleType:
     'bike'
 
     """
-    return {
-        "1": VehicleType.foot,
-        "2": VehicleType.bike,
-        "3": VehicleType.bus,
-        "4": VehicleType.car,
-        "5": VehicleType.average_motorbike,  # moped
-        "6": VehicleType.train,
-    }.get(raw_vehicle_type, VehicleType.unknown)
+    return _constants.APP_VEHICLE_TYPES.get(
+        raw_vehicle_type, VehicleType.unknown)
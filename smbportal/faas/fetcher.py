@@ -0,0 +1,242 @@
+#########################################################################
+#
+# Copyright 2018, GeoSolutions Sas.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+#
+#########################################################################
+
+"""Ingestion of many uploads with downloads overlapping DB work
+
+An asyncio event loop keeps several objects being downloaded at the same
+time, while the objects that have already been downloaded are ingested one
+after the other. Downloaded objects wait in a bounded queue: when it is
+full, no new downloads are started until the processing stage catches up.
+
+>>> results = ingest_objects(
+...     ["cognito/smb/<uuid>/<file>.zip", ...],
+...     get_storage("smb-bucket"),
+...     db_connection,
+...     max_downloads=8
+... )
+
+Storage backends are blocking, so downloads run in a pool of threads. DB
+work runs in a single separate thread, as the DB connection must not be
+used by several threads at once. Objects that have already been ingested
+are skipped without being downloaded.
+
+"""
+
+import asyncio
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import contextlib
+import logging
+import time
+from typing import Iterable
+from typing import List
+
+from . import _settings
+from . import datareceiver
+from . import instrumentation
+from . import priorities
+from .datareceiver import BatchItemResult
+from .datareceiver import DuplicateTrackError
+from .priorities import INTERACTIVE
+from .storage import ObjectMetadata
+from .storage import TrackStorage
+
+logger = logging.getLogger(__name__)
+
+FetchedObject = namedtuple("FetchedObject", [
+    "object_key",
+    "metadata",
+    "data_file",  # open binary file object, or None if fetching failed
+    "exit_stack",  # closes ``data_file`` once the object has been ingested
+    "download_seconds",
+    "error",  # the exception that prevented fetching the object, if any
+])
+
+
+def ingest_objects(object_keys: Iterable[str], storage: TrackStorage,
+                   db_connection, max_downloads: int = None,
+                   queue_size: int = None,
+                   priority: str = INTERACTIVE) -> List[BatchItemResult]:
+    """Ingest several track data files, downloading them concurrently
+
+    ``max_downloads`` and ``queue_size`` default to the
+    ``SMB_MAX_CONCURRENT_DOWNLOADS`` and ``SMB_DOWNLOAD_QUEUE_SIZE``
+    settings. Each object is ingested in its own transaction, with the
+    ``priority`` class.
+
+    Returns a result for each of the unique input keys, in the same order.
+
+    """
+
+    priorities.validate_priority(priority)
+    unique_keys = list(dict.fromkeys(object_keys))
+    max_downloads = max_downloads or _settings.MAX_CONCURRENT_DOWNLOADS
+    queue_size = queue_size or _settings.DOWNLOAD_QUEUE_SIZE
+    loop = asyncio.new_event_loop()
+    download_executor = ThreadPoolExecutor(max_workers=max_downloads)
+    db_executor = ThreadPoolExecutor(max_workers=1)
+    try:
+        results = loop.run_until_complete(
+            _run_pipeline(
+                unique_keys, storage, db_connection, max_downloads,
+                queue_size, download_executor, db_executor, priority
+            )
+        )
+    finally:
+        download_executor.shutdown()
+        db_executor.shutdown()
+        loop.close()
+    return [results[object_key] for object_key in unique_keys]
+
+
+async def _run_pipeline(object_keys: List[str], storage: TrackStorage,
+                        db_connection, max_downloads: int, queue_size: int,
+                        download_executor, db_executor,
+                        priority: str = INTERACTIVE) -> dict:
+    queue = asyncio.Queue(maxsize=queue_size)
+    results = {}
+
+    async def is_duplicate(metadata: ObjectMetadata) -> bool:
+        return await asyncio.get_event_loop().run_in_executor(
+            db_executor, datareceiver.is_duplicate_object, metadata,
+            db_connection
+        )
+
+    consumer = asyncio.ensure_future(
+        process_objects(
+            queue, db_connection, db_executor, results, priority))
+    try:
+        await fetch_objects(
+            object_keys, storage, queue, max_downloads, download_executor,
+            is_duplicate
+        )
+    finally:
+        await queue.put(None)
+        await consumer
+    return results
+
+
+async def fetch_objects(object_keys: Iterable[str], storage: TrackStorage,
+                        queue: asyncio.Queue, max_downloads: int,
+                        executor=None, is_duplicate=None):
+    """Download objects concurrently and put them in ``queue``
+
+    At most ``max_downloads`` objects are being downloaded at any time. A
+    download slot is only released once its object has been put in the
+    queue, which provides backpressure when the queue is bounded.
+
+    ``is_duplicate`` is an optional coroutine function that receives an
+    object's metadata. Objects for which it returns true are not
+    downloaded.
+
+    """
+
+    semaphore = asyncio.Semaphore(max_downloads)
+
+    async def fetch(object_key):
+        async with semaphore:
+            fetched = await fetch_object(
+                object_key, storage, executor, is_duplicate)
+            await queue.put(fetched)
+
+    await asyncio.gather(*[fetch(object_key) for object_key in object_keys])
+
+
+async def fetch_object(object_key: str, storage: TrackStorage,
+                       executor=None, is_duplicate=None) -> FetchedObject:
+    loop = asyncio.get_event_loop()
+    metadata = None
+    try:
+        metadata = await loop.run_in_executor(
+            executor, storage.get_metadata, object_key)
+        if is_duplicate is not None and await is_duplicate(metadata):
+            raise DuplicateTrackError(
+                "Object {} has already been ingested".format(object_key))
+        start = time.perf_counter()
+        exit_stack, data_file = await loop.run_in_executor(
+            executor, _open_object, object_key, storage)
+    except Exception as exc:
+        if not isinstance(exc, DuplicateTrackError):
+            logger.exception("Could not fetch {}".format(object_key))
+        result = FetchedObject(
+            object_key=object_key,
+            metadata=metadata,
+            data_file=None,
+            exit_stack=None,
+            download_seconds=None,
+            error=exc
+        )
+    else:
+        result = FetchedObject(
+            object_key=object_key,
+            metadata=metadata,
+            data_file=data_file,
+            exit_stack=exit_stack,
+            download_seconds=time.perf_counter() - start,
+            error=None
+        )
+    return result
+
+
+async def process_objects(queue: asyncio.Queue, db_connection, executor,
+                          results: dict, priority: str = INTERACTIVE):
+    """Ingest the objects in ``queue`` until a ``None`` item is received"""
+    loop = asyncio.get_event_loop()
+    while True:
+        fetched = await queue.get()
+        if fetched is None:
+            break
+        if fetched.error is not None:
+            result = BatchItemResult(fetched.object_key, None, fetched.error)
+        else:
+            try:
+                ingestion_result = await loop.run_in_executor(
+                    executor, ingest_fetched_object, fetched, db_connection,
+                    priority
+                )
+            except Exception as exc:
+                if not isinstance(exc, DuplicateTrackError):
+                    logger.exception(
+                        "Could not ingest {}".format(fetched.object_key))
+                result = BatchItemResult(fetched.object_key, None, exc)
+            else:
+                result = BatchItemResult(
+                    fetched.object_key, ingestion_result, None)
+        results[fetched.object_key] = result
+
+
+def ingest_fetched_object(fetched: FetchedObject, db_connection,
+                          priority: str = INTERACTIVE
+                          ) -> datareceiver.IngestionResult:
+    with fetched.exit_stack:
+        with instrumentation.instrument_upload(fetched.object_key) as upload:
+            download = instrumentation.Stage("download")
+            download.bytes = fetched.metadata.size
+            upload.add_record(download, fetched.download_seconds)
+            with priorities.ingestion_slot(priority, db_connection):
+                result = datareceiver.ingest_track_data(
+                    fetched.data_file,
+                    fetched.object_key,
+                    db_connection,
+                    content_hash=fetched.metadata.content_hash
+                )
+    return result
+
+
+def _open_object(object_key: str, storage: TrackStorage):
+    """Open an object and keep it open after returning
+
+    The returned exit stack closes the object's file.
+
+    """
+
+    with contextlib.ExitStack() as exit_stack:
+        data_file = exit_stack.enter_context(storage.open(object_key))
+        return exit_stack.pop_all(), data_file
@@ -0,0 +1,275 @@
+#########################################################################
+#
+# Copyright 2018, GeoSolutions Sas.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+#
+#########################################################################
+
+"""Priority-aware ingestion of uploads
+
+Uploads are submitted with a priority class. Fresh uploads from the app
+are ``interactive`` and are always served first, while archive replays and
+backlog reprocessing are ``backfill`` and only use the capacity that is
+left. At most ``max_backfill_workers`` workers ingest backfill uploads at
+the same time, so that some workers are always free for interactive ones.
+Uploads are ingested with their priority class (see ``priorities``), so
+backfill uploads also give way to interactive ones ingested by other
+processes.
+
+>>> with IngestionService(db_params, get_storage("smb-bucket"),
+...                       num_workers=4) as service:
+...     future = service.submit("cognito/smb/<uuid>/<file>.zip")
+...     for key in archived_keys:
+...         service.submit(key, priority=BACKFILL)
+...     track_id = future.result().track_id
+...     stats = service.queue.get_stats()
+>>> stats[INTERACTIVE].waits, stats[INTERACTIVE].max_wait_seconds
+(1, 0.002)
+
+"""
+
+from collections import deque
+from collections import namedtuple
+from concurrent.futures import Future
+import logging
+import threading
+import time
+from typing import Dict
+from typing import Optional
+
+from . import datareceiver
+from .priorities import BACKFILL
+from .priorities import INTERACTIVE
+from .priorities import PRIORITIES
+from .priorities import validate_priority
+from .storage import TrackStorage
+
+logger = logging.getLogger(__name__)
+
+QueueItem = namedtuple("QueueItem", [
+    "object_key",
+    "priority",
+    "enqueued_at",
+    "future",
+])
+
+QueueStats = namedtuple("QueueStats", [
+    "depth",  # items waiting in the queue
+    "in_progress",  # items taken from the queue and not done yet
+    "waits",  # items taken from the queue so far
+    "total_wait_seconds",
+    "max_wait_seconds",
+])
+
+
+class IngestionQueue:
+    """Thread-safe queue that serves items by priority class
+
+    Items of the same class are served in the order they were put. When
+    ``max_backfill_in_progress`` backfill items are being processed, further
+    backfill items wait even if workers are idle.
+
+    """
+
+    def __init__(self, max_backfill_in_progress: int = None):
+        self.max_backfill_in_progress = max_backfill_in_progress
+        self._items = {priority: deque() for priority in PRIORITIES}
+        self._in_progress = dict.fromkeys(PRIORITIES, 0)
+        self._waits = {priority: (0, 0.0, 0.0) for priority in PRIORITIES}
+        self._closed = False
+        self._condition = threading.Condition()
+
+    def put(self, object_key: str, priority: str = INTERACTIVE) -> Future:
+        """Add an upload to the queue
+
+        Returns a future that receives the ingestion's result.
+
+        """
+
+        validate_priority(priority)
+        item = QueueItem(
+            object_key=object_key,
+            priority=priority,
+            enqueued_at=time.monotonic(),
+            future=Future()
+        )
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Queue has been closed")
+            self._items[priority].append(item)
+            self._condition.notify()
+        return item.future
+
+    def get(self, timeout: float = None) -> Optional[QueueItem]:
+        """Remove and return the next item to be processed
+
+        Blocks until an item can be served. Returns ``None`` if the timeout
+        expires, or once the queue is closed and no items are left.
+        ``task_done`` must be called when the item has been processed.
+
+        """
+
+        with self._condition:
+            item = self._condition.wait_for(
+                lambda: self._pop() or self._is_drained(), timeout)
+            if not isinstance(item, QueueItem):
+                return None
+            waited = time.monotonic() - item.enqueued_at
+            count, total, maximum = self._waits[item.priority]
+            self._waits[item.priority] = (
+                count + 1, total + waited, max(maximum, waited))
+            self._in_progress[item.priority] += 1
+        return item
+
+    def task_done(self, item: QueueItem):
+        with self._condition:
+            self._in_progress[item.priority] -= 1
+            # a backfill item may have become eligible
+            self._condition.notify_all()
+
+    def close(self):
+        """Stop accepting items, waiting workers get ``None`` once drained"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def get_stats(self) -> Dict[str, QueueStats]:
+        with self._condition:
+            return {
+                priority: QueueStats(
+                    depth=len(self._items[priority]),
+                    in_progress=self._in_progress[priority],
+                    waits=self._waits[priority][0],
+                    total_wait_seconds=self._waits[priority][1],
+                    max_wait_seconds=self._waits[priority][2],
+                ) for priority in PRIORITIES
+            }
+
+    def log_stats(self, level=logging.INFO):
+        for priority, stats in self.get_stats().items():
+            logger.log(
+                level,
+                "{}: {} waiting, {} in progress, {} served, {:.3f}s "
+                "average wait, {:.3f}s max wait".format(
+                    priority,
+                    stats.depth,
+                    stats.in_progress,
+                    stats.waits,
+                    stats.total_wait_seconds / stats.waits
+                    if stats.waits > 0 else 0,
+                    stats.max_wait_seconds
+                ),
+                extra={"priority": priority, **stats._asdict()}
+            )
+
+    def _pop(self) -> Optional[QueueItem]:
+        for priority in PRIORITIES:
+            if len(self._items[priority]) > 0 and self._can_serve(priority):
+                return self._items[priority].popleft()
+        return None
+
+    def _can_serve(self, priority: str) -> bool:
+        return (
+            priority != BACKFILL or
+            self.max_backfill_in_progress is None or
+            self._in_progress[BACKFILL] < self.max_backfill_in_progress
+        )
+
+    def _is_drained(self) -> bool:
+        return self._closed and not any(self._items.values())
+
+
+class IngestionService:
+    """Ingest the uploads of a priority queue with a pool of worker threads
+
+    Each worker holds its own DB connection. ``max_backfill_workers``
+    defaults to all workers but one.
+
+    """
+
+    def __init__(self, db_params: dict, storage: TrackStorage,
+                 num_workers: int = 4, max_backfill_workers: int = None):
+        if max_backfill_workers is None:
+            max_backfill_workers = max(1, num_workers - 1)
+        self.db_params = db_params
+        self.storage = storage
+        self.queue = IngestionQueue(
+            max_backfill_in_progress=max_backfill_workers)
+        self._threads = [
+            threading.Thread(
+                target=self._work,
+                name="ingestion-worker-{}".format(index),
+                daemon=True
+            ) for index in range(num_workers)
+        ]
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        """Wait for the queued uploads to be ingested and stop the workers"""
+        self.queue.close()
+        for thread in self._threads:
+            thread.join()
+
+    def submit(self, object_key: str, priority: str = INTERACTIVE) -> Future:
+        """Queue an upload for ingestion
+
+        The returned future receives the ``datareceiver.IngestionResult``,
+        or the exception that prevented ingestion.
+
+        """
+
+        return self.queue.put(object_key, priority)
+
+    def _work(self):
+        connection = None
+        try:
+            while True:
+                item = self.queue.get()
+                if item is None:
+                    break
+                try:
+                    connection = self._process(item, connection)
+                finally:
+                    self.queue.task_done(item)
+        finally:
+            if connection is not None:
+                connection.close()
+
+    def _process(self, item: QueueItem, connection):
+        """Ingest an item and return the connection to use for the next one
+
+        A new connection is opened when there is none yet or when the
+        previous one has been closed, e.g. because the DB went away. Errors,
+        including connection errors, are set on the item's future.
+
+        """
+
+        if not item.future.set_running_or_notify_cancel():
+            return connection
+        try:
+            if connection is None or connection.closed:
+                connection = datareceiver.get_db_connection(**self.db_params)
+            result = datareceiver.ingest_object(
+                item.object_key, self.storage, connection,
+                priority=item.priority
+            )
+        except Exception as exc:
+            if not isinstance(exc, datareceiver.DuplicateTrackError):
+                logger.exception("Could not ingest {}".format(item.object_key))
+            item.future.set_exception(exc)
+        else:
+            item.future.set_result(result)
+        return connection
@@ -0,0 +1,244 @@
+#########################################################################
+#
+# Copyright 2018, GeoSolutions Sas.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+#
+#########################################################################
+
+"""Per-stage instrumentation of the ingestion of track data files
+
+Each stage of an upload records its wall time and, when relevant, the
+number of rows and bytes it handled. Records are emitted as log records of
+the ``faas.instrumentation`` logger when the upload ends: a summary record
+with level INFO and one record per stage with level DEBUG. The values are
+also available in the ``extra`` attributes of each log record
+(``object_key``, ``stage``, ``seconds``, ``rows`` and ``bytes``).
+
+Records can also be gathered in-process with a collector:
+
+>>> collector = MetricsCollector()
+>>> add_collector(collector)
+>>> handle_track_upload("smb-bucket", "cognito/smb/<uuid>/<file>.zip", conn)
+>>> collector.get_summary()["insert_points"]
+StageSummary(calls=1, seconds=0.52, rows=7200, bytes=0)
+
+Stages that happen outside of an upload (i.e. outside of
+``instrument_upload``) are not recorded.
+
+"""
+
+from collections import namedtuple
+import contextlib
+import logging
+import threading
+import time
+from typing import Dict
+from typing import Iterable
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+# name of the stage that covers the whole upload
+TOTAL = "total"
+
+StageRecord = namedtuple("StageRecord", [
+    "object_key",
+    "stage",
+    "seconds",
+    "rows",
+    "bytes",
+])
+
+StageSummary = namedtuple("StageSummary", [
+    "calls",
+    "seconds",
+    "rows",
+    "bytes",
+])
+
+
+class Stage:
+    """A stage being measured
+
+    ``rows`` and ``bytes`` may be set while the stage is running.
+
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.rows = None
+        self.bytes = None
+
+
+class UploadMetrics:
+    """Holds the stage records of a single upload"""
+
+    def __init__(self, object_key: str):
+        self.object_key = object_key
+        self.records = []
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        stage = Stage(name)
+        start = time.perf_counter()
+        try:
+            yield stage
+        finally:
+            self.add_record(stage, time.perf_counter() - start)
+
+    def iter_stage(self, name: str, iterable: Iterable):
+        """Measure the time spent producing each item of ``iterable``
+
+        The stage is recorded once the iterable is exhausted or closed, with
+        the number of items as its ``rows``.
+
+        """
+
+        stage = Stage(name)
+        stage.rows = 0
+        elapsed = 0
+        iterator = iter(iterable)
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    elapsed += time.perf_counter() - start
+                    break
+                elapsed += time.perf_counter() - start
+                stage.rows += 1
+                yield item
+        finally:
+            self.add_record(stage, elapsed)
+
+    def add_record(self, stage: Stage, seconds: float):
+        self.records.append(
+            StageRecord(
+                object_key=self.object_key,
+                stage=stage.name,
+                seconds=seconds,
+                rows=stage.rows,
+                bytes=stage.bytes
+            )
+        )
+
+
+class MetricsCollector:
+    """Gathers stage records in-process"""
+
+    def __init__(self):
+        self._records = []
+        self._lock = threading.Lock()
+
+    def add(self, records: List[StageRecord]):
+        with self._lock:
+            self._records.extend(records)
+
+    def get_records(self) -> List[StageRecord]:
+        with self._lock:
+            return list(self._records)
+
+    def get_summary(self) -> Dict[str, StageSummary]:
+        summary = {}
+        for record in self.get_records():
+            previous = summary.get(record.stage, StageSummary(0, 0, 0, 0))
+            summary[record.stage] = StageSummary(
+                calls=previous.calls + 1,
+                seconds=previous.seconds + record.seconds,
+                rows=previous.rows + (record.rows or 0),
+                bytes=previous.bytes + (record.bytes or 0),
+            )
+        return summary
+
+    def reset(self):
+        with self._lock:
+            self._records = []
+
+
+_collectors = []
+_state = threading.local()
+
+
+def add_collector(collector: MetricsCollector):
+    if collector not in _collectors:
+        _collectors.append(collector)
+
+
+def remove_collector(collector: MetricsCollector):
+    if collector in _collectors:
+        _collectors.remove(collector)
+
+
+@contextlib.contextmanager
+def instrument_upload(object_key: str):
+    """Record the stages of an upload that run in the current thread"""
+    upload = UploadMetrics(object_key)
+    previous = getattr(_state, "upload", None)
+    _state.upload = upload
+    try:
+        with upload.stage(TOTAL):
+            yield upload
+    finally:
+        _state.upload = previous
+        publish(upload)
+
+
+def stage(name: str):
+    """Return a context manager that measures a stage of the current upload
+
+    It provides a ``Stage``, whose ``rows`` and ``bytes`` may be set.
+
+    """
+
+    upload = getattr(_state, "upload", None)
+    if upload is not None:
+        result = upload.stage(name)
+    else:
+        result = _null_stage(name)
+    return result
+
+
+def iter_stage(name: str, iterable: Iterable) -> Iterable:
+    """Measure the time spent producing the items of ``iterable``"""
+    upload = getattr(_state, "upload", None)
+    if upload is not None:
+        result = upload.iter_stage(name, iterable)
+    else:
+        result = iterable
+    return result
+
+
+def publish(upload: UploadMetrics):
+    for record in upload.records:
+        logger.debug(
+            "{0.object_key} - {0.stage}: {0.seconds:.3f}s, {0.rows} rows, "
+            "{0.bytes} bytes".format(record),
+            extra=record._asdict()
+        )
+    total = [r for r in upload.records if r.stage == TOTAL]
+    logger.info(
+        "{} - {}".format(
+            upload.object_key,
+            ", ".join("{0.stage}: {0.seconds:.3f}s".format(record)
+                      for record in upload.records)
+        ),
+        extra={
+            "object_key": upload.object_key,
+            "stage": TOTAL,
+            "seconds": total[0].seconds if len(total) > 0 else None,
+            "rows": None,
+            "bytes": None,
+            "stages": {r.stage: r.seconds for r in upload.records},
+        }
+    )
+    for collector in list(_collectors):
+        collector.add(upload.records)
+
+
+@contextlib.contextmanager
+def _null_stage(name: str):
+    yield Stage(name)
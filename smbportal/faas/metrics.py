@@ -0,0 +1,272 @@
+#########################################################################
+#
+# Copyright 2018, GeoSolutions Sas.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+#
+#########################################################################
+
+"""Vectorized calculation of segment emissions, costs and health data
+
+This produces the same results as the ``calculate_emissions``,
+``calculate_costs`` and ``calculate_health`` functions of the
+``datareceiver`` module, but works on arrays of segments at once. The
+coefficients defined in ``_constants`` are converted into lookup tables,
+indexed by the value of each ``VehicleType``, when this module is imported.
+
+>>> metrics = calculate_segment_metrics(
+...     vehicle_types=[VehicleType.car.value, VehicleType.bike.value],
+...     lengths_km=[10.2, 3.1],
+...     durations_hours=[0.25, 0.2],
+... )
+>>> metrics["co2"]
+array([1203.6,    0. ])
+
+"""
+
+from collections import namedtuple
+from typing import Dict
+from typing import Optional
+from typing import Sequence
+
+import numpy as np
+
+from . import _constants
+from . import queries
+from ._constants import Pollutant
+from ._constants import VehicleType
+
+EMISSION_COLUMNS = [
+    "so2",
+    "so2_saved",
+    "nox",
+    "nox_saved",
+    "co2",
+    "co2_saved",
+    "co",
+    "co_saved",
+    "pm10",
+    "pm10_saved",
+]
+
+COST_COLUMNS = [
+    "fuel_cost",
+    "time_cost",
+    "depreciation_cost",
+    "operation_cost",
+    "total_cost",
+]
+
+HEALTH_COLUMNS = [
+    "calories_consumed",
+]
+
+# columns of ``tracks_segmentmetrics``, which holds all metrics of a segment
+SEGMENT_METRICS_COLUMNS = EMISSION_COLUMNS + COST_COLUMNS + HEALTH_COLUMNS
+
+PUBLIC_TRANSPORTS = (
+    VehicleType.bus,
+    VehicleType.train,
+)
+
+CoefficientTables = namedtuple("CoefficientTables", [
+    "emissions",
+    "passengers",
+    "fuel_consumption",
+    "fuel_price",
+    "depreciation",
+    "operation",
+    "total_cost_factor",
+    "time_cost_per_hour",
+    "calory_steps",
+])
+
+
+def build_coefficient_tables(constants=_constants) -> CoefficientTables:
+    """Convert the coefficients in ``constants`` into lookup tables
+
+    Each table is an array indexed by the ``VehicleType`` value. Coefficients
+    that do not apply to a vehicle type are set to zero.
+
+    """
+
+    size = max(vehicle_type.value for vehicle_type in VehicleType) + 1
+
+    def get_table(coefficients, default=0, exclude=()):
+        table = np.full(size, default, dtype=np.float64)
+        for vehicle_type in VehicleType:
+            if vehicle_type not in exclude:
+                table[vehicle_type.value] = coefficients.get(
+                    vehicle_type, default)
+        return table
+
+    calory_steps = {}
+    for vehicle_type in VehicleType:
+        info = constants.CALORY_CONSUMPTION.get(vehicle_type)
+        if info is not None:
+            calory_steps[vehicle_type.value] = (
+                np.array([step["speed"] for step in info["steps"]],
+                         dtype=np.float64),
+                np.array([step["calories"] for step in info["steps"]],
+                         dtype=np.float64),
+            )
+    return CoefficientTables(
+        emissions={
+            pollutant.name: get_table(constants.EMISSIONS[pollutant])
+            for pollutant in Pollutant
+        },
+        passengers=get_table(constants.AVERAGE_PASSENGER_COUNT, default=1),
+        fuel_consumption=get_table(
+            constants.FUEL_CONSUMPTION, exclude=PUBLIC_TRANSPORTS),
+        fuel_price=get_table(
+            constants.FUEL_PRICE, exclude=PUBLIC_TRANSPORTS),
+        depreciation=get_table(
+            constants.DEPRECIATION_COST, exclude=PUBLIC_TRANSPORTS),
+        operation=get_table(
+            constants.OPERATION_COST, exclude=PUBLIC_TRANSPORTS),
+        total_cost_factor=1 + get_table(constants.TOTAL_COST_OVERHEAD),
+        time_cost_per_hour=constants.TIME_COST_PER_HOUR_EURO,
+        calory_steps=calory_steps,
+    )
+
+
+COEFFICIENTS = build_coefficient_tables()
+
+
+def calculate_segment_metrics(
+        vehicle_types: Sequence[int],
+        lengths_km: Sequence[float],
+        durations_hours: Sequence[float],
+        speeds_km_h: Sequence[float] = None,
+        coefficients: CoefficientTables = COEFFICIENTS
+) -> Dict[str, np.ndarray]:
+    """Calculate emissions, costs and health data for an array of segments
+
+    ``vehicle_types`` holds the ``VehicleType`` value of each segment. When
+    ``speeds_km_h`` is not provided, it is computed from lengths and
+    durations.
+
+    Returns a mapping with an array for each of the ``EMISSION_COLUMNS``,
+    ``COST_COLUMNS`` and ``HEALTH_COLUMNS``.
+
+    """
+
+    vehicle_types = np.asarray(vehicle_types, dtype=np.intp)
+    lengths_km = np.asarray(lengths_km, dtype=np.float64)
+    durations_hours = np.asarray(durations_hours, dtype=np.float64)
+    if speeds_km_h is None:
+        speeds_km_h = lengths_km / durations_hours
+    speeds_km_h = np.asarray(speeds_km_h, dtype=np.float64)
+    result = {}
+    result.update(_calculate_emissions(
+        vehicle_types, lengths_km, coefficients))
+    result.update(_calculate_costs(
+        vehicle_types, lengths_km, durations_hours, coefficients))
+    result.update(_calculate_health(
+        vehicle_types, durations_hours * 60, speeds_km_h, coefficients))
+    return result
+
+
+def get_aggregated_metrics(
+        metrics: Dict[str, np.ndarray]) -> Dict[str, Optional[dict]]:
+    """Sum each metric over all segments of a track
+
+    Returns a mapping with the ``emissions``, ``costs`` and ``health``
+    totals, in the same format as the track's ``aggregated_*`` fields. These
+    are ``None`` when there are no segments.
+
+    """
+
+    result = {}
+    for name, columns in [
+        ("emissions", EMISSION_COLUMNS),
+        ("costs", COST_COLUMNS),
+        ("health", HEALTH_COLUMNS),
+    ]:
+        if len(metrics[columns[0]]) == 0:
+            result[name] = None
+        else:
+            result[name] = {
+                column: float(metrics[column].sum()) for column in columns}
+    return result
+
+
+def insert_segment_metrics(segment_ids: Sequence[int],
+                           metrics: Dict[str, np.ndarray], db_cursor,
+                           page_size: int = 1000, staging: bool = False):
+    """Insert segment metrics with a single multi-row INSERT
+
+    When ``staging`` is true, metrics are inserted into the staging table
+    instead of the real one.
+
+    """
+
+    segment_ids = list(segment_ids)
+    if len(segment_ids) == 0:
+        return
+    query_name = "{}-segmentmetrics-values.sql".format(
+        "insert-staging" if staging else "insert")
+    values = [metrics[column].tolist() for column in SEGMENT_METRICS_COLUMNS]
+    queries.registry.execute_values(
+        db_cursor,
+        query_name,
+        list(zip(*values, segment_ids)),
+        page_size=page_size
+    )
+
+
+def _calculate_emissions(vehicle_types, lengths_km, coefficients):
+    car = VehicleType.car.value
+    is_car = vehicle_types == car
+    passengers = coefficients.passengers[vehicle_types]
+    result = {}
+    for pollutant, table in coefficients.emissions.items():
+        emitted = (table[vehicle_types] * lengths_km) / passengers
+        reference = (
+            (table[car] * lengths_km) / coefficients.passengers[car])
+        result[pollutant] = emitted
+        result["{}_saved".format(pollutant)] = np.where(
+            is_car, 0.0, reference - emitted)
+    return result
+
+
+def _calculate_costs(vehicle_types, lengths_km, durations_hours,
+                     coefficients):
+    fuel_cost = (
+        (lengths_km * coefficients.fuel_consumption[vehicle_types]) *
+        coefficients.fuel_price[vehicle_types]
+    )
+    time_cost = durations_hours * coefficients.time_cost_per_hour
+    depreciation_cost = lengths_km * coefficients.depreciation[vehicle_types]
+    operation_cost = lengths_km * coefficients.operation[vehicle_types]
+    total_cost = (
+        (fuel_cost + time_cost + depreciation_cost + operation_cost) *
+        coefficients.total_cost_factor[vehicle_types]
+    )
+    return {
+        "fuel_cost": fuel_cost,
+        "time_cost": time_cost,
+        "depreciation_cost": depreciation_cost,
+        "operation_cost": operation_cost,
+        "total_cost": total_cost,
+    }
+
+
+def _calculate_health(vehicle_types, durations_minutes, speeds_km_h,
+                      coefficients):
+    calories = np.zeros(vehicle_types.shape, dtype=np.float64)
+    for vehicle_type, steps in coefficients.calory_steps.items():
+        step_speeds, step_calories = steps
+        mask = vehicle_types == vehicle_type
+        # index of the first step whose speed is higher than the segment's
+        # speed, or the last step if there is none
+        step_indexes = np.minimum(
+            np.searchsorted(step_speeds, speeds_km_h[mask], side="right"),
+            len(step_speeds) - 1
+        )
+        calories[mask] = step_calories[step_indexes] * durations_minutes[mask]
+    return {
+        "calories_consumed": calories,
+    }
@@ -0,0 +1,538 @@
+#########################################################################
+#
+# Copyright 2018, GeoSolutions Sas.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+#
+#########################################################################
+
+"""Monthly range partitioning of the collected points and segments tables
+
+``tracks_collectedpoint`` is partitioned by ``timestamp`` and
+``tracks_segment`` by ``start_date``. Each month is stored in its own
+partition, named ``<table>_yYYYYmMM``, and rows outside of every month
+partition (including points without a timestamp) go to ``<table>_default``.
+Queries that filter on the partition key only scan the relevant months, and
+old months are removed by detaching their partitions instead of deleting
+rows.
+
+An existing table is converted online with:
+
+>>> convert_table(db_connection, "tracks_collectedpoint")
+
+The conversion creates a partitioned copy of the table and fills it in
+batches, each one committed on its own, while a trigger logs the ids of the
+rows that are modified in the meantime. The final step locks the original
+table, replays the logged rows and swaps the two tables. The original table
+is kept as ``<table>_unpartitioned``. Foreign keys can not reference a
+partitioned table, so the final step refuses to run while any exist.
+
+Partitions for the coming months must exist before rows are written to them,
+otherwise the rows end up in the default partition:
+
+>>> create_future_partitions(db_connection, months_ahead=3)
+
+"""
+
+from collections import namedtuple
+import datetime as dt
+import logging
+import re
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from psycopg2 import sql
+import pytz
+
+logger = logging.getLogger(__name__)
+
+PartitionedTable = namedtuple("PartitionedTable", [
+    "name",
+    "key",
+])
+
+PARTITIONED_TABLES = {
+    "tracks_collectedpoint": PartitionedTable(
+        name="tracks_collectedpoint", key="timestamp"),
+    "tracks_segment": PartitionedTable(
+        name="tracks_segment", key="start_date"),
+}
+
+DEFAULT_BATCH_SIZE = 50000
+DEFAULT_MONTHS_AHEAD = 3
+
+_PARTITION_NAME_PATTERN = re.compile(r"_y(?P<year>\d{4})m(?P<month>\d{2})$")
+
+# logs the id of every row written to a table that is being converted
+_LOG_CHANGES_FUNCTION = """
+CREATE OR REPLACE FUNCTION smb_log_partitioning_change() RETURNS trigger AS $$
+BEGIN
+  IF TG_OP = 'DELETE' THEN
+    EXECUTE format('INSERT INTO %I (id) VALUES ($1)', TG_ARGV[0]) USING OLD.id;
+  ELSE
+    EXECUTE format('INSERT INTO %I (id) VALUES ($1)', TG_ARGV[0]) USING NEW.id;
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+
+def get_table(name: str) -> PartitionedTable:
+    try:
+        return PARTITIONED_TABLES[name]
+    except KeyError:
+        raise RuntimeError("Table {!r} is not partitioned".format(name))
+
+
+def get_month(value: dt.datetime) -> dt.date:
+    return dt.date(value.year, value.month, 1)
+
+
+def add_months(month: dt.date, months: int) -> dt.date:
+    index = month.year * 12 + month.month - 1 + months
+    return dt.date(index // 12, index % 12 + 1, 1)
+
+
+def iter_months(first: dt.date, last: dt.date) -> Iterable[dt.date]:
+    """Yield the first day of each month between the two dates, inclusive"""
+    current = get_month(first)
+    while current <= last:
+        yield current
+        current = add_months(current, 1)
+
+
+def get_partition_name(table_name: str, month: dt.date) -> str:
+    return "{}_y{:04d}m{:02d}".format(table_name, month.year, month.month)
+
+
+def get_default_partition_name(table_name: str) -> str:
+    return "{}_default".format(table_name)
+
+
+def get_partition_month(partition_name: str) -> Optional[dt.date]:
+    """Return the month stored in a partition, based on its name
+
+    The default partition has no month and ``None`` is returned for it.
+
+    """
+
+    match = _PARTITION_NAME_PATTERN.search(partition_name)
+    if match is None:
+        return None
+    return dt.date(int(match.group("year")), int(match.group("month")), 1)
+
+
+def get_month_bounds(month: dt.date) -> Tuple[str, str]:
+    """Return the UTC bounds of a month partition
+
+    Partition bounds must be literals, so they are rendered as strings
+    rather than being passed as query parameters.
+
+    """
+
+    return tuple(
+        "{:%Y-%m-%d} 00:00:00+00".format(value)
+        for value in (month, add_months(month, 1))
+    )
+
+
+def create_future_partitions(db_connection,
+                             months_ahead: int = DEFAULT_MONTHS_AHEAD,
+                             table_names: Iterable[str] = None,
+                             today: dt.date = None) -> List[str]:
+    """Make sure that partitions exist up to ``months_ahead`` from now
+
+    Returns the names of the partitions that were created.
+
+    """
+
+    today = today or dt.datetime.now(pytz.utc).date()
+    created = []
+    for table in _get_tables(table_names):
+        with db_connection:
+            with db_connection.cursor() as cursor:
+                if not is_partitioned(cursor, table.name):
+                    raise RuntimeError(
+                        "Table {} has not been converted yet".format(
+                            table.name)
+                    )
+                for month in iter_months(
+                        today, add_months(get_month(today), months_ahead)):
+                    if create_partition(cursor, table, month):
+                        created.append(
+                            get_partition_name(table.name, month))
+    return created
+
+
+def create_partition(cursor, table: PartitionedTable, month: dt.date,
+                     parent_name: str = None) -> bool:
+    """Create the partition of ``month``, unless it already exists
+
+    Rows of that month that have been stored in the default partition are
+    moved to the new one.
+
+    """
+
+    parent_name = parent_name or table.name
+    partition_name = get_partition_name(table.name, month)
+    if _table_exists(cursor, partition_name):
+        return False
+    lower, upper = get_month_bounds(month)
+    identifiers = {
+        "parent": sql.Identifier(parent_name),
+        "partition": sql.Identifier(partition_name),
+        "default": sql.Identifier(get_default_partition_name(table.name)),
+        "key": sql.Identifier(table.key),
+        "lower": sql.Literal(lower),
+        "upper": sql.Literal(upper),
+    }
+    cursor.execute(
+        sql.SQL(
+            "CREATE TABLE {partition} "
+            "(LIKE {parent} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+        ).format(**identifiers)
+    )
+    if _table_exists(cursor, get_default_partition_name(table.name)):
+        cursor.execute(
+            sql.SQL(
+                "WITH moved AS ("
+                "DELETE FROM {default} "
+                "WHERE {key} >= {lower} AND {key} < {upper} "
+                "RETURNING *"
+                ") INSERT INTO {partition} SELECT * FROM moved"
+            ).format(**identifiers)
+        )
+    cursor.execute(
+        sql.SQL(
+            "ALTER TABLE {parent} ATTACH PARTITION {partition} "
+            "FOR VALUES FROM ({lower}) TO ({upper})"
+        ).format(**identifiers)
+    )
+    logger.info("Created partition {}".format(partition_name))
+    return True
+
+
+def detach_partitions_before(db_connection, month: dt.date,
+                             drop: bool = False,
+                             table_names: Iterable[str] = None) -> List[str]:
+    """Detach the partitions of the months before ``month``
+
+    Detached partitions become standalone tables, which can be archived and
+    dropped separately. They are dropped right away if ``drop`` is true.
+    Returns the names of the detached partitions.
+
+    """
+
+    detached = []
+    for table in _get_tables(table_names):
+        with db_connection:
+            with db_connection.cursor() as cursor:
+                for partition_name in get_partitions(cursor, table.name):
+                    partition_month = get_partition_month(partition_name)
+                    if partition_month is None or partition_month >= month:
+                        continue
+                    identifiers = {
+                        "parent": sql.Identifier(table.name),
+                        "partition": sql.Identifier(partition_name),
+                    }
+                    cursor.execute(
+                        sql.SQL(
+                            "ALTER TABLE {parent} DETACH PARTITION {partition}"
+                        ).format(**identifiers)
+                    )
+                    if drop:
+                        cursor.execute(
+                            sql.SQL("DROP TABLE {partition}").format(
+                                **identifiers)
+                        )
+                    detached.append(partition_name)
+    return detached
+
+
+def get_partitions(cursor, table_name: str) -> List[str]:
+    cursor.execute(
+        "SELECT c.relname "
+        "FROM pg_inherits AS i "
+        "JOIN pg_class AS c ON (c.oid = i.inhrelid) "
+        "WHERE i.inhparent = %(table)s::regclass "
+        "ORDER BY c.relname",
+        {"table": table_name}
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def get_detached_partitions(cursor, table_name: str) -> List[str]:
+    """Return the monthly partitions that were detached from a table
+
+    These are the standalone tables left by ``detach_partitions_before``.
+
+    """
+
+    cursor.execute(
+        "SELECT c.relname "
+        "FROM pg_class AS c "
+        "WHERE c.relkind = 'r' "
+        "AND c.relname LIKE %(prefix)s "
+        "AND pg_table_is_visible(c.oid) "
+        "AND NOT EXISTS ("
+        "SELECT 1 FROM pg_inherits AS i WHERE i.inhrelid = c.oid"
+        ") "
+        "ORDER BY c.relname",
+        {"prefix": "{}_y%".format(table_name)}
+    )
+    # "_" matches any character in LIKE patterns, so names are checked again
+    result = []
+    for name, in cursor.fetchall():
+        month = get_partition_month(name)
+        if month is not None and name == get_partition_name(table_name, month):
+            result.append(name)
+    return result
+
+
+def is_partitioned(cursor, table_name: str) -> bool:
+    cursor.execute(
+        "SELECT relkind = 'p' FROM pg_class "
+        "WHERE oid = to_regclass(%(table)s)",
+        {"table": table_name}
+    )
+    row = cursor.fetchone()
+    return row is not None and row[0]
+
+
+def convert_table(db_connection, table_name: str,
+                  months_ahead: int = DEFAULT_MONTHS_AHEAD,
+                  batch_size: int = DEFAULT_BATCH_SIZE,
+                  progress=None, today: dt.date = None):
+    """Convert a table into a partitioned one, without blocking writes
+
+    Writes are only blocked during the final swap. An interrupted conversion
+    is resumed from the last committed batch. ``progress`` is called with the
+    number of rows copied so far after each batch.
+
+    """
+
+    table = get_table(table_name)
+    with db_connection:
+        with db_connection.cursor() as cursor:
+            if is_partitioned(cursor, table.name):
+                logger.info("Table {} is already partitioned".format(
+                    table.name))
+                return
+    _prepare_conversion(db_connection, table, months_ahead, today=today)
+    copied = _copy_rows(db_connection, table, batch_size, progress=progress)
+    _swap_tables(db_connection, table)
+    logger.info("Converted table {} ({} rows)".format(table.name, copied))
+
+
+def get_new_table_name(table_name: str) -> str:
+    return "{}_partitioned".format(table_name)
+
+
+def get_old_table_name(table_name: str) -> str:
+    return "{}_unpartitioned".format(table_name)
+
+
+def get_changes_table_name(table_name: str) -> str:
+    return "{}_changes".format(table_name)
+
+
+def get_index_definition(index_definition: str, table_name: str) -> str:
+    """Adapt the definition of one of a table's indexes to another table
+
+    Names of the new indexes are generated by PostgreSQL.
+
+    """
+
+    return re.sub(
+        r"^CREATE INDEX \S+ ON (ONLY )?\S+ ",
+        "CREATE INDEX ON {} ".format(table_name),
+        index_definition
+    )
+
+
+def _get_tables(table_names: Optional[Iterable[str]]):
+    if table_names is None:
+        return list(PARTITIONED_TABLES.values())
+    return [get_table(name) for name in table_names]
+
+
+def _table_exists(cursor, table_name: str) -> bool:
+    cursor.execute(
+        "SELECT to_regclass(%(table)s) IS NOT NULL", {"table": table_name})
+    return cursor.fetchone()[0]
+
+
+def _prepare_conversion(db_connection, table: PartitionedTable,
+                        months_ahead: int, today: dt.date = None):
+    new_name = get_new_table_name(table.name)
+    changes_name = get_changes_table_name(table.name)
+    identifiers = {
+        "table": sql.Identifier(table.name),
+        "new": sql.Identifier(new_name),
+        "changes": sql.Identifier(changes_name),
+        "default": sql.Identifier(get_default_partition_name(table.name)),
+        "trigger": sql.Identifier("{}_log_change".format(table.name)),
+        "key": sql.Identifier(table.key),
+    }
+    with db_connection:
+        with db_connection.cursor() as cursor:
+            if _table_exists(cursor, new_name):
+                logger.info("Resuming the conversion of {}".format(
+                    table.name))
+                return
+            cursor.execute(
+                sql.SQL(
+                    "CREATE TABLE {new} "
+                    "(LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+                    "PARTITION BY RANGE ({key})"
+                ).format(**identifiers)
+            )
+            # the primary key can not be kept, as it would have to include
+            # the partition key, which is nullable for collected points
+            cursor.execute(
+                sql.SQL("CREATE UNIQUE INDEX ON {new} (id, {key})").format(
+                    **identifiers)
+            )
+            cursor.execute(
+                "SELECT pg_get_indexdef(indexrelid) FROM pg_index "
+                "WHERE indrelid = %(table)s::regclass AND NOT indisunique",
+                {"table": table.name}
+            )
+            for (index_definition,) in cursor.fetchall():
+                cursor.execute(
+                    get_index_definition(index_definition, new_name))
+            cursor.execute(
+                "SELECT pg_get_constraintdef(oid) FROM pg_constraint "
+                "WHERE conrelid = %(table)s::regclass AND contype = 'f'",
+                {"table": table.name}
+            )
+            for (constraint_definition,) in cursor.fetchall():
+                cursor.execute(
+                    sql.SQL("ALTER TABLE {new} ADD {constraint}").format(
+                        constraint=sql.SQL(constraint_definition),
+                        **identifiers
+                    )
+                )
+            cursor.execute(
+                sql.SQL("SELECT min({key}) FROM {table}").format(
+                    **identifiers)
+            )
+            first_value = cursor.fetchone()[0]
+            today = today or dt.datetime.now(pytz.utc).date()
+            last_month = add_months(get_month(today), months_ahead)
+            for month in iter_months(first_value or today, last_month):
+                create_partition(cursor, table, month, parent_name=new_name)
+            cursor.execute(
+                sql.SQL("CREATE TABLE {default} PARTITION OF {new} DEFAULT")
+                .format(**identifiers)
+            )
+            cursor.execute(
+                sql.SQL("CREATE TABLE {changes} (id integer NOT NULL)")
+                .format(**identifiers)
+            )
+            cursor.execute(_LOG_CHANGES_FUNCTION)
+            # creating the trigger waits for the transactions that are
+            # writing to the table, every later write is logged
+            cursor.execute(
+                sql.SQL(
+                    "CREATE TRIGGER {trigger} "
+                    "AFTER INSERT OR UPDATE OR DELETE ON {table} "
+                    "FOR EACH ROW EXECUTE PROCEDURE "
+                    "smb_log_partitioning_change({changes_literal})"
+                ).format(
+                    changes_literal=sql.Literal(changes_name),
+                    **identifiers
+                )
+            )
+
+
+def _copy_rows(db_connection, table: PartitionedTable, batch_size: int,
+               progress=None) -> int:
+    identifiers = {
+        "table": sql.Identifier(table.name),
+        "new": sql.Identifier(get_new_table_name(table.name)),
+    }
+    with db_connection:
+        with db_connection.cursor() as cursor:
+            cursor.execute(
+                sql.SQL(
+                    "SELECT coalesce((SELECT max(id) FROM {new}), 0), "
+                    "coalesce((SELECT max(id) FROM {table}), 0)"
+                ).format(**identifiers)
+            )
+            last_id, max_id = cursor.fetchone()
+    copied = 0
+    while last_id < max_id:
+        upper_id = last_id + batch_size
+        with db_connection:
+            with db_connection.cursor() as cursor:
+                cursor.execute(
+                    sql.SQL(
+                        "INSERT INTO {new} SELECT * FROM {table} "
+                        "WHERE id > %(lower)s AND id <= %(upper)s"
+                    ).format(**identifiers),
+                    {"lower": last_id, "upper": upper_id}
+                )
+                copied += cursor.rowcount
+        last_id = upper_id
+        if progress is not None:
+            progress(copied)
+    return copied
+
+
+def _swap_tables(db_connection, table: PartitionedTable):
+    new_name = get_new_table_name(table.name)
+    identifiers = {
+        "table": sql.Identifier(table.name),
+        "new": sql.Identifier(new_name),
+        "old": sql.Identifier(get_old_table_name(table.name)),
+        "changes": sql.Identifier(get_changes_table_name(table.name)),
+        "trigger": sql.Identifier("{}_log_change".format(table.name)),
+    }
+    with db_connection:
+        with db_connection.cursor() as cursor:
+            cursor.execute(
+                sql.SQL("LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE").format(
+                    **identifiers)
+            )
+            cursor.execute(
+                "SELECT conname FROM pg_constraint "
+                "WHERE confrelid = %(table)s::regclass AND contype = 'f'",
+                {"table": table.name}
+            )
+            references = [row[0] for row in cursor.fetchall()]
+            if len(references) > 0:
+                raise RuntimeError(
+                    "Table {} is referenced by foreign keys: {}".format(
+                        table.name, ", ".join(references))
+                )
+            for statement in (
+                    "DELETE FROM {new} WHERE id IN (SELECT id FROM {changes})",
+                    "INSERT INTO {new} SELECT * FROM {table} "
+                    "WHERE id IN (SELECT id FROM {changes})",
+                    "DROP TRIGGER {trigger} ON {table}",
+                    "DROP TABLE {changes}",
+            ):
+                cursor.execute(sql.SQL(statement).format(**identifiers))
+            cursor.execute(
+                "SELECT pg_get_serial_sequence(%(table)s, 'id')",
+                {"table": table.name}
+            )
+            sequence_name = cursor.fetchone()[0]
+            cursor.execute(
+                sql.SQL("ALTER TABLE {table} RENAME TO {old}").format(
+                    **identifiers)
+            )
+            cursor.execute(
+                sql.SQL("ALTER TABLE {new} RENAME TO {table}").format(
+                    **identifiers)
+            )
+            cursor.execute(
+                sql.SQL("ALTER SEQUENCE {sequence} OWNED BY {table}.id")
+                .format(sequence=sql.SQL(sequence_name), **identifiers)
+            )
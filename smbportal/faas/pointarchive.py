@@ -0,0 +1,302 @@
+#########################################################################
+#
+# Copyright 2018, GeoSolutions Sas.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+#
+#########################################################################
+
+"""Monthly archive files of collected points
+
+Old rows of ``tracks_collectedpoint`` are moved into compressed NumPy
+``.npz`` files, grouped by month. Each month is made of one or more part
+files, named ``collectedpoints_YYYY-MM_<part>.npz``, which are written one
+chunk of points at a time, so that archiving a month never needs to hold all
+of its points in memory. Each file holds one array per column of
+``ARCHIVE_COLUMNS``, with points sorted by timestamp. Timestamps are stored
+in milliseconds. NULL float values are stored as NaN, other nullable columns
+have an additional boolean array marking their NULL values.
+
+>>> columns = get_columns([(1, 10, 1536000000000, 11.25, 43.77, ...)])
+>>> write_part(archive_dir, dt.date(2018, 9, 1), "00000000000000000001",
+...            columns)
+>>> for path in get_month_paths(archive_dir, dt.date(2018, 9, 1)):
+...     columns = read_part(path)
+...     for point in iter_points(select(columns, get_filter_mask(columns))):
+...         print(point["track_id"], point["timestamp"])
+
+Writing a part that already exists replaces it. The name of the part that
+is being archived can be recorded with ``set_pending``, so that an
+interrupted archival can be completed by the next one.
+
+"""
+
+import datetime as dt
+import os
+import pathlib
+import re
+import tempfile
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Optional
+
+import numpy as np
+
+from .pointarrays import SENSOR_FIELDS
+
+# archived columns, in the order expected by ``get_columns``
+ARCHIVE_COLUMNS = [
+    ("id", np.int64),
+    ("track_id", np.int64),
+    ("timestamp", np.int64),
+    ("longitude", np.float64),
+    ("latitude", np.float64),
+    ("vehicle_type", np.str_),
+    ("vehicle_id", np.str_),
+    ("sessionid", np.int64),
+    ("icon_color", np.int64),
+] + [(column, np.float64) for column, _ in SENSOR_FIELDS]
+
+# columns that may hold NULL values, other than the float ones
+NULLABLE_COLUMNS = [
+    "vehicle_type",
+    "vehicle_id",
+    "sessionid",
+    "icon_color",
+]
+
+# files written before months were split into parts have no part name
+_FILE_NAME_PATTERN = re.compile(
+    r"^collectedpoints_(?P<year>\d{4})-(?P<month>\d{2})"
+    r"(?:_(?P<part>\w+))?\.npz$"
+)
+
+
+def get_archive_path(archive_dir: pathlib.Path, month: dt.date,
+                     part: str = None) -> pathlib.Path:
+    name = "collectedpoints_{:%Y-%m}".format(month)
+    if part is not None:
+        name = "{}_{}".format(name, part)
+    return pathlib.Path(archive_dir) / "{}.npz".format(name)
+
+
+def get_pending_path(archive_dir: pathlib.Path,
+                     month: dt.date) -> pathlib.Path:
+    return pathlib.Path(archive_dir) / (
+        "collectedpoints_{:%Y-%m}.pending".format(month))
+
+
+def get_archive_months(archive_dir: pathlib.Path,
+                       start: dt.datetime = None,
+                       end: dt.datetime = None) -> List[dt.date]:
+    """Return the archived months, optionally within a date range"""
+    months = set(month for month, _ in _iter_archive_files(archive_dir))
+    first = dt.date(start.year, start.month, 1) if start else None
+    last = dt.date(end.year, end.month, 1) if end else None
+    return sorted(
+        month for month in months
+        if (first is None or month >= first) and
+        (last is None or month <= last)
+    )
+
+
+def get_month_paths(archive_dir: pathlib.Path,
+                    month: dt.date) -> List[pathlib.Path]:
+    """Return the part files of a month, sorted by name"""
+    return sorted(
+        path for path_month, path in _iter_archive_files(archive_dir)
+        if path_month == month
+    )
+
+
+def get_columns(rows: Iterable[tuple]) -> Dict[str, np.ndarray]:
+    """Convert rows, ordered as ``ARCHIVE_COLUMNS``, into column arrays"""
+    values_by_column = [list(values) for values in zip(*rows)]
+    if len(values_by_column) == 0:
+        values_by_column = [[] for _ in ARCHIVE_COLUMNS]
+    columns = {}
+    for (name, dtype), values in zip(ARCHIVE_COLUMNS, values_by_column):
+        if dtype is np.float64:
+            columns[name] = np.array(
+                [np.nan if value is None else value for value in values],
+                dtype=np.float64
+            )
+        else:
+            default = "" if dtype is np.str_ else 0
+            columns[name] = np.array(
+                [default if value is None else value for value in values],
+                dtype=dtype
+            )
+            if name in NULLABLE_COLUMNS:
+                columns[_get_null_name(name)] = np.array(
+                    [value is None for value in values], dtype=bool)
+    return columns
+
+
+def iter_points(columns: Dict[str, np.ndarray]) -> Iterator[dict]:
+    """Yield the archived points as dicts, with NULL values as ``None``"""
+    values_by_column = []
+    for name, dtype in ARCHIVE_COLUMNS:
+        values = columns[name].tolist()
+        if dtype is np.float64:
+            values = [None if value != value else value for value in values]
+        elif name in NULLABLE_COLUMNS:
+            values = [
+                None if is_null else value for value, is_null in
+                zip(values, columns[_get_null_name(name)].tolist())
+            ]
+        values_by_column.append(values)
+    names = [name for name, _ in ARCHIVE_COLUMNS]
+    for values in zip(*values_by_column):
+        yield dict(zip(names, values))
+
+
+def get_filter_mask(columns: Dict[str, np.ndarray],
+                    start: Optional[dt.datetime] = None,
+                    end: Optional[dt.datetime] = None,
+                    vehicle_types: Iterable[str] = None,
+                    track_ids: Iterable[int] = None) -> np.ndarray:
+    """Return which archived points match the filters
+
+    ``start`` and ``end`` are inclusive, as in the points export.
+
+    """
+
+    timestamps = columns["timestamp"]
+    mask = np.ones(len(timestamps), dtype=bool)
+    if start is not None:
+        mask &= timestamps >= start.timestamp() * 1000
+    if end is not None:
+        mask &= timestamps <= end.timestamp() * 1000
+    if vehicle_types:
+        mask &= np.isin(columns["vehicle_type"], list(vehicle_types))
+        mask &= ~columns[_get_null_name("vehicle_type")]
+    if track_ids:
+        mask &= np.isin(columns["track_id"], list(track_ids))
+    return mask
+
+
+def select(columns: Dict[str, np.ndarray],
+           mask: np.ndarray) -> Dict[str, np.ndarray]:
+    return {name: values[mask] for name, values in columns.items()}
+
+
+def concatenate(parts: List[Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+    """Join several sets of columns, keeping the last copy of each point
+
+    Points are sorted by timestamp.
+
+    """
+
+    columns = {
+        name: np.concatenate([part[name] for part in parts])
+        for name in parts[0]
+    }
+    # np.unique finds the first occurrence, so look for it in reverse order
+    reversed_ids = columns["id"][::-1]
+    _, reversed_indexes = np.unique(reversed_ids, return_index=True)
+    indexes = len(reversed_ids) - 1 - reversed_indexes
+    indexes = indexes[
+        np.argsort(columns["timestamp"][indexes], kind="mergesort")]
+    return {name: values[indexes] for name, values in columns.items()}
+
+
+def read_part(path: pathlib.Path) -> Dict[str, np.ndarray]:
+    with np.load(str(path)) as archive:
+        return {name: archive[name] for name in archive.files}
+
+
+def read_ids(path: pathlib.Path) -> np.ndarray:
+    """Read only the ids of a part's points"""
+    with np.load(str(path)) as archive:
+        return archive["id"]
+
+
+def write_part(archive_dir: pathlib.Path, month: dt.date, part: str,
+               columns: Dict[str, np.ndarray]) -> int:
+    """Write points to a part file of a month
+
+    The file is replaced atomically, so it is never left half written.
+    Returns the number of points in the file.
+
+    """
+
+    archive_dir = pathlib.Path(archive_dir)
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    columns = concatenate([columns])
+    _write_atomically(
+        get_archive_path(archive_dir, month, part),
+        lambda file_handler: np.savez_compressed(file_handler, **columns)
+    )
+    return len(columns["id"])
+
+
+def remove_parts(archive_dir: pathlib.Path, month: dt.date,
+                 prefix: str) -> int:
+    """Remove the part files of a month whose name starts with ``prefix``"""
+    paths = [
+        path for path in get_month_paths(archive_dir, month)
+        if _get_part(path).startswith(prefix)
+    ]
+    for path in paths:
+        path.unlink()
+    return len(paths)
+
+
+def set_pending(archive_dir: pathlib.Path, month: dt.date, part: str):
+    """Record that a part is being archived"""
+    archive_dir = pathlib.Path(archive_dir)
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    _write_atomically(
+        get_pending_path(archive_dir, month),
+        lambda file_handler: file_handler.write(part.encode("utf-8"))
+    )
+
+
+def get_pending(archive_dir: pathlib.Path, month: dt.date) -> Optional[str]:
+    """Return the part recorded by ``set_pending``, if any"""
+    path = get_pending_path(archive_dir, month)
+    return path.read_text(encoding="utf-8") if path.exists() else None
+
+
+def clear_pending(archive_dir: pathlib.Path, month: dt.date):
+    path = get_pending_path(archive_dir, month)
+    if path.exists():
+        path.unlink()
+
+
+def _iter_archive_files(archive_dir: pathlib.Path):
+    archive_dir = pathlib.Path(archive_dir)
+    if archive_dir.is_dir():
+        for path in archive_dir.iterdir():
+            match = _FILE_NAME_PATTERN.search(path.name)
+            if match is not None:
+                month = dt.date(
+                    int(match.group("year")), int(match.group("month")), 1)
+                yield month, path
+
+
+def _get_part(path: pathlib.Path) -> str:
+    return _FILE_NAME_PATTERN.search(path.name).group("part") or ""
+
+
+def _write_atomically(path: pathlib.Path, write):
+    handle, temporary_path = tempfile.mkstemp(
+        dir=str(path.parent), suffix=".tmp")
+    try:
+        with os.fdopen(handle, "wb") as file_handler:
+            write(file_handler)
+            file_handler.flush()
+            os.fsync(file_handler.fileno())
+        os.replace(temporary_path, str(path))
+    except Exception:
+        os.remove(temporary_path)
+        raise
+
+
+def _get_null_name(column: str) -> str:
+    return "{}_null".format(column)
@@ -0,0 +1,444 @@
+#########################################################################
+#
+# Copyright 2018, GeoSolutions Sas.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+#
+#########################################################################
+
+"""Columnar in-memory representation of a track's points
+
+Instead of keeping one ``PointData`` namedtuple of unparsed strings per
+point, a track's points are stored as typed NumPy arrays, one per column:
+timestamps in milliseconds, (longitude, latitude) pairs, the
+``VehicleType`` value of each point, session ids and each sensor's values.
+Missing or invalid sensor values are stored as NaN.
+
+Columns are located by the header of each member of the zipped data file,
+rather than by their position:
+
+>>> with open("track.zip", "rb") as data_file:
+...     points = read_track_data_file(data_file)
+>>> points.coordinates[:2]
+array([[11.25, 43.77],
+       [11.25, 43.78]])
+
+"""
+
+import datetime as dt
+import io
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Sequence
+import zipfile
+
+import numpy as np
+import pytz
+
+from . import _constants
+from . import segmentation
+from . import validation
+from ._constants import VehicleType
+
+LONGITUDE_FIELD = "longitude"
+LATITUDE_FIELD = "latitude"
+TIMESTAMP_FIELD = "timeStamp"
+VEHICLE_MODE_FIELD = "vehicleMode"
+SESSION_ID_FIELD = "sessionId"
+
+# number of lines that are split before being converted into arrays
+PARSE_CHUNK_SIZE = 2048
+
+# database columns of tracks_collectedpoint and the data file fields that
+# hold their values
+SENSOR_FIELDS = [
+    ("accelerationx", "accelerationX"),
+    ("accelerationy", "accelerationY"),
+    ("accelerationz", "accelerationZ"),
+    ("accuracy", "accuracy"),
+    ("batconsumptionperhour", "batConsumptionPerHour"),
+    ("batterylevel", "batteryLevel"),
+    ("devicebearing", "deviceBearing"),
+    ("devicepitch", "devicePitch"),
+    ("deviceroll", "deviceRoll"),
+    ("elevation", "elevation"),
+    ("gps_bearing", "gps_bearing"),
+    ("humidity", "humidity"),
+    ("lumen", "lumen"),
+    ("pressure", "pressure"),
+    ("proximity", "proximity"),
+    ("speed", "speed"),
+    ("temperature", "temperature"),
+]
+
+
+def _get_vehicle_type_table() -> np.ndarray:
+    """Map the app's numeric vehicle modes to ``VehicleType`` values"""
+    size = max(int(mode) for mode in _constants.APP_VEHICLE_TYPES) + 1
+    table = np.full(size, VehicleType.unknown.value, dtype=np.int8)
+    for mode, vehicle_type in _constants.APP_VEHICLE_TYPES.items():
+        table[int(mode)] = vehicle_type.value
+    return table
+
+
+def _get_vehicle_type_names() -> np.ndarray:
+    """Return the names of the vehicle types, indexed by their value"""
+    size = max(vehicle_type.value for vehicle_type in VehicleType) + 1
+    names = np.full(size, VehicleType.unknown.name, dtype=object)
+    for vehicle_type in VehicleType:
+        names[vehicle_type.value] = vehicle_type.name
+    return names
+
+
+_VEHICLE_TYPE_TABLE = _get_vehicle_type_table()
+_VEHICLE_TYPE_NAMES = _get_vehicle_type_names()
+
+
+class TrackPointArrays:
+    """The points of a track, stored as one array per column
+
+    It provides the same methods as ``datareceiver.TrackPointsSummary``, so
+    either of them can be used for finding out a track's segments, geometry,
+    dates and duration.
+
+    """
+
+    def __init__(self, timestamps: np.ndarray, coordinates: np.ndarray,
+                 vehicle_types: np.ndarray, session_ids: np.ndarray,
+                 sensors: Dict[str, np.ndarray]):
+        self.timestamps = timestamps
+        self.coordinates = coordinates
+        self.vehicle_types = vehicle_types
+        self.session_ids = session_ids
+        self.sensors = sensors
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(values.nbytes for values in self._get_arrays())
+
+    @classmethod
+    def concatenate(cls, parts: Sequence["TrackPointArrays"]):
+        return cls(
+            timestamps=np.concatenate([p.timestamps for p in parts]),
+            coordinates=np.concatenate([p.coordinates for p in parts]),
+            vehicle_types=np.concatenate([p.vehicle_types for p in parts]),
+            session_ids=np.concatenate([p.session_ids for p in parts]),
+            sensors={
+                column: np.concatenate([p.sensors[column] for p in parts])
+                for column, _ in SENSOR_FIELDS
+            }
+        )
+
+    def select(self, mask: np.ndarray) -> "TrackPointArrays":
+        """Return the points for which ``mask`` is true"""
+        return TrackPointArrays(
+            timestamps=self.timestamps[mask],
+            coordinates=self.coordinates[mask],
+            vehicle_types=self.vehicle_types[mask],
+            session_ids=self.session_ids[mask],
+            sensors={
+                column: values[mask] for column, values in self.sensors.items()
+            }
+        )
+
+    def get_session_id(self) -> str:
+        """Return the session id of the first point"""
+        return str(self.session_ids[0])
+
+    def get_sorted_arrays(self):
+        """Return the timestamps, coordinates and vehicle types of the points
+
+        Points are sorted by timestamp.
+
+        """
+
+        order = np.argsort(self.timestamps, kind="mergesort")
+        return (
+            self.timestamps[order],
+            self.coordinates[order],
+            self.vehicle_types[order]
+        )
+
+    def get_segments(self) -> List[segmentation.TrackSegment]:
+        return segmentation.get_segments(*self.get_sorted_arrays())
+
+    def get_validation_error(self) -> Optional[str]:
+        return validation.get_validation_error(
+            timestamps=self.timestamps,
+            coordinates=self.coordinates,
+            vehicle_types=self.vehicle_types,
+            accuracies=self.sensors["accuracy"]
+        )
+
+    def get_wkb(self) -> Optional[bytes]:
+        """Return the track's line as WKB, with points sorted by timestamp
+
+        Returns ``None`` if there are not enough points for making a line.
+
+        """
+
+        if len(self) < 2:
+            result = None
+        else:
+            coordinates = self.get_sorted_arrays()[1]
+            result = segmentation.get_linestring_wkb(coordinates)
+        return result
+
+    def get_start_date(self) -> Optional[dt.datetime]:
+        if len(self) == 0:
+            result = None
+        else:
+            result = _get_datetime(int(self.timestamps.min()))
+        return result
+
+    def get_end_date(self) -> Optional[dt.datetime]:
+        if len(self) == 0:
+            result = None
+        else:
+            result = _get_datetime(int(self.timestamps.max()))
+        return result
+
+    def get_duration_minutes(self) -> Optional[float]:
+        if len(self) == 0:
+            result = None
+        else:
+            milliseconds = int(self.timestamps.max() - self.timestamps.min())
+            result = milliseconds / (1000 * 60)
+        return result
+
+    def get_copy_data(self, track_id: int) -> str:
+        """Format the points in the ``COPY`` text format
+
+        Columns are those of the ``copy-collectedpoints.sql`` query.
+
+        """
+
+        timestamps = np.datetime_as_string(
+            self.timestamps.astype("datetime64[ms]"), unit="ms",
+            timezone="UTC"
+        )
+        columns = [
+            get_vehicle_type_names(self.vehicle_types),
+            [str(track_id)] * len(self),
+            [
+                "SRID=4326;POINT({!r} {!r})".format(longitude, latitude)
+                for longitude, latitude in self.coordinates.tolist()
+            ],
+        ]
+        for column, _ in SENSOR_FIELDS:
+            columns.append([
+                r"\N" if value != value else repr(value)
+                for value in self.sensors[column].tolist()
+            ])
+        columns.append([str(value) for value in self.session_ids.tolist()])
+        columns.append(timestamps.tolist())
+        return "".join(
+            "\t".join(values) + "\n" for values in zip(*columns))
+
+    def _get_arrays(self) -> List[np.ndarray]:
+        return [
+            self.timestamps,
+            self.coordinates,
+            self.vehicle_types,
+            self.session_ids,
+            *self.sensors.values()
+        ]
+
+
+def pack_points(points: TrackPointArrays) -> bytes:
+    """Serialize points into a compressed blob, for the packed storage mode
+
+    Arrays are stored with ``numpy.savez_compressed``. Timestamps are delta
+    encoded and sensor columns without any value are left out, as most
+    points only carry a few sensors.
+
+    """
+
+    arrays = {
+        "timestamps": np.diff(np.concatenate(([0], points.timestamps))),
+        "coordinates": points.coordinates,
+        "vehicle_types": points.vehicle_types,
+        "session_ids": points.session_ids,
+    }
+    for column, values in points.sensors.items():
+        if not np.isnan(values).all():
+            arrays[_get_packed_sensor_name(column)] = values
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **arrays)
+    return buffer.getvalue()
+
+
+def unpack_points(data: bytes) -> TrackPointArrays:
+    """Rebuild the points that have been serialized with ``pack_points``"""
+    with np.load(io.BytesIO(data)) as arrays:
+        timestamps = np.cumsum(arrays["timestamps"])
+        sensors = {}
+        for column, _ in SENSOR_FIELDS:
+            packed_name = _get_packed_sensor_name(column)
+            if packed_name in arrays:
+                sensors[column] = arrays[packed_name]
+            else:
+                sensors[column] = np.full(len(timestamps), np.nan)
+        return TrackPointArrays(
+            timestamps=timestamps,
+            coordinates=arrays["coordinates"],
+            vehicle_types=arrays["vehicle_types"],
+            session_ids=arrays["session_ids"],
+            sensors=sensors
+        )
+
+
+def get_vehicle_type_names(vehicle_types: np.ndarray) -> List[str]:
+    return _VEHICLE_TYPE_NAMES[vehicle_types].tolist()
+
+
+def read_track_data_file(data_file) -> TrackPointArrays:
+    """Parse the points of all members of a zipped track data file"""
+    parts = []
+    with zipfile.ZipFile(data_file) as zip_handler:
+        for member_name in zip_handler.namelist():
+            with zip_handler.open(member_name) as member_handler:
+                lines = io.TextIOWrapper(member_handler, encoding="utf-8")
+                header = next(lines, None)
+                if header is not None:
+                    parts.extend(iter_parsed_chunks(header, lines))
+    if len(parts) == 0:
+        parts.append(parse_lines(",".join(_get_required_fields()), []))
+    return TrackPointArrays.concatenate(parts)
+
+
+def parse_lines(header: str, lines) -> TrackPointArrays:
+    """Parse CSV lines, using ``header`` for locating each column
+
+    Raises ``RuntimeError`` if the header lacks any of the coordinates,
+    timestamp, vehicle mode or session id columns. Sensor columns that are
+    not in the header are filled with NaN.
+
+    """
+
+    parts = list(iter_parsed_chunks(header, lines))
+    if len(parts) == 0:
+        parts.append(_parse_rows(get_field_indexes(header), []))
+    return TrackPointArrays.concatenate(parts)
+
+
+def iter_parsed_chunks(header: str, lines,
+                       chunk_size: int = PARSE_CHUNK_SIZE
+                       ) -> Iterator[TrackPointArrays]:
+    """Parse CSV lines into arrays of at most ``chunk_size`` points
+
+    Only the split lines of a single chunk are kept in memory at any time.
+
+    """
+
+    field_indexes = get_field_indexes(header)
+    rows = []
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if line != "":
+            rows.append(line.split(","))
+            if len(rows) == chunk_size:
+                yield _parse_rows(field_indexes, rows)
+                rows = []
+    if len(rows) > 0:
+        yield _parse_rows(field_indexes, rows)
+
+
+def get_field_indexes(header: str) -> Dict[str, int]:
+    """Map the field names of a CSV header to their column index
+
+    Raises ``RuntimeError`` if any of the required fields is missing.
+
+    """
+
+    field_indexes = {
+        name: index
+        for index, name in enumerate(header.rstrip("\r\n").split(","))
+    }
+    missing = [
+        field for field in _get_required_fields()
+        if field not in field_indexes
+    ]
+    if len(missing) > 0:
+        raise RuntimeError(
+            "Track data is missing the {} fields".format(", ".join(missing)))
+    return field_indexes
+
+
+def _parse_rows(field_indexes: Dict[str, int],
+                rows: List[List[str]]) -> TrackPointArrays:
+
+    def get_column(field):
+        index = field_indexes.get(field)
+        if index is None:
+            result = [""] * len(rows)
+        else:
+            result = [row[index] if index < len(row) else "" for row in rows]
+        return result
+
+    longitudes = _to_float_array(get_column(LONGITUDE_FIELD))
+    latitudes = _to_float_array(get_column(LATITUDE_FIELD))
+    return TrackPointArrays(
+        timestamps=np.array(get_column(TIMESTAMP_FIELD), dtype=np.int64),
+        coordinates=np.column_stack(
+            (longitudes, latitudes)).reshape(-1, 2),
+        vehicle_types=_get_vehicle_types(get_column(VEHICLE_MODE_FIELD)),
+        session_ids=np.array(get_column(SESSION_ID_FIELD), dtype=np.int64),
+        sensors={
+            column: _to_float_array(get_column(field))
+            for column, field in SENSOR_FIELDS
+        }
+    )
+
+
+def _get_required_fields() -> List[str]:
+    return [
+        LONGITUDE_FIELD,
+        LATITUDE_FIELD,
+        TIMESTAMP_FIELD,
+        VEHICLE_MODE_FIELD,
+        SESSION_ID_FIELD,
+    ]
+
+
+def _to_float_array(values: List[str]) -> np.ndarray:
+    """Convert strings to floats, with NaN for empty or invalid values"""
+    try:
+        result = np.array(values, dtype=np.float64)
+    except ValueError:
+        result = np.array(
+            [_to_float(value) for value in values], dtype=np.float64)
+    return result
+
+
+def _to_float(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return np.nan
+
+
+def _get_vehicle_types(modes: List[str]) -> np.ndarray:
+    modes = np.array(
+        [int(mode) if mode.isdigit() else -1 for mode in modes],
+        dtype=np.int64
+    )
+    is_known = (modes >= 0) & (modes < len(_VEHICLE_TYPE_TABLE))
+    result = np.full(len(modes), VehicleType.unknown.value, dtype=np.int8)
+    result[is_known] = _VEHICLE_TYPE_TABLE[modes[is_known]]
+    return result
+
+
+def _get_packed_sensor_name(column: str) -> str:
+    return "sensor_{}".format(column)
+
+
+def _get_datetime(milliseconds: int) -> dt.datetime:
+    return dt.datetime.fromtimestamp(milliseconds / 1000, pytz.utc)
@@ -0,0 +1,180 @@
+#########################################################################
+#
+# Copyright 2018, GeoSolutions Sas.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+#
+#########################################################################
+
+"""Filtering of the points that are stored in tracks_collectedpoint
+
+Only the stored points are filtered: the track's validation, segments and
+aggregated data are still calculated from all the points, and the uploaded
+data files remain the source of truth. A point is not stored when:
+
+- its accuracy is worse than ``max_accuracy`` meters;
+- it is an exact duplicate of one of the last ``duplicate_window`` points
+  (same timestamp and coordinates);
+- it was recorded less than ``min_interval`` seconds after the previous
+  stored point (over-sampled stretches);
+- it is less than ``min_distance`` meters away from the previous stored
+  point, unless ``max_stationary_interval`` seconds have passed since then
+  (stationary periods).
+
+Points where the vehicle type changes are always stored.
+
+>>> point_filter = get_point_filter()  # None, unless SMB_FILTER_POINTS is set
+>>> stored = filter_points(points, point_filter)
+
+"""
+
+from collections import deque
+import math
+from typing import Iterable
+from typing import Iterator
+from typing import Optional
+
+import numpy as np
+
+from . import _settings
+
+# mean radius of the earth, in meters
+_EARTH_RADIUS = 6371008.8
+
+# number of recent points that duplicates are looked for in. Duplicates are
+# recorded next to each other, so only a few points need to be remembered
+DUPLICATE_WINDOW = 16
+
+
+class PointFilter:
+    """Decides which points are stored, one point at a time
+
+    Points are expected in the order they have been recorded.
+
+    """
+
+    def __init__(self, max_accuracy: float = None,
+                 min_interval: float = 0, min_distance: float = 0,
+                 max_stationary_interval: float = 0,
+                 duplicate_window: int = DUPLICATE_WINDOW):
+        self.max_accuracy = max_accuracy
+        self.min_interval_ms = min_interval * 1000
+        self.min_distance = min_distance
+        self.max_stationary_interval_ms = max_stationary_interval * 1000
+        self.accepted = 0
+        self.rejected = 0
+        self._recent = deque(maxlen=duplicate_window)
+        self._previous = None
+
+    def accept(self, timestamp: int, longitude: float, latitude: float,
+               vehicle_type, accuracy: float = None) -> bool:
+        result = self._accept(
+            timestamp, longitude, latitude, vehicle_type, accuracy)
+        if result:
+            self.accepted += 1
+            self._previous = (timestamp, longitude, latitude, vehicle_type)
+        else:
+            self.rejected += 1
+        return result
+
+    def _accept(self, timestamp, longitude, latitude, vehicle_type,
+                accuracy) -> bool:
+        if (self.max_accuracy is not None and accuracy is not None and
+                accuracy > self.max_accuracy):
+            return False
+        key = (timestamp, longitude, latitude)
+        if key in self._recent:
+            return False
+        self._recent.append(key)
+        if self._previous is None:
+            return True
+        (previous_timestamp, previous_longitude, previous_latitude,
+         previous_vehicle_type) = self._previous
+        if vehicle_type != previous_vehicle_type:
+            return True
+        interval = abs(timestamp - previous_timestamp)
+        if interval < self.min_interval_ms:
+            return False
+        if interval < self.max_stationary_interval_ms:
+            distance = get_approximate_distance(
+                previous_longitude, previous_latitude, longitude, latitude)
+            if distance < self.min_distance:
+                return False
+        return True
+
+
+def get_point_filter() -> Optional[PointFilter]:
+    """Return a filter configured by the settings, if filtering is enabled"""
+    if _settings.FILTER_POINTS:
+        result = PointFilter(
+            max_accuracy=_settings.POINT_FILTER_MAX_ACCURACY,
+            min_interval=_settings.POINT_FILTER_MIN_INTERVAL,
+            min_distance=_settings.POINT_FILTER_MIN_DISTANCE,
+            max_stationary_interval=(
+                _settings.POINT_FILTER_MAX_STATIONARY_INTERVAL)
+        )
+    else:
+        result = None
+    return result
+
+
+def filter_points(points: Iterable, point_filter: Optional[PointFilter]
+                  ) -> Iterator:
+    """Yield the ``datareceiver.PointData`` items that should be stored"""
+    if point_filter is None:
+        yield from points
+        return
+    for pt in points:
+        try:
+            accuracy = float(pt.accuracy)
+        except ValueError:
+            accuracy = None
+        is_accepted = point_filter.accept(
+            int(pt.timeStamp),
+            float(pt.longitude),
+            float(pt.latitude),
+            pt.vehicleMode,
+            accuracy
+        )
+        if is_accepted:
+            yield pt
+
+
+def get_filter_mask(track_points, point_filter: PointFilter) -> np.ndarray:
+    """Return which of the points of a ``TrackPointArrays`` are stored"""
+    accuracies = np.where(
+        np.isnan(track_points.sensors["accuracy"]),
+        None,
+        track_points.sensors["accuracy"]
+    )
+    return np.fromiter(
+        (
+            point_filter.accept(*values)
+            for values in zip(
+                track_points.timestamps.tolist(),
+                track_points.coordinates[:, 0].tolist(),
+                track_points.coordinates[:, 1].tolist(),
+                track_points.vehicle_types.tolist(),
+                accuracies.tolist()
+            )
+        ),
+        dtype=bool,
+        count=len(track_points)
+    )
+
+
+def get_approximate_distance(longitude1: float, latitude1: float,
+                             longitude2: float, latitude2: float) -> float:
+    """Return the distance, in meters, between two nearby points
+
+    This uses an equirectangular projection, which is accurate enough for
+    the short distances between consecutive GPS fixes.
+
+    """
+
+    x = math.radians(longitude2 - longitude1) * math.cos(
+        math.radians((latitude1 + latitude2) / 2))
+    y = math.radians(latitude2 - latitude1)
+    return _EARTH_RADIUS * math.hypot(x, y)
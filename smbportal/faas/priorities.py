@@ -0,0 +1,106 @@
+#########################################################################
+#
+# Copyright 2018, GeoSolutions Sas.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+#
+#########################################################################
+
+"""Priority classes of track ingestion
+
+Fresh uploads from the app are ``interactive``, archive replays and backlog
+reprocessing are ``backfill``. Ingestion entry points accept a priority
+class and run each ingestion inside ``ingestion_slot``:
+
+- interactive ingestions hold a shared PostgreSQL advisory lock while they
+  run, which announces them to every process using the same database;
+- backfill ingestions wait, before starting, until no interactive ingestion
+  holds that lock. They only use the capacity interactive uploads leave.
+
+The time a backfill ingestion spends waiting is recorded in the
+``priority_wait`` instrumentation stage.
+
+>>> with ingestion_slot(BACKFILL, db_connection):
+...     ingest_track_data(data_file, object_key, db_connection)
+
+"""
+
+import contextlib
+import logging
+import time
+
+import psycopg2
+
+from . import _settings
+from . import instrumentation
+from . import queries
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = "interactive"
+BACKFILL = "backfill"
+
+# priority classes, in the order they are served
+PRIORITIES = [
+    INTERACTIVE,
+    BACKFILL,
+]
+
+# keys of the advisory lock held by interactive ingestions. Two int keys are
+# used so that it cannot clash with the bigint session locks
+_LOCK_PARAMS = {
+    "lock_class": 0x534d42,  # "SMB"
+    "lock_id": 1,
+}
+
+
+def validate_priority(priority: str):
+    if priority not in PRIORITIES:
+        raise RuntimeError("Invalid priority: {!r}".format(priority))
+
+
+@contextlib.contextmanager
+def ingestion_slot(priority: str, db_connection):
+    """Run an ingestion with the given priority class"""
+    validate_priority(priority)
+    if priority == INTERACTIVE:
+        _execute(db_connection, "lock-interactive-ingestion.sql")
+        try:
+            yield
+        finally:
+            _unlock(db_connection)
+    else:
+        with instrumentation.stage("priority_wait"):
+            wait_for_interactive_ingestions(db_connection)
+        yield
+
+
+def wait_for_interactive_ingestions(db_connection, poll_interval=None):
+    poll_interval = poll_interval or _settings.BACKFILL_POLL_INTERVAL
+    while get_interactive_ingestions(db_connection) > 0:
+        time.sleep(poll_interval)
+
+
+def get_interactive_ingestions(db_connection) -> int:
+    """Return how many interactive ingestions are running on the DB"""
+    return _execute(db_connection, "get-interactive-ingestions.sql")[0]
+
+
+def _execute(db_connection, query_name: str):
+    with db_connection:
+        with db_connection.cursor() as cursor:
+            queries.registry.execute(cursor, query_name, _LOCK_PARAMS)
+            return cursor.fetchone()
+
+
+def _unlock(db_connection):
+    # the lock is released by the server anyway when the session ends, so a
+    # broken connection must not hide the ingestion's own error
+    if db_connection.closed:
+        return
+    try:
+        _execute(db_connection, "unlock-interactive-ingestion.sql")
+    except psycopg2.Error:
+        logger.exception("Could not release the interactive ingestion lock")
@@ -0,0 +1,191 @@
+#########################################################################
+#
+# Copyright 2018, GeoSolutions Sas.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+#
+#########################################################################
+
+"""Registry of the SQL queries used for data ingestion
+
+All files in the ``sqlqueries`` directory are read once, when this module is
+imported. Queries that take parameters in the psycopg2 format (either
+``%(name)s`` or ``%s``) are prepared server side (with ``PREPARE``) the first
+time they are used on a connection and are afterwards run with ``EXECUTE``,
+which saves PostgreSQL from planning them over and over.
+
+Queries that are meant for psycopg2's ``execute_values`` (those with a
+``VALUES %s`` clause) and ``COPY`` queries are not prepared.
+
+The registry also keeps track of how many times each query has run and how
+much time was spent on it:
+
+>>> from faas.queries import registry
+>>> registry.get_stats()["insert-track.sql"]
+QueryStats(calls=12, total_seconds=0.0041)
+
+"""
+
+from collections import namedtuple
+import contextlib
+import itertools
+import logging
+import pathlib
+import re
+import time
+from typing import Dict
+import weakref
+
+import psycopg2.extras
+
+from . import _settings
+
+logger = logging.getLogger(__name__)
+
+QueryStats = namedtuple("QueryStats", [
+    "calls",
+    "total_seconds",
+])
+
+_NAMED_PARAMETER_RE = re.compile(r"%\((\w+)\)s")
+_POSITIONAL_PARAMETER_RE = re.compile(r"%s")
+_BULK_VALUES_RE = re.compile(r"VALUES\s+%s\b", re.IGNORECASE)
+
+
+class Query:
+
+    def __init__(self, name: str, sql: str):
+        self.name = name
+        self.sql = sql
+        self.statement_name = "smb_{}".format(
+            re.sub(r"\W", "_", name.rpartition(".")[0]))
+        self.prepare_sql = None
+        self.execute_sql = None
+        is_preparable = (
+            not sql.lstrip().upper().startswith("COPY") and
+            _BULK_VALUES_RE.search(sql) is None
+        )
+        if is_preparable:
+            self._build_prepared_statements()
+
+    @property
+    def is_preparable(self):
+        return self.prepare_sql is not None
+
+    def _build_prepared_statements(self):
+        """Convert psycopg2 parameters into PostgreSQL's positional ones"""
+        named_parameters = []
+
+        def replace_named(match):
+            name = match.group(1)
+            if name not in named_parameters:
+                named_parameters.append(name)
+            return "${}".format(named_parameters.index(name) + 1)
+
+        converted = _NAMED_PARAMETER_RE.sub(replace_named, self.sql)
+        if len(named_parameters) > 0:
+            arguments = ["%({})s".format(name) for name in named_parameters]
+        else:
+            counter = itertools.count(1)
+            converted = _POSITIONAL_PARAMETER_RE.sub(
+                lambda match: "${}".format(next(counter)), converted)
+            arguments = ["%s"] * len(
+                _POSITIONAL_PARAMETER_RE.findall(self.sql))
+        self.prepare_sql = "PREPARE {} AS {}".format(
+            self.statement_name, converted)
+        self.execute_sql = "EXECUTE {}".format(self.statement_name)
+        if len(arguments) > 0:
+            self.execute_sql += " ({})".format(", ".join(arguments))
+
+
+class QueryRegistry:
+
+    def __init__(self, query_dir: pathlib.Path,
+                 prepare: bool = _settings.PREPARE_QUERIES):
+        self.prepare = prepare
+        self._queries = {}
+        for path in sorted(query_dir.glob("*.sql")):
+            self._queries[path.name] = Query(
+                path.name, path.read_text(encoding="utf-8"))
+        self._prepared = weakref.WeakKeyDictionary()
+        self._stats = {}
+
+    def get(self, name: str) -> str:
+        """Return the SQL text of a query, in the psycopg2 format"""
+        return self._get_query(name).sql
+
+    def execute(self, db_cursor, name: str, params=None):
+        query = self._get_query(name)
+        with self._record_stats(name):
+            if self.prepare and query.is_preparable:
+                self._ensure_prepared(db_cursor, query)
+                db_cursor.execute(query.execute_sql, params)
+            else:
+                db_cursor.execute(query.sql, params)
+
+    def execute_values(self, db_cursor, name: str, rows, template=None,
+                       page_size: int = 100, fetch: bool = False):
+        query = self._get_query(name)
+        with self._record_stats(name):
+            return psycopg2.extras.execute_values(
+                db_cursor,
+                query.sql,
+                rows,
+                template=template,
+                page_size=page_size,
+                fetch=fetch
+            )
+
+    def copy(self, db_cursor, name: str, data_file):
+        query = self._get_query(name)
+        with self._record_stats(name):
+            db_cursor.copy_expert(query.sql, data_file)
+
+    def get_stats(self) -> Dict[str, QueryStats]:
+        return dict(self._stats)
+
+    def reset_stats(self):
+        self._stats.clear()
+
+    def log_stats(self, level=logging.INFO):
+        for name, stats in sorted(self._stats.items()):
+            logger.log(
+                level,
+                "{}: {} calls, {:.3f}s total, {:.6f}s per call".format(
+                    name, stats.calls, stats.total_seconds,
+                    stats.total_seconds / stats.calls
+                )
+            )
+
+    def _get_query(self, name: str) -> Query:
+        try:
+            return self._queries[name]
+        except KeyError:
+            raise RuntimeError("Unknown query: {!r}".format(name))
+
+    def _ensure_prepared(self, db_cursor, query: Query):
+        # prepared statements live as long as the DB session, regardless of
+        # transactions being committed or rolled back
+        connection = db_cursor.connection
+        prepared = self._prepared.setdefault(connection, set())
+        if query.name not in prepared:
+            db_cursor.execute(query.prepare_sql)
+            prepared.add(query.name)
+
+    @contextlib.contextmanager
+    def _record_stats(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            previous = self._stats.get(name, QueryStats(0, 0.0))
+            self._stats[name] = QueryStats(
+                calls=previous.calls + 1,
+                total_seconds=previous.total_seconds + elapsed
+            )
+
+
+registry = QueryRegistry(pathlib.Path(__file__).parent / "sqlqueries")
@@ -0,0 +1,185 @@
+#########################################################################
+#
+# Copyright 2018, GeoSolutions Sas.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+#
+#########################################################################
+
+"""Splitting of a track's points into segments
+
+A segment is a run of consecutive points, ordered by timestamp, that share
+the same vehicle type. Segments are found on the points that are already in
+memory, before anything is written to the database.
+
+Segment lengths are geodesic distances on the WGS84 ellipsoid, calculated
+with Vincenty's inverse formula. For the distances between consecutive GPS
+fixes these match PostGIS' ``ST_Length(geography)`` to well under a
+millimetre.
+
+>>> segments = get_segments(
+...     timestamps=np.array([0, 1000, 2000]),
+...     coordinates=np.array([[11.25, 43.77], [11.26, 43.77], [11.27, 43.77]]),
+...     vehicle_types=np.array([2, 2, 4]),
+... )
+>>> [(s.vehicle_type.name, round(s.length_km, 3)) for s in segments]
+[('bike', 0.805), ('car', 0.0)]
+
+"""
+
+from collections import namedtuple
+import struct
+from typing import List
+
+import numpy as np
+
+from ._constants import VehicleType
+
+WGS84_SEMI_MAJOR_AXIS = 6378137.0
+WGS84_FLATTENING = 1 / 298.257223563
+WGS84_SEMI_MINOR_AXIS = WGS84_SEMI_MAJOR_AXIS * (1 - WGS84_FLATTENING)
+
+TrackSegment = namedtuple("TrackSegment", [
+    "vehicle_type",
+    "coordinates",
+    "start_timestamp",
+    "end_timestamp",
+    "length_km",
+    "duration_hours",
+    "speed_km_h",
+])
+
+
+def get_segments(timestamps: np.ndarray, coordinates: np.ndarray,
+                 vehicle_types: np.ndarray) -> List[TrackSegment]:
+    """Split a track's points into segments
+
+    ``timestamps`` are given in milliseconds, ``coordinates`` is an array
+    of (longitude, latitude) pairs and ``vehicle_types`` holds the
+    ``VehicleType`` value of each point. Points must already be sorted by
+    timestamp.
+
+    Segments that have a single point get that point twice, so that their
+    geometry is still a valid line.
+
+    """
+
+    num_points = len(timestamps)
+    if num_points == 0:
+        return []
+    boundaries = np.flatnonzero(np.diff(vehicle_types)) + 1
+    starts = np.concatenate(([0], boundaries))
+    ends = np.concatenate((boundaries, [num_points]))
+    distances = get_geodesic_distances(
+        coordinates[:-1, 0],
+        coordinates[:-1, 1],
+        coordinates[1:, 0],
+        coordinates[1:, 1]
+    )
+    cumulative_distances = np.concatenate(([0.0], np.cumsum(distances)))
+    result = []
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        last = end - 1
+        length_km = (
+            cumulative_distances[last] - cumulative_distances[start]) / 1000
+        duration_hours = (
+            int(timestamps[last]) - int(timestamps[start])) / (1000 * 60 * 60)
+        segment_coordinates = coordinates[start:end]
+        if len(segment_coordinates) == 1:
+            segment_coordinates = np.repeat(segment_coordinates, 2, axis=0)
+        result.append(
+            TrackSegment(
+                vehicle_type=VehicleType(int(vehicle_types[start])),
+                coordinates=segment_coordinates,
+                start_timestamp=int(timestamps[start]),
+                end_timestamp=int(timestamps[last]),
+                length_km=float(length_km),
+                duration_hours=duration_hours,
+                speed_km_h=(
+                    float(length_km) / duration_hours
+                    if duration_hours > 0 else 0.0
+                ),
+            )
+        )
+    return result
+
+
+def get_geodesic_distances(longitudes1, latitudes1, longitudes2,
+                           latitudes2, max_iterations: int = 200,
+                           tolerance: float = 1e-12) -> np.ndarray:
+    """Return the distance, in meters, between pairs of points
+
+    This is a vectorized version of Vincenty's inverse formula, using the
+    WGS84 ellipsoid. Coordinates are given in degrees.
+
+    """
+
+    a = WGS84_SEMI_MAJOR_AXIS
+    b = WGS84_SEMI_MINOR_AXIS
+    f = WGS84_FLATTENING
+    longitude_difference = np.radians(
+        np.asarray(longitudes2, dtype=np.float64) -
+        np.asarray(longitudes1, dtype=np.float64)
+    )
+    reduced_latitude1 = np.arctan(
+        (1 - f) * np.tan(np.radians(np.asarray(latitudes1, dtype=np.float64))))
+    reduced_latitude2 = np.arctan(
+        (1 - f) * np.tan(np.radians(np.asarray(latitudes2, dtype=np.float64))))
+    sin_u1 = np.sin(reduced_latitude1)
+    cos_u1 = np.cos(reduced_latitude1)
+    sin_u2 = np.sin(reduced_latitude2)
+    cos_u2 = np.cos(reduced_latitude2)
+    lambda_ = longitude_difference
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for _ in range(max_iterations):
+            sin_lambda = np.sin(lambda_)
+            cos_lambda = np.cos(lambda_)
+            sin_sigma = np.sqrt(
+                (cos_u2 * sin_lambda) ** 2 +
+                (cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lambda) ** 2
+            )
+            cos_sigma = sin_u1 * sin_u2 + cos_u1 * cos_u2 * cos_lambda
+            sigma = np.arctan2(sin_sigma, cos_sigma)
+            # coincident points have a sin_sigma of zero
+            sin_alpha = np.where(
+                sin_sigma == 0, 0, cos_u1 * cos_u2 * sin_lambda / sin_sigma)
+            cos_sq_alpha = 1 - sin_alpha ** 2
+            # points on the equator have a cos_sq_alpha of zero
+            cos_2_sigma_m = np.where(
+                cos_sq_alpha == 0,
+                0,
+                cos_sigma - 2 * sin_u1 * sin_u2 / cos_sq_alpha
+            )
+            c = f / 16 * cos_sq_alpha * (4 + f * (4 - 3 * cos_sq_alpha))
+            previous_lambda = lambda_
+            lambda_ = longitude_difference + (1 - c) * f * sin_alpha * (
+                sigma + c * sin_sigma * (
+                    cos_2_sigma_m +
+                    c * cos_sigma * (-1 + 2 * cos_2_sigma_m ** 2)
+                )
+            )
+            if np.all(np.abs(lambda_ - previous_lambda) < tolerance):
+                break
+    u_sq = cos_sq_alpha * (a ** 2 - b ** 2) / b ** 2
+    big_a = 1 + u_sq / 16384 * (
+        4096 + u_sq * (-768 + u_sq * (320 - 175 * u_sq)))
+    big_b = u_sq / 1024 * (256 + u_sq * (-128 + u_sq * (74 - 47 * u_sq)))
+    delta_sigma = big_b * sin_sigma * (
+        cos_2_sigma_m + big_b / 4 * (
+            cos_sigma * (-1 + 2 * cos_2_sigma_m ** 2) -
+            big_b / 6 * cos_2_sigma_m * (-3 + 4 * sin_sigma ** 2) *
+            (-3 + 4 * cos_2_sigma_m ** 2)
+        )
+    )
+    return b * big_a * (sigma - delta_sigma)
+
+
+def get_linestring_wkb(coordinates: np.ndarray) -> bytes:
+    """Return an array of (longitude, latitude) pairs as a WKB LineString"""
+    # byte order 1 is little endian and geometry type 2 is LineString
+    return (
+        struct.pack("<BII", 1, 2, len(coordinates)) +
+        np.ascontiguousarray(coordinates, dtype="<f8").tobytes()
+    )
@@ -0,0 +1,24 @@
+COPY tracks_collectedpoint (
+    vehicle_type,
+    track_id,
+    the_geom,
+    accelerationx,
+    accelerationy,
+    accelerationz,
+    accuracy,
+    batconsumptionperhour,
+    batterylevel,
+    devicebearing,
+    devicepitch,
+    deviceroll,
+    elevation,
+    gps_bearing,
+    humidity,
+    lumen,
+    pressure,
+    proximity,
+    speed,
+    temperature,
+    sessionid,
+    timestamp
+) FROM STDIN
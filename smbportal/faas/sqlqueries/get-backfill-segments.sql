@@ -0,0 +1,11 @@
+SELECT
+  id,
+  track_id,
+  vehicle_type,
+  coalesce(length_m, ST_Length(geom::geography)) AS length,
+  coalesce(
+    duration_s, EXTRACT(EPOCH FROM end_date - start_date)
+  ) AS duration_seconds
+FROM tracks_segment
+WHERE track_id = ANY(%(track_ids)s)
+ORDER BY track_id, id
@@ -0,0 +1,6 @@
+SELECT id
+FROM tracks_track
+WHERE id > %(after_id)s
+  AND (%(since)s::timestamptz IS NULL OR start_date >= %(since)s::timestamptz)
+  AND (%(until)s::timestamptz IS NULL OR start_date < %(until)s::timestamptz)
+ORDER BY id
@@ -0,0 +1,8 @@
+SELECT
+  EXISTS (
+    SELECT 1 FROM tracks_ingestedobject
+    WHERE content_hash = %(content_hash)s::text
+  ) OR EXISTS (
+    SELECT 1 FROM tracks_track
+    WHERE session_id = %(session_id)s::bigint
+  )
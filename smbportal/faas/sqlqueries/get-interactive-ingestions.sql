@@ -0,0 +1,9 @@
+SELECT count(*)
+FROM pg_locks
+WHERE locktype = 'advisory'
+  AND granted
+  AND database = (
+    SELECT oid FROM pg_database WHERE datname = current_database())
+  AND classid = %(lock_class)s
+  AND objid = %(lock_id)s
+  AND objsubid = 2
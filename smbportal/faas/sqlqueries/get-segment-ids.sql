@@ -0,0 +1,2 @@
+SELECT nextval(pg_get_serial_sequence('tracks_segment', 'id'))
+FROM generate_series(1, %(count)s)
@@ -0,0 +1,5 @@
+SELECT EXISTS (
+  SELECT 1
+  FROM tracks_track
+  WHERE session_id = %(session_id)s::bigint
+)
@@ -1,7 +0,0 @@
-INSERT INTO tracks_health (
-  calories_consumed,
-  segment_id
-) VALUES (
-  %(calories_consumed)s,
-  %(segment_id)s
-)
@@ -0,0 +1,4 @@
+INSERT INTO tracks_ingestedobject (track_id, content_hash, object_key, created_at)
+VALUES (%(track_id)s, %(content_hash)s, %(object_key)s, now())
+ON CONFLICT (content_hash) DO NOTHING
+RETURNING id
@@ -0,0 +1,8 @@
+INSERT INTO tracks_packedpoints (
+  track_id,
+  num_points,
+  start_date,
+  end_date,
+  data
+)
+VALUES %s
@@ -0,0 +1,19 @@
+INSERT INTO smb_staging_segmentmetrics (
+  so2,
+  so2_saved,
+  nox,
+  nox_saved,
+  co2,
+  co2_saved,
+  co,
+  co_saved,
+  pm10,
+  pm10_saved,
+  fuel_cost,
+  time_cost,
+  depreciation_cost,
+  operation_cost,
+  total_cost,
+  calories_consumed,
+  segment_id
+) VALUES %s
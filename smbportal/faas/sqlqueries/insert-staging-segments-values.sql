@@ -0,0 +1,56 @@
+INSERT INTO smb_staging_segment (
+  id,
+  track_id,
+  user_uuid,
+  vehicle_type,
+  geom,
+  geom_medium,
+  geom_low,
+  start_date,
+  end_date,
+  length_m,
+  duration_s,
+  avg_speed_kmh
+)
+SELECT
+  id,
+  track_id,
+  user_uuid,
+  vehicle_type,
+  geom,
+  ST_SimplifyPreserveTopology(geom, medium_tolerance),
+  ST_SimplifyPreserveTopology(geom, low_tolerance),
+  start_date,
+  end_date,
+  length_m,
+  duration_s,
+  avg_speed_kmh
+FROM (
+  SELECT
+    v.id,
+    v.track_id,
+    v.user_uuid,
+    v.vehicle_type,
+    ST_SetSRID(ST_GeomFromWKB(v.wkb), 4326) AS geom,
+    v.medium_tolerance,
+    v.low_tolerance,
+    v.start_date,
+    v.end_date,
+    v.length_m,
+    v.duration_s,
+    v.avg_speed_kmh
+  FROM (VALUES %s) AS v (
+    id,
+    track_id,
+    user_uuid,
+    vehicle_type,
+    wkb,
+    medium_tolerance,
+    low_tolerance,
+    start_date,
+    end_date,
+    length_m,
+    duration_s,
+    avg_speed_kmh
+  )
+) AS sq
@@ -1,3 +1,9 @@
-INSERT INTO tracks_track (owner_id, session_id, created_at)
-VALUES (%s, %s, %s)
+INSERT INTO tracks_track (
+  owner_id,
+  session_id,
+  created_at,
+  is_valid,
+  validation_error
+)
+VALUES (%s, %s, %s, FALSE, '')
 RETURNING id
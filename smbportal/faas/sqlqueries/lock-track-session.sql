@@ -0,0 +1 @@
+SELECT pg_try_advisory_xact_lock(%(session_id)s::bigint)
@@ -0,0 +1,53 @@
+WITH moved AS (
+  DELETE FROM smb_staging_collectedpoint
+  WHERE track_id = ANY(%(track_ids)s)
+  RETURNING *
+)
+INSERT INTO tracks_collectedpoint (
+  vehicle_type,
+  track_id,
+  the_geom,
+  accelerationx,
+  accelerationy,
+  accelerationz,
+  accuracy,
+  batconsumptionperhour,
+  batterylevel,
+  devicebearing,
+  devicepitch,
+  deviceroll,
+  elevation,
+  gps_bearing,
+  humidity,
+  lumen,
+  pressure,
+  proximity,
+  speed,
+  temperature,
+  sessionid,
+  timestamp
+)
+SELECT
+  vehicle_type,
+  track_id,
+  the_geom,
+  accelerationx,
+  accelerationy,
+  accelerationz,
+  accuracy,
+  batconsumptionperhour,
+  batterylevel,
+  devicebearing,
+  devicepitch,
+  deviceroll,
+  elevation,
+  gps_bearing,
+  humidity,
+  lumen,
+  pressure,
+  proximity,
+  speed,
+  temperature,
+  sessionid,
+  timestamp
+FROM moved
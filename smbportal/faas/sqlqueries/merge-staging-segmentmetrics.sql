@@ -0,0 +1,43 @@
+WITH moved AS (
+  DELETE FROM smb_staging_segmentmetrics
+  WHERE segment_id = ANY(%(segment_ids)s)
+  RETURNING *
+)
+INSERT INTO tracks_segmentmetrics (
+  so2,
+  so2_saved,
+  nox,
+  nox_saved,
+  co2,
+  co2_saved,
+  co,
+  co_saved,
+  pm10,
+  pm10_saved,
+  fuel_cost,
+  time_cost,
+  depreciation_cost,
+  operation_cost,
+  total_cost,
+  calories_consumed,
+  segment_id
+)
+SELECT
+  so2,
+  so2_saved,
+  nox,
+  nox_saved,
+  co2,
+  co2_saved,
+  co,
+  co_saved,
+  pm10,
+  pm10_saved,
+  fuel_cost,
+  time_cost,
+  depreciation_cost,
+  operation_cost,
+  total_cost,
+  calories_consumed,
+  segment_id
+FROM moved
@@ -0,0 +1,33 @@
+WITH moved AS (
+  DELETE FROM smb_staging_segment
+  WHERE track_id = ANY(%(track_ids)s)
+  RETURNING *
+)
+INSERT INTO tracks_segment (
+  id,
+  track_id,
+  user_uuid,
+  vehicle_type,
+  geom,
+  geom_medium,
+  geom_low,
+  start_date,
+  end_date,
+  length_m,
+  duration_s,
+  avg_speed_kmh
+)
+SELECT
+  id,
+  track_id,
+  user_uuid,
+  vehicle_type,
+  geom,
+  geom_medium,
+  geom_low,
+  start_date,
+  end_date,
+  length_m,
+  duration_s,
+  avg_speed_kmh
+FROM moved
@@ -0,0 +1 @@
+SELECT pg_advisory_unlock_shared(%(lock_class)s, %(lock_id)s)
@@ -0,0 +1,11 @@
+UPDATE tracks_track AS t SET
+  aggregated_emissions = v.aggregated_emissions::jsonb,
+  aggregated_costs = v.aggregated_costs::jsonb,
+  aggregated_health = v.aggregated_health::jsonb
+FROM (VALUES %s) AS v (
+  id,
+  aggregated_emissions,
+  aggregated_costs,
+  aggregated_health
+)
+WHERE t.id = v.id
@@ -0,0 +1,17 @@
+UPDATE tracks_track SET
+  aggregated_emissions = %(aggregated_emissions)s,
+  aggregated_costs = %(aggregated_costs)s,
+  aggregated_health = %(aggregated_health)s,
+  geom = sq.geom,
+  geom_medium = ST_SimplifyPreserveTopology(sq.geom, %(medium_tolerance)s::double precision),
+  geom_low = ST_SimplifyPreserveTopology(sq.geom, %(low_tolerance)s::double precision),
+  length = ST_Length(sq.geom::geography),
+  start_date = %(start_date)s::timestamptz,
+  end_date = %(end_date)s::timestamptz,
+  duration = %(duration)s::double precision,
+  is_valid = %(is_valid)s::boolean,
+  validation_error = %(validation_error)s::text
+FROM (
+  SELECT ST_SetSRID(ST_GeomFromWKB(%(geom)s::bytea), 4326) AS geom
+) AS sq
+WHERE id = %(track_id)s
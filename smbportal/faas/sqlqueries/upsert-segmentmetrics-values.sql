@@ -0,0 +1,36 @@
+INSERT INTO tracks_segmentmetrics (
+  so2,
+  so2_saved,
+  nox,
+  nox_saved,
+  co2,
+  co2_saved,
+  co,
+  co_saved,
+  pm10,
+  pm10_saved,
+  fuel_cost,
+  time_cost,
+  depreciation_cost,
+  operation_cost,
+  total_cost,
+  calories_consumed,
+  segment_id
+) VALUES %s
+ON CONFLICT (segment_id) DO UPDATE SET
+  so2 = EXCLUDED.so2,
+  so2_saved = EXCLUDED.so2_saved,
+  nox = EXCLUDED.nox,
+  nox_saved = EXCLUDED.nox_saved,
+  co2 = EXCLUDED.co2,
+  co2_saved = EXCLUDED.co2_saved,
+  co = EXCLUDED.co,
+  co_saved = EXCLUDED.co_saved,
+  pm10 = EXCLUDED.pm10,
+  pm10_saved = EXCLUDED.pm10_saved,
+  fuel_cost = EXCLUDED.fuel_cost,
+  time_cost = EXCLUDED.time_cost,
+  depreciation_cost = EXCLUDED.depreciation_cost,
+  operation_cost = EXCLUDED.operation_cost,
+  total_cost = EXCLUDED.total_cost,
+  calories_consumed = EXCLUDED.calories_consumed
@@ -0,0 +1,213 @@
+#########################################################################
+#
+# Copyright 2018, GeoSolutions Sas.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+#
+#########################################################################
+
+"""Storage backends for the track data files uploaded by the smb-app
+
+Data files are stored in AWS S3 in production. The local filesystem backend
+is useful for running the ingestion offline, e.g. when replaying an archive
+of production uploads or when benchmarking.
+
+The backend is chosen with the ``SMB_STORAGE_BACKEND`` setting (either
+``s3`` or ``local``):
+
+>>> storage = get_storage("smb-bucket")
+>>> with storage.open("cognito/smb/<uuid>/<file>.zip") as data_file:
+...     data = data_file.read()
+
+"""
+
+from collections import namedtuple
+import contextlib
+import hashlib
+import io
+import pathlib
+import shutil
+import tempfile
+import threading
+from typing import Optional
+import zipfile
+
+import boto3
+
+from . import _settings
+
+S3 = "s3"
+LOCAL = "local"
+
+# name of the S3 user-defined metadata entry with the track's session id
+SESSION_ID_METADATA_KEY = "session-id"
+
+# data file field with the track's session id
+SESSION_ID_FIELD = "sessionId"
+
+ObjectMetadata = namedtuple("ObjectMetadata", [
+    "size",
+    "content_hash",
+    "session_id",
+])
+
+
+class TrackStorage:
+    """Base class for storage backends"""
+
+    def open(self, object_key: str):
+        """Return a context manager that provides a binary file object"""
+        raise NotImplementedError
+
+    def get_metadata(self, object_key: str) -> ObjectMetadata:
+        """Return information about an object, without downloading it
+
+        The ``content_hash`` is an opaque value, specific to each backend,
+        that changes when the object's contents change. Values of different
+        backends cannot be compared, so the same object stored by two
+        backends is only recognized through its ``session_id``, which is
+        ``None`` when the backend does not know it.
+
+        """
+
+        raise NotImplementedError
+
+
+class S3Storage(TrackStorage):
+
+    def __init__(self, bucket_name: str):
+        self.bucket_name = bucket_name
+        self._local = threading.local()
+
+    def __getstate__(self):
+        # boto3 resources cannot be pickled, they are created on demand
+        state = self.__dict__.copy()
+        del state["_local"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    @property
+    def resource(self):
+        # boto3 resources are not thread safe, so each thread gets its own
+        resource = getattr(self._local, "resource", None)
+        if resource is None:
+            resource = boto3.resource("s3")
+            self._local.resource = resource
+        return resource
+
+    @contextlib.contextmanager
+    def open(self, object_key: str):
+        """Download an object and provide a file object for its contents
+
+        The object's body is copied to a temporary file in chunks, so memory
+        usage does not depend on the size of the object. Small objects, up to
+        the ``SMB_MAX_IN_MEMORY_DOWNLOAD_SIZE`` setting, are kept in memory
+        instead.
+
+        """
+
+        response = self.resource.Object(self.bucket_name, object_key).get()
+        if response["ContentLength"] <= _settings.MAX_IN_MEMORY_DOWNLOAD_SIZE:
+            data_file = io.BytesIO()
+        else:
+            data_file = tempfile.TemporaryFile()
+        with data_file:
+            shutil.copyfileobj(
+                response["Body"], data_file, _settings.DOWNLOAD_CHUNK_SIZE)
+            data_file.seek(0)
+            yield data_file
+
+    def get_metadata(self, object_key: str) -> ObjectMetadata:
+        response = self.resource.meta.client.head_object(
+            Bucket=self.bucket_name, Key=object_key)
+        # the ETag is not always the MD5 digest of the contents (e.g. for
+        # multipart uploads or SSE-KMS encrypted objects), but it is stable
+        return ObjectMetadata(
+            size=response["ContentLength"],
+            content_hash=response["ETag"].strip('"'),
+            session_id=response.get("Metadata", {}).get(
+                SESSION_ID_METADATA_KEY)
+        )
+
+
+class LocalStorage(TrackStorage):
+    """Store objects as files, with their keys being relative paths"""
+
+    def __init__(self, root):
+        self.root = pathlib.Path(root)
+
+    def get_path(self, object_key: str) -> pathlib.Path:
+        return self.root / object_key
+
+    def open(self, object_key: str):
+        return self.get_path(object_key).open("rb")
+
+    def get_metadata(self, object_key: str) -> ObjectMetadata:
+        """Return information about a file, without reading all of it
+
+        The ``content_hash`` is derived from the file's path, size and
+        modification time. The ``session_id`` is read from the first point
+        of the data file.
+
+        """
+
+        path = self.get_path(object_key).resolve()
+        stat = path.stat()
+        identity = "{}:{}:{}".format(path, stat.st_size, stat.st_mtime_ns)
+        return ObjectMetadata(
+            size=stat.st_size,
+            content_hash="local-{}".format(
+                hashlib.md5(identity.encode("utf-8")).hexdigest()),
+            session_id=_read_session_id(path)
+        )
+
+
+def _read_session_id(path: pathlib.Path) -> Optional[str]:
+    """Return the session id of the first point of a zipped data file
+
+    Returns ``None`` if the file cannot be read, in which case ingesting it
+    fails later on anyway.
+
+    """
+
+    try:
+        with zipfile.ZipFile(str(path)) as zip_handler:
+            for member_name in zip_handler.namelist():
+                with zip_handler.open(member_name) as member_handler:
+                    lines = io.TextIOWrapper(
+                        member_handler, encoding="utf-8")
+                    header = next(lines, "").rstrip("\r\n").split(",")
+                    first_point = next(lines, "").rstrip("\r\n").split(",")
+                if SESSION_ID_FIELD in header:
+                    index = header.index(SESSION_ID_FIELD)
+                    if index < len(first_point) and first_point[index]:
+                        return first_point[index]
+    except (OSError, ValueError, zipfile.BadZipFile):
+        pass
+    return None
+
+
+def get_storage(bucket_name: str = None, backend: str = None) -> TrackStorage:
+    """Return the storage backend for the input bucket
+
+    When using the local backend, each bucket is a directory under the
+    ``SMB_LOCAL_STORAGE_ROOT`` setting. If no bucket is given, keys are
+    relative to the root directory itself.
+
+    """
+
+    backend = backend or _settings.STORAGE_BACKEND
+    if backend == S3:
+        result = S3Storage(bucket_name)
+    elif backend == LOCAL:
+        root = pathlib.Path(_settings.LOCAL_STORAGE_ROOT)
+        result = LocalStorage(
+            root / bucket_name if bucket_name is not None else root)
+    else:
+        raise RuntimeError("Invalid storage backend: {!r}".format(backend))
+    return result
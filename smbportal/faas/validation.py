@@ -0,0 +1,251 @@
+#########################################################################
+#
+# Copyright 2018, GeoSolutions Sas.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+#
+#########################################################################
+
+"""Validation of a track's points during ingestion
+
+All checks are done with a few vectorized operations over the point
+arrays, before segments and their metrics are calculated:
+
+- timestamps must mostly increase, in the order points were recorded;
+- the median GPS accuracy must not be too poor;
+- the track must be long enough, both in duration and in length;
+- consecutive points must not be far apart at an impossible speed (GPS
+  jumps);
+- the average speed of each run of points with the same vehicle type must
+  be plausible for that vehicle type.
+
+Thresholds are defined in ``_constants``:
+
+>>> error = get_validation_error(
+...     timestamps=np.array([0, 1000]),
+...     coordinates=np.array([[11.25, 43.77], [11.26, 43.77]]),
+...     vehicle_types=np.array([1, 1]),
+... )
+>>> error.split("; ")
+['Track lasts 1 s, the minimum is 60 s',
+ 'Average speed of foot segment is 2899 km/h, the maximum is 20 km/h']
+
+"""
+
+from collections import namedtuple
+from typing import List
+from typing import Optional
+
+import numpy as np
+
+from . import _constants
+from . import segmentation
+from ._constants import VehicleType
+
+ValidationRules = namedtuple("ValidationRules", [
+    "max_average_speeds",  # km/h, indexed by VehicleType value
+    "jump_distance_m",
+    "jump_speed_km_h",
+    "min_duration_s",
+    "min_length_m",
+    "max_median_accuracy_m",
+    "max_non_monotonic_fraction",
+])
+
+
+def build_validation_rules(constants=_constants) -> ValidationRules:
+    size = max(vehicle_type.value for vehicle_type in VehicleType) + 1
+    max_average_speeds = np.full(size, np.inf, dtype=np.float64)
+    for vehicle_type in VehicleType:
+        max_average_speeds[vehicle_type.value] = (
+            constants.MAXIMUM_AVERAGE_SPEED.get(vehicle_type, np.inf))
+    return ValidationRules(
+        max_average_speeds=max_average_speeds,
+        jump_distance_m=constants.GPS_JUMP["distance"][0],
+        jump_speed_km_h=constants.GPS_JUMP["speed"][0],
+        min_duration_s=constants.MINIMUM_TRACK_DURATION[0],
+        min_length_m=constants.MINIMUM_TRACK_LENGTH[0],
+        max_median_accuracy_m=constants.MAXIMUM_MEDIAN_ACCURACY[0],
+        max_non_monotonic_fraction=constants.MAXIMUM_NON_MONOTONIC_FRACTION,
+    )
+
+
+RULES = build_validation_rules()
+
+
+class AccuracyHistogram:
+    """Running median of GPS accuracies, in fixed memory
+
+    Accuracies are counted in bins of ``bin_size_m`` meters, so the median
+    is known with that resolution. Accuracies above ``max_accuracy_m`` are
+    counted in the last bin. NaN values are ignored. With an even number of
+    accuracies, the lower of the two middle ones is the median.
+
+    """
+
+    def __init__(self, bin_size_m: float = 1,
+                 max_accuracy_m: float = 1000):
+        self.bin_size_m = bin_size_m
+        self._counts = np.zeros(
+            int(np.ceil(max_accuracy_m / bin_size_m)) + 1, dtype=np.int64)
+
+    def __len__(self):
+        return int(self._counts.sum())
+
+    def add(self, accuracy: float):
+        if accuracy == accuracy:
+            self._counts[self._get_bin(accuracy)] += 1
+
+    def get_median(self) -> Optional[float]:
+        """Return the median accuracy, or ``None`` if none is known"""
+        total = len(self)
+        if total == 0:
+            result = None
+        else:
+            median_bin = np.searchsorted(
+                np.cumsum(self._counts), total / 2, side="left")
+            result = float(median_bin * self.bin_size_m)
+        return result
+
+    def _get_bin(self, accuracy: float) -> int:
+        return min(
+            max(int(round(accuracy / self.bin_size_m)), 0),
+            len(self._counts) - 1
+        )
+
+
+def get_validation_error(timestamps: np.ndarray, coordinates: np.ndarray,
+                         vehicle_types: np.ndarray,
+                         accuracies: np.ndarray = None,
+                         rules: ValidationRules = RULES,
+                         median_accuracy: float = None) -> Optional[str]:
+    """Check whether a track is valid
+
+    Arrays hold one item per point, in the order points were recorded.
+    ``timestamps`` are in milliseconds, ``coordinates`` is an array of
+    (longitude, latitude) pairs, ``vehicle_types`` holds ``VehicleType``
+    values and ``accuracies`` are in meters, with NaN where unknown.
+    Callers that do not keep every accuracy can pass their
+    ``median_accuracy`` instead.
+
+    Returns ``None`` if the track is valid, otherwise a description of every
+    failed check.
+
+    """
+
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    num_points = len(timestamps)
+    if num_points < 2:
+        return "Track has {} points, at least 2 are needed".format(num_points)
+    errors = []
+    errors.extend(_check_timestamp_order(timestamps, rules))
+    if accuracies is not None:
+        median_accuracy = _get_median_accuracy(accuracies)
+    errors.extend(_check_accuracy(median_accuracy, rules))
+    order = np.argsort(timestamps, kind="mergesort")
+    timestamps = timestamps[order]
+    coordinates = np.asarray(coordinates, dtype=np.float64)[order]
+    vehicle_types = np.asarray(vehicle_types, dtype=np.intp)[order]
+    distances = segmentation.get_geodesic_distances(
+        coordinates[:-1, 0],
+        coordinates[:-1, 1],
+        coordinates[1:, 0],
+        coordinates[1:, 1]
+    )
+    intervals_hours = np.diff(timestamps) / (1000 * 60 * 60)
+    errors.extend(_check_size(timestamps, distances, rules))
+    errors.extend(_check_jumps(distances, intervals_hours, rules))
+    errors.extend(
+        _check_speeds(vehicle_types, distances, intervals_hours, rules))
+    return "; ".join(errors) if len(errors) > 0 else None
+
+
+def _check_timestamp_order(timestamps, rules) -> List[str]:
+    backwards = np.count_nonzero(np.diff(timestamps) < 0)
+    fraction = backwards / (len(timestamps) - 1)
+    if fraction > rules.max_non_monotonic_fraction:
+        result = [
+            "{} of {} timestamps are earlier than the previous one".format(
+                backwards, len(timestamps))
+        ]
+    else:
+        result = []
+    return result
+
+
+def _get_median_accuracy(accuracies) -> Optional[float]:
+    accuracies = np.asarray(accuracies, dtype=np.float64)
+    known = accuracies[~np.isnan(accuracies)]
+    return float(np.median(known)) if len(known) > 0 else None
+
+
+def _check_accuracy(median_accuracy, rules) -> List[str]:
+    result = []
+    if (median_accuracy is not None and
+            median_accuracy > rules.max_median_accuracy_m):
+        result.append(
+            "Median GPS accuracy is {:.0f} m, the maximum is {} m".format(
+                median_accuracy, rules.max_median_accuracy_m)
+        )
+    return result
+
+
+def _check_size(timestamps, distances, rules) -> List[str]:
+    result = []
+    duration_s = (timestamps[-1] - timestamps[0]) / 1000
+    if duration_s < rules.min_duration_s:
+        result.append(
+            "Track lasts {:.0f} s, the minimum is {} s".format(
+                duration_s, rules.min_duration_s)
+        )
+    length_m = distances.sum()
+    if length_m < rules.min_length_m:
+        result.append(
+            "Track is {:.0f} m long, the minimum is {} m".format(
+                length_m, rules.min_length_m)
+        )
+    return result
+
+
+def _check_jumps(distances, intervals_hours, rules) -> List[str]:
+    speeds = np.full(len(distances), np.inf)
+    np.divide(
+        distances / 1000, intervals_hours, out=speeds,
+        where=intervals_hours > 0
+    )
+    jumps = np.count_nonzero(
+        (distances > rules.jump_distance_m) & (speeds > rules.jump_speed_km_h))
+    return ["Track has {} GPS jumps".format(jumps)] if jumps > 0 else []
+
+
+def _check_speeds(vehicle_types, distances, intervals_hours,
+                  rules) -> List[str]:
+    """Check the average speed of each run of points with the same vehicle"""
+    run_ids = np.concatenate(([0], np.cumsum(np.diff(vehicle_types) != 0)))
+    num_runs = run_ids[-1] + 1
+    run_vehicle_types = vehicle_types[
+        np.concatenate(([0], np.flatnonzero(np.diff(run_ids)) + 1))]
+    # steps between runs belong to neither of them
+    within_run = run_ids[1:] == run_ids[:-1]
+    step_runs = run_ids[:-1][within_run]
+    lengths_km = np.bincount(
+        step_runs, weights=distances[within_run] / 1000, minlength=num_runs)
+    durations_hours = np.bincount(
+        step_runs, weights=intervals_hours[within_run], minlength=num_runs)
+    speeds = np.zeros(num_runs)
+    np.divide(
+        lengths_km, durations_hours, out=speeds, where=durations_hours > 0)
+    limits = rules.max_average_speeds[run_vehicle_types]
+    result = []
+    for index in np.flatnonzero(speeds > limits):
+        result.append(
+            "Average speed of {} segment is {:.0f} km/h, the maximum is "
+            "{:.0f} km/h".format(
+                VehicleType(run_vehicle_types[index]).name,
+                speeds[index],
+                limits[index]
+            )
+        )
+    return result
@@ -0,0 +1,217 @@
+#########################################################################
+#
+# Copyright 2018, GeoSolutions Sas.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+#
+#########################################################################
+
+"""Ingestion of many tracks in parallel
+
+Tracks are distributed among a pool of worker processes. Each worker holds
+its own DB connection and takes care of downloading, parsing, calculating
+segment data and saving everything to the DB for the tracks it receives.
+
+>>> report = ingest_many(
+...     ["cognito/smb/<uuid>/<file>.zip", ...],
+...     db_params={"dbname": "smb", "user": "smb", "password": "smb"},
+...     storage=get_storage("smb-bucket"),
+...     num_workers=4
+... )
+>>> print(format_report(report))
+
+A session is never ingested twice, even if it is present in several of the
+input objects, as workers reserve each session before ingesting it. Objects
+that have already been ingested are skipped without being downloaded.
+
+"""
+
+from collections import namedtuple
+import logging
+import multiprocessing
+import time
+from typing import Iterable
+from typing import List
+
+from . import datareceiver
+from .priorities import INTERACTIVE
+from .priorities import validate_priority
+from .storage import LocalStorage
+from .storage import TrackStorage
+
+logger = logging.getLogger(__name__)
+
+INGESTED = "ingested"
+DUPLICATE = "duplicate"
+FAILED = "failed"
+
+TaskResult = namedtuple("TaskResult", [
+    "worker",
+    "object_key",
+    "status",
+    "track_id",
+    "num_points",
+    "num_segments",
+    "seconds",
+    "error",
+])
+
+WorkerReport = namedtuple("WorkerReport", [
+    "worker",
+    "tracks",
+    "duplicates",
+    "failures",
+    "points",
+    "segments",
+    "seconds",
+    "points_per_second",
+])
+
+PoolReport = namedtuple("PoolReport", [
+    "workers",
+    "results",
+    "seconds",
+])
+
+# state of each worker process, set by the pool's initializer
+_worker_state = {}
+
+
+def ingest_many(object_keys: Iterable[str], db_params: dict,
+                storage: TrackStorage = None,
+                num_workers: int = None,
+                priority: str = INTERACTIVE) -> PoolReport:
+    """Ingest tracks using a pool of worker processes
+
+    ``object_keys`` are keys of objects in ``storage``. If no storage is
+    given, they are treated as paths to local files instead.
+    ``db_params`` are passed to ``datareceiver.get_db_connection`` in order
+    to create each worker's DB connection. The number of workers defaults to
+    the number of CPUs. Tracks are ingested with the ``priority`` class,
+    replays of archives should use ``priorities.BACKFILL``.
+
+    """
+
+    validate_priority(priority)
+    unique_keys = list(dict.fromkeys(object_keys))
+    start = time.perf_counter()
+    pool = multiprocessing.Pool(
+        processes=num_workers,
+        initializer=_init_worker,
+        initargs=(db_params, storage or LocalStorage("."), priority)
+    )
+    try:
+        results = list(pool.imap_unordered(_ingest_object, unique_keys))
+    finally:
+        pool.close()
+        pool.join()
+    return PoolReport(
+        workers=get_worker_reports(results),
+        results=results,
+        seconds=time.perf_counter() - start
+    )
+
+
+def get_worker_reports(results: List[TaskResult]) -> List[WorkerReport]:
+    by_worker = {}
+    for result in results:
+        by_worker.setdefault(result.worker, []).append(result)
+    reports = []
+    for worker, worker_results in sorted(by_worker.items()):
+        ingested = [r for r in worker_results if r.status == INGESTED]
+        points = sum(r.num_points for r in ingested)
+        seconds = sum(r.seconds for r in worker_results)
+        reports.append(
+            WorkerReport(
+                worker=worker,
+                tracks=len(ingested),
+                duplicates=len(
+                    [r for r in worker_results if r.status == DUPLICATE]),
+                failures=len(
+                    [r for r in worker_results if r.status == FAILED]),
+                points=points,
+                segments=sum(r.num_segments for r in ingested),
+                seconds=seconds,
+                points_per_second=points / seconds if seconds > 0 else 0,
+            )
+        )
+    return reports
+
+
+def format_report(report: PoolReport) -> str:
+    lines = []
+    for worker in report.workers:
+        lines.append(
+            "{0.worker}: {0.tracks} tracks, {0.duplicates} duplicates, "
+            "{0.failures} failures, {0.points} points, {0.segments} "
+            "segments in {0.seconds:.2f}s "
+            "({0.points_per_second:.0f} points/s)".format(worker)
+        )
+    total_points = sum(worker.points for worker in report.workers)
+    lines.append(
+        "Total: {} objects, {} points in {:.2f}s ({:.0f} points/s)".format(
+            len(report.results),
+            total_points,
+            report.seconds,
+            total_points / report.seconds if report.seconds > 0 else 0
+        )
+    )
+    return "\n".join(lines)
+
+
+def _init_worker(db_params: dict, storage: TrackStorage, priority: str):
+    _worker_state.update({
+        "db_params": db_params,
+        "storage": storage,
+        "priority": priority,
+        "db_connection": None,
+    })
+
+
+def _get_worker_connection():
+    """Return the worker's DB connection, opening it when needed
+
+    Connections are not opened by the pool's initializer: should that fail,
+    the pool would keep replacing the worker and never return.
+
+    """
+
+    connection = _worker_state["db_connection"]
+    if connection is None or connection.closed:
+        connection = datareceiver.get_db_connection(
+            **_worker_state["db_params"])
+        _worker_state["db_connection"] = connection
+    return connection
+
+
+def _ingest_object(object_key: str) -> TaskResult:
+    worker = multiprocessing.current_process().name
+    start = time.perf_counter()
+    result = None
+    error = None
+    try:
+        connection = _get_worker_connection()
+        result = datareceiver.ingest_object(
+            object_key, _worker_state["storage"], connection,
+            priority=_worker_state["priority"]
+        )
+        status = INGESTED
+    except datareceiver.DuplicateTrackError as exc:
+        status = DUPLICATE
+        error = str(exc)
+    except Exception as exc:
+        logger.exception("Could not ingest {}".format(object_key))
+        status = FAILED
+        error = str(exc)
+    return TaskResult(
+        worker=worker,
+        object_key=object_key,
+        status=status,
+        track_id=result.track_id if result is not None else None,
+        num_points=result.num_points if result is not None else 0,
+        num_segments=result.num_segments if result is not None else 0,
+        seconds=time.perf_counter() - start,
+        error=error
+    )
@@ -21,6 +21,31 @@ from .. import models
 
 logger = logging.getLogger(__name__)
 
+# name of the query parameter used to request a geometry resolution
+RESOLUTION_PARAMETER = "resolution"
+
+
+def get_geometry_resolution(context) -> str:
+    """Return the geometry resolution requested by the client
+
+    Clients may ask for simplified geometries by providing a ``resolution``
+    query parameter with a value of ``full``, ``medium`` or ``low``.
+
+    """
+
+    request = context.get("request")
+    resolution = models.FULL_RESOLUTION
+    if request is not None:
+        resolution = request.query_params.get(
+            RESOLUTION_PARAMETER, models.FULL_RESOLUTION)
+    if resolution not in models.GEOMETRY_RESOLUTIONS:
+        choices = ", ".join(models.GEOMETRY_RESOLUTIONS)
+        raise serializers.ValidationError({
+            RESOLUTION_PARAMETER: f"Invalid resolution {resolution!r}. "
+                                  f"Choose one of: {choices}"
+        })
+    return resolution
+
 
 class TrackListSerializer(serializers.ModelSerializer):
     owner = SmbUserHyperlinkedRelatedField(
@@ -187,35 +212,36 @@ class SegmentSerializer(serializers.ModelSerializer):
     )
 
     def get_geom(self, obj):
-        return obj.geom.geojson
+        resolution = get_geometry_resolution(self.context)
+        return obj.get_geom(resolution).geojson
 
     def get_emissions(self, obj):
         try:
-            emissions = obj.emission
+            emissions = obj.metrics
             serializer = EmissionSerializer(
                 instance=emissions, context=self.context)
             result = serializer.data
-        except models.Emission.DoesNotExist:
+        except models.SegmentMetrics.DoesNotExist:
             result = None
         return result
 
     def get_costs(self, obj):
         try:
-            costs = obj.cost
+            costs = obj.metrics
             serializer = CostSerializer(
                 instance=costs, context=self.context)
             result = serializer.data
-        except models.Cost.DoesNotExist:
+        except models.SegmentMetrics.DoesNotExist:
             result = None
         return result
 
     def get_health(self, obj):
         try:
-            health = obj.health
+            health = obj.metrics
             serializer = HealthSerializer(
                 instance=health, context=self.context)
             result = serializer.data
-        except models.Health.DoesNotExist:
+        except models.SegmentMetrics.DoesNotExist:
             result = None
         return result
 
@@ -230,6 +256,9 @@ class SegmentSerializer(serializers.ModelSerializer):
             "end_date",
             "vehicle_type",
             "vehicle_id",
+            "length_m",
+            "duration_s",
+            "avg_speed_kmh",
             "emissions",
             "costs",
             "health",
@@ -256,6 +285,9 @@ class MySegmentSerializer(SegmentSerializer):
             "end_date",
             "vehicle_type",
             "vehicle_id",
+            "length_m",
+            "duration_s",
+            "avg_speed_kmh",
             "emissions",
             "costs",
             "health",
@@ -284,7 +316,7 @@ class MyBriefSegmentSerializer(MySegmentSerializer):
 
 class EmissionSerializer(serializers.ModelSerializer):
     class Meta:
-        model = models.Emission
+        model = models.SegmentMetrics
         fields = (
             "so2",
             "so2_saved",
@@ -301,7 +333,7 @@ class EmissionSerializer(serializers.ModelSerializer):
 
 class CostSerializer(serializers.ModelSerializer):
     class Meta:
-        model = models.Cost
+        model = models.SegmentMetrics
         fields = (
             "fuel_cost",
             "time_cost",
@@ -313,7 +345,7 @@ class CostSerializer(serializers.ModelSerializer):
 
 class HealthSerializer(serializers.ModelSerializer):
     class Meta:
-        model = models.Health
+        model = models.SegmentMetrics
         fields = (
             "calories_consumed",
             "benefit_index",
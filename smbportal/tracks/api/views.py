@@ -32,7 +32,7 @@ class MySegmentViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin,
 
     def get_queryset(self):
         return models.Segment.objects.filter(
-            track__owner=self.request.user)
+            track__owner=self.request.user).select_related("metrics")
 
     def get_serializer_class(self):
         if self.action == "list":
@@ -95,4 +95,4 @@ class SegmentViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin,
     required_permissions = (
         "tracks.can_list_segments",
     )
-    queryset = models.Segment.objects.all()
+    queryset = models.Segment.objects.select_related("metrics")
@@ -0,0 +1,371 @@
+#########################################################################
+#
+# Copyright 2018, GeoSolutions Sas.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+#
+#########################################################################
+
+"""Cold archive of old collected points
+
+Points older than ``settings.POINT_ARCHIVE_AGE_DAYS`` are rarely used, but
+they make the indexes and the maintenance of ``tracks_collectedpoint``
+slower. ``archive_points`` moves them to the monthly files of
+``faas.pointarchive``, stored in ``settings.POINT_ARCHIVE_DIR``, and
+``iter_archived_points`` reads them back as unsaved
+:model:`tracks.CollectedPoint` instances, so that exports can include them.
+
+Points are read and written one chunk at a time. When the table is
+partitioned by month (see ``faas.partitions``), the partitions of the months
+that are entirely older than the cutoff date are detached, archived and
+dropped, without deleting their rows one by one. The points of the month
+that contains the cutoff date, and those that are in the default partition,
+are deleted after each chunk is written.
+
+If the archival is interrupted, running it again does not duplicate any
+point.
+
+"""
+
+from collections import namedtuple
+import datetime as dt
+import logging
+import pathlib
+from typing import Iterator
+from typing import List
+
+from django.conf import settings
+from django.contrib.gis.geos import Point
+from django.db import transaction
+from django.db.models import Min
+from psycopg2 import sql
+import pytz
+
+from faas import partitions
+from faas import pointarchive
+from faas.partitions import add_months
+from faas.partitions import get_month
+from vehicles.models import Bike
+
+from .models import CollectedPoint
+
+logger = logging.getLogger(__name__)
+
+ArchivedMonth = namedtuple("ArchivedMonth", [
+    "month",
+    "points",  # points that were moved from the DB
+    "files",  # part files of the month in the archive
+])
+
+DEFAULT_CHUNK_SIZE = 20000
+
+POINTS_TABLE = "tracks_collectedpoint"
+
+# part names of the files written from a detached partition start with this
+# prefix, the others are named after the id of their first point
+_PARTITION_PART_PREFIX = "p"
+
+# model fields of the archived columns, longitude and latitude both come
+# from the point geometry
+_QUERY_FIELDS = [
+    "the_geom" if name == "longitude" else name
+    for name, _ in pointarchive.ARCHIVE_COLUMNS
+    if name != "latitude"
+]
+
+# selects a chunk of a detached partition, with the archived columns
+_PARTITION_CHUNK_QUERY = sql.SQL(
+    "SELECT {columns} FROM {table} WHERE id > %s ORDER BY id LIMIT %s")
+
+_PARTITION_COLUMNS = sql.SQL(", ").join(
+    sql.SQL("round(extract(epoch FROM timestamp) * 1000)::bigint")
+    if name == "timestamp" else
+    sql.SQL("ST_X(the_geom)") if name == "longitude" else
+    sql.SQL("ST_Y(the_geom)") if name == "latitude" else
+    sql.Identifier(name)
+    for name, _ in pointarchive.ARCHIVE_COLUMNS
+)
+
+
+def get_archive_dir() -> pathlib.Path:
+    return pathlib.Path(settings.POINT_ARCHIVE_DIR)
+
+
+def get_cutoff_date(age_days: int = None) -> dt.datetime:
+    """Return the date before which points are archived"""
+    age_days = age_days if age_days is not None else (
+        settings.POINT_ARCHIVE_AGE_DAYS)
+    return dt.datetime.now(pytz.utc) - dt.timedelta(days=age_days)
+
+
+def archive_points(before: dt.datetime, db_connection,
+                   archive_dir: pathlib.Path = None,
+                   chunk_size: int = DEFAULT_CHUNK_SIZE,
+                   progress=None) -> List[ArchivedMonth]:
+    """Move the points collected before a date to the archive
+
+    ``db_connection`` is a psycopg2 connection, which is used for detaching
+    and dropping partitions. Points are archived one month at a time.
+    ``progress`` is called with the ``ArchivedMonth`` of each month. Points
+    that are the last known position of a bike are kept in the DB.
+
+    """
+
+    archive_dir = archive_dir or get_archive_dir()
+    results = _archive_partitions(
+        before, db_connection, archive_dir, chunk_size, progress)
+    points_qs = _get_archivable_points(before)
+    first_date = points_qs.aggregate(first=Min("timestamp"))["first"]
+    if first_date is None:
+        return results
+    month = get_month(first_date)
+    while month <= get_month(before):
+        month_start = dt.datetime(month.year, month.month, 1, tzinfo=pytz.utc)
+        next_month = add_months(month, 1)
+        month_end = min(
+            before,
+            dt.datetime(next_month.year, next_month.month, 1, tzinfo=pytz.utc)
+        )
+        month_qs = points_qs.filter(
+            timestamp__gte=month_start, timestamp__lt=month_end)
+        result = _archive_month_rows(month, month_qs, archive_dir, chunk_size)
+        if result is not None:
+            results.append(result)
+            if progress is not None:
+                progress(result)
+        month = next_month
+    return results
+
+
+def iter_archived_points(start_date: dt.datetime = None,
+                         end_date: dt.datetime = None,
+                         vehicle_types=None, tracks=None,
+                         archive_dir: pathlib.Path = None
+                         ) -> Iterator[CollectedPoint]:
+    """Yield the archived points that match the filters
+
+    Points are yielded one part file at a time, sorted by timestamp within
+    each part.
+
+    """
+
+    archive_dir = archive_dir or get_archive_dir()
+    track_ids = [track.pk for track in tracks] if tracks else None
+    for month in pointarchive.get_archive_months(
+            archive_dir, start=start_date, end=end_date):
+        for path in pointarchive.get_month_paths(archive_dir, month):
+            columns = pointarchive.read_part(path)
+            mask = pointarchive.get_filter_mask(
+                columns,
+                start=start_date,
+                end=end_date,
+                vehicle_types=vehicle_types,
+                track_ids=track_ids
+            )
+            for point in pointarchive.iter_points(
+                    pointarchive.select(columns, mask)):
+                yield _get_collected_point(point)
+
+
+def _get_last_position_ids() -> List[int]:
+    return list(
+        Bike.objects.filter(last_position__isnull=False).values_list(
+            "last_position_id", flat=True)
+    )
+
+
+def _get_archivable_points(before: dt.datetime):
+    return CollectedPoint.objects.filter(
+        timestamp__lt=before).exclude(id__in=_get_last_position_ids())
+
+
+def _archive_partitions(before: dt.datetime, db_connection,
+                        archive_dir: pathlib.Path, chunk_size: int,
+                        progress) -> List[ArchivedMonth]:
+    """Archive the partitions of the months that end before ``before``
+
+    Partitions that were already detached, either by an interrupted
+    archival or by the ``partitiontracks`` command, are archived too.
+
+    """
+
+    partitions.detach_partitions_before(
+        db_connection, get_month(before), table_names=[POINTS_TABLE])
+    with db_connection:
+        with db_connection.cursor() as cursor:
+            detached = partitions.get_detached_partitions(
+                cursor, POINTS_TABLE)
+    results = []
+    for partition_name in detached:
+        month = partitions.get_partition_month(partition_name)
+        if month >= get_month(before):
+            continue
+        result = _archive_partition(
+            partition_name, month, db_connection, archive_dir, chunk_size)
+        results.append(result)
+        if progress is not None:
+            progress(result)
+    return results
+
+
+def _archive_partition(partition_name: str, month: dt.date, db_connection,
+                       archive_dir: pathlib.Path,
+                       chunk_size: int) -> ArchivedMonth:
+    """Archive a detached partition and drop it
+
+    Bikes' last positions are moved back to the points table first, where
+    they end up in its default partition.
+
+    """
+
+    identifiers = {
+        "parent": sql.Identifier(POINTS_TABLE),
+        "table": sql.Identifier(partition_name),
+    }
+    with db_connection:
+        with db_connection.cursor() as cursor:
+            _restore_last_positions(cursor, identifiers)
+    # files of a previous, interrupted run are written again from scratch
+    pointarchive.remove_parts(archive_dir, month, _PARTITION_PART_PREFIX)
+    num_points = 0
+    last_id = 0
+    while True:
+        with db_connection:
+            with db_connection.cursor() as cursor:
+                cursor.execute(
+                    _PARTITION_CHUNK_QUERY.format(
+                        columns=_PARTITION_COLUMNS,
+                        table=identifiers["table"]
+                    ),
+                    (last_id, chunk_size)
+                )
+                rows = cursor.fetchall()
+        if len(rows) == 0:
+            break
+        pointarchive.write_part(
+            archive_dir,
+            month,
+            "{}{:020d}".format(_PARTITION_PART_PREFIX, rows[0][0]),
+            pointarchive.get_columns(rows)
+        )
+        num_points += len(rows)
+        last_id = rows[-1][0]
+    with db_connection:
+        with db_connection.cursor() as cursor:
+            cursor.execute(
+                sql.SQL("DROP TABLE {table}").format(**identifiers))
+    logger.info("Archived {} points of {:%Y-%m} from partition {}".format(
+        num_points, month, partition_name))
+    return ArchivedMonth(
+        month=month,
+        points=num_points,
+        files=len(pointarchive.get_month_paths(archive_dir, month))
+    )
+
+
+def _restore_last_positions(cursor, identifiers: dict):
+    last_position_ids = _get_last_position_ids()
+    if len(last_position_ids) == 0:
+        return
+    # partitions are created with the columns of the parent table, but not
+    # necessarily in the same order
+    cursor.execute(
+        sql.SQL("SELECT * FROM {table} LIMIT 0").format(**identifiers))
+    columns = sql.SQL(", ").join(
+        sql.Identifier(column.name) for column in cursor.description)
+    cursor.execute(
+        sql.SQL(
+            "INSERT INTO {parent} ({columns}) "
+            "SELECT {columns} FROM {table} WHERE id = ANY(%(ids)s)"
+        ).format(columns=columns, **identifiers),
+        {"ids": last_position_ids}
+    )
+    cursor.execute(
+        sql.SQL("DELETE FROM {table} WHERE id = ANY(%(ids)s)").format(
+            **identifiers),
+        {"ids": last_position_ids}
+    )
+
+
+def _archive_month_rows(month: dt.date, month_qs, archive_dir: pathlib.Path,
+                        chunk_size: int):
+    """Archive the points of a month that are not in a detached partition
+
+    Each chunk is written to its own part file and its rows are deleted
+    right after. The part that is being archived is recorded as pending, so
+    that the deletion of its rows can be completed by the next run if it is
+    interrupted.
+
+    """
+
+    _complete_pending_part(month, archive_dir, chunk_size)
+    num_points = 0
+    while True:
+        rows = list(
+            month_qs.order_by("id").values_list(*_QUERY_FIELDS)[:chunk_size])
+        if len(rows) == 0:
+            break
+        part = "{:020d}".format(rows[0][0])
+        pointarchive.set_pending(archive_dir, month, part)
+        pointarchive.write_part(
+            archive_dir,
+            month,
+            part,
+            pointarchive.get_columns(_get_row(r) for r in rows)
+        )
+        _delete_points([row[0] for row in rows], chunk_size)
+        pointarchive.clear_pending(archive_dir, month)
+        num_points += len(rows)
+    if num_points == 0:
+        return None
+    logger.info("Archived {} points of {:%Y-%m}".format(num_points, month))
+    return ArchivedMonth(
+        month=month,
+        points=num_points,
+        files=len(pointarchive.get_month_paths(archive_dir, month))
+    )
+
+
+def _complete_pending_part(month: dt.date, archive_dir: pathlib.Path,
+                           chunk_size: int):
+    part = pointarchive.get_pending(archive_dir, month)
+    if part is None:
+        return
+    path = pointarchive.get_archive_path(archive_dir, month, part)
+    if path.exists():
+        ids = pointarchive.read_ids(path).tolist()
+        _delete_points(ids, chunk_size)
+        logger.info("Completed the archival of part {} of {:%Y-%m}".format(
+            part, month))
+    pointarchive.clear_pending(archive_dir, month)
+
+
+def _delete_points(ids: List[int], chunk_size: int):
+    for start in range(0, len(ids), chunk_size):
+        with transaction.atomic():
+            CollectedPoint.objects.filter(
+                id__in=ids[start:start + chunk_size]).delete()
+
+
+def _get_row(values: tuple) -> tuple:
+    """Adapt a row of ``_QUERY_FIELDS`` to ``pointarchive.get_columns``"""
+    point_id, track_id, timestamp, geom, *others = values
+    return (
+        point_id,
+        track_id,
+        round(timestamp.timestamp() * 1000),
+        geom.x,
+        geom.y,
+        *others
+    )
+
+
+def _get_collected_point(point: dict) -> CollectedPoint:
+    longitude = point.pop("longitude")
+    latitude = point.pop("latitude")
+    point["timestamp"] = dt.datetime.fromtimestamp(
+        point["timestamp"] / 1000, pytz.utc)
+    return CollectedPoint(
+        the_geom=Point(longitude, latitude, srid=4326), **point)
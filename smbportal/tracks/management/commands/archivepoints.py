@@ -0,0 +1,72 @@
+#########################################################################
+#
+# Copyright 2018, GeoSolutions Sas.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+#
+#########################################################################
+
+import pathlib
+
+from django.core.management.base import BaseCommand
+
+from faas import datareceiver
+from tracks import archive
+
+from .ingesttracks import get_faas_db_params
+
+
+class Command(BaseCommand):
+    help = (
+        "Move old collected points to compressed monthly archive files. "
+        "Archived points are still included in the dashboard's exports"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-a",
+            "--age",
+            type=int,
+            help="Archive points that are older than this number of days. "
+                 "Defaults to the DJANGO_POINT_ARCHIVE_AGE_DAYS setting"
+        )
+        parser.add_argument(
+            "-d",
+            "--archive-dir",
+            type=pathlib.Path,
+            help="Directory of the archive files. Defaults to the "
+                 "DJANGO_POINT_ARCHIVE_DIR setting"
+        )
+        parser.add_argument(
+            "-c",
+            "--chunk-size",
+            type=int,
+            default=archive.DEFAULT_CHUNK_SIZE,
+            help="Number of points that are read, written to each archive "
+                 "file or deleted with each query"
+        )
+
+    def handle(self, *args, **options):
+        before = archive.get_cutoff_date(options.get("age"))
+        self.stdout.write(f"Archiving points collected before {before}")
+        db_connection = datareceiver.get_db_connection(**get_faas_db_params())
+        try:
+            results = archive.archive_points(
+                before,
+                db_connection,
+                archive_dir=options.get("archive_dir"),
+                chunk_size=options["chunk_size"],
+                progress=self._report_progress
+            )
+        finally:
+            db_connection.close()
+        total = sum(result.points for result in results)
+        self.stdout.write(f"Archived {total} points")
+
+    def _report_progress(self, result):
+        self.stdout.write(
+            f"{result.month:%Y-%m}: archived {result.points} points "
+            f"({result.files} archive files for the month)"
+        )
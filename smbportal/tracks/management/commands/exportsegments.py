@@ -35,6 +35,13 @@ class Command(BaseCommand):
                  "exported",
             type=_parse_lookup
         )
+        parser.add_argument(
+            "-r",
+            "--resolution",
+            choices=list(models.GEOMETRY_RESOLUTIONS),
+            default=models.FULL_RESOLUTION,
+            help="Resolution of the exported segment geometries"
+        )
 
     def handle(self, *args, **options):
         segments = models.Segment.objects.all()
@@ -47,4 +54,5 @@ class Command(BaseCommand):
         output_path.parent.mkdir(parents=True, exist_ok=True)
         if output_path.exists():
             output_path.unlink()
-        exporter.export_segments(segments, output_path)
+        exporter.export_segments(
+            segments, output_path, resolution=options["resolution"])
@@ -0,0 +1,77 @@
+#########################################################################
+#
+# Copyright 2018, GeoSolutions Sas.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+#
+#########################################################################
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from faas import priorities
+from faas import storage
+from faas import workerpool
+
+
+def get_faas_db_params(database="default"):
+    """Return the DB connection parameters used by the faas functions"""
+    db_settings = settings.DATABASES[database]
+    return {
+        "dbname": db_settings["NAME"],
+        "user": db_settings["USER"],
+        "password": db_settings["PASSWORD"],
+        "host": db_settings["HOST"] or "localhost",
+        "port": str(db_settings["PORT"] or "5432"),
+    }
+
+
+class Command(BaseCommand):
+    help = "Ingest track data files using a pool of worker processes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "object_keys",
+            nargs="+",
+            help="Keys of the objects to ingest. When no bucket is "
+                 "specified, these are paths to local files instead"
+        )
+        parser.add_argument(
+            "-b",
+            "--bucket",
+            help="Name of the bucket where the objects are stored. The "
+                 "storage backend is defined by the SMB_STORAGE_BACKEND "
+                 "environment variable"
+        )
+        parser.add_argument(
+            "-w",
+            "--workers",
+            type=int,
+            help="Number of worker processes. Defaults to the number of CPUs"
+        )
+        parser.add_argument(
+            "-p",
+            "--priority",
+            choices=priorities.PRIORITIES,
+            default=priorities.INTERACTIVE,
+            help="Priority class of the ingestion. Use 'backfill' when "
+                 "replaying archives, so that fresh uploads are ingested "
+                 "first"
+        )
+
+    def handle(self, *args, **options):
+        bucket = options.get("bucket")
+        report = workerpool.ingest_many(
+            options["object_keys"],
+            db_params=get_faas_db_params(),
+            storage=storage.get_storage(bucket) if bucket else None,
+            num_workers=options.get("workers"),
+            priority=options["priority"]
+        )
+        for result in report.results:
+            if result.status == workerpool.FAILED:
+                self.stderr.write(
+                    f"{result.object_key}: {result.error}")
+        self.stdout.write(workerpool.format_report(report))
@@ -0,0 +1,118 @@
+#########################################################################
+#
+# Copyright 2018, GeoSolutions Sas.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+#
+#########################################################################
+
+import datetime as dt
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from faas import datareceiver
+from faas import partitions
+
+from .ingesttracks import get_faas_db_params
+
+
+def _parse_month(value):
+    try:
+        parsed = dt.datetime.strptime(value, "%Y-%m")
+    except ValueError:
+        raise ValueError(f"Invalid month: {value}")
+    return dt.date(parsed.year, parsed.month, 1)
+
+
+class Command(BaseCommand):
+    help = (
+        "Manage the monthly partitions of the collected points and segments "
+        "tables. Partitions for the coming months are created on every run, "
+        "so this should be scheduled at least monthly"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-t",
+            "--tables",
+            nargs="+",
+            choices=sorted(partitions.PARTITIONED_TABLES),
+            help="Tables to manage. Defaults to all of the partitioned tables"
+        )
+        parser.add_argument(
+            "--convert",
+            action="store_true",
+            help="Convert the tables into partitioned ones, copying existing "
+                 "rows online. The original tables are kept with the "
+                 "'_unpartitioned' suffix and can be dropped afterwards"
+        )
+        parser.add_argument(
+            "-c",
+            "--batch-size",
+            type=int,
+            default=partitions.DEFAULT_BATCH_SIZE,
+            help="Number of ids whose rows are copied in each transaction "
+                 "when converting a table"
+        )
+        parser.add_argument(
+            "-m",
+            "--months-ahead",
+            type=int,
+            default=partitions.DEFAULT_MONTHS_AHEAD,
+            help="Number of future months whose partitions are created"
+        )
+        parser.add_argument(
+            "--detach-before",
+            type=_parse_month,
+            help="Detach the partitions of the months before this one "
+                 "(YYYY-MM)"
+        )
+        parser.add_argument(
+            "--drop",
+            action="store_true",
+            help="Drop the detached partitions instead of keeping them as "
+                 "standalone tables. Detached collected point partitions "
+                 "are archived and dropped by the archivepoints command"
+        )
+
+    def handle(self, *args, **options):
+        table_names = options.get("tables")
+        db_connection = datareceiver.get_db_connection(**get_faas_db_params())
+        try:
+            if options["convert"]:
+                for table_name in table_names or partitions.PARTITIONED_TABLES:
+                    self.stdout.write(f"Converting {table_name}...")
+                    partitions.convert_table(
+                        db_connection,
+                        table_name,
+                        months_ahead=options["months_ahead"],
+                        batch_size=options["batch_size"],
+                        progress=self._report_progress
+                    )
+            created = partitions.create_future_partitions(
+                db_connection,
+                months_ahead=options["months_ahead"],
+                table_names=table_names
+            )
+            for partition_name in created:
+                self.stdout.write(f"Created partition {partition_name}")
+            if options.get("detach_before") is not None:
+                detached = partitions.detach_partitions_before(
+                    db_connection,
+                    options["detach_before"],
+                    drop=options["drop"],
+                    table_names=table_names
+                )
+                action = "Dropped" if options["drop"] else "Detached"
+                for partition_name in detached:
+                    self.stdout.write(f"{action} partition {partition_name}")
+        except RuntimeError as exc:
+            raise CommandError(str(exc))
+        finally:
+            db_connection.close()
+
+    def _report_progress(self, copied):
+        self.stdout.write(f"Copied {copied} rows")
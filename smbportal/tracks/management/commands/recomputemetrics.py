@@ -0,0 +1,104 @@
+#########################################################################
+#
+# Copyright 2018, GeoSolutions Sas.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+#
+#########################################################################
+
+import datetime as dt
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.utils.dateparse import parse_date
+import pytz
+
+from faas import backfill
+
+from .ingesttracks import get_faas_db_params
+
+
+def _parse_date(value):
+    parsed = parse_date(value)
+    if parsed is None:
+        raise ValueError(f"Invalid date: {value}")
+    return dt.datetime(parsed.year, parsed.month, parsed.day, tzinfo=pytz.utc)
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute segment emissions, costs and health data, as well as the "
+        "tracks' aggregated data, using the current coefficients"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-s",
+            "--since",
+            type=_parse_date,
+            help="Only recompute tracks that started on this date (YYYY-MM-DD)"
+                 " or later"
+        )
+        parser.add_argument(
+            "-u",
+            "--until",
+            type=_parse_date,
+            help="Only recompute tracks that started before this date "
+                 "(YYYY-MM-DD)"
+        )
+        parser.add_argument(
+            "-c",
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Number of tracks that are updated in each transaction"
+        )
+        parser.add_argument(
+            "-w",
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of worker processes"
+        )
+        parser.add_argument(
+            "--checkpoint",
+            default="recomputemetrics-checkpoint.json",
+            help="Path of the file where progress is saved. An interrupted "
+                 "run with the same date range is resumed from it"
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ignore any previous checkpoint and start from the first "
+                 "track"
+        )
+
+    def handle(self, *args, **options):
+        checkpoint_path = options["checkpoint"]
+        if options["restart"]:
+            backfill.remove_checkpoint(checkpoint_path)
+        try:
+            report = backfill.recompute_metrics(
+                db_params=get_faas_db_params(),
+                since=options.get("since"),
+                until=options.get("until"),
+                chunk_size=options["chunk_size"],
+                num_workers=options["workers"],
+                checkpoint_path=checkpoint_path,
+                progress=self._report_progress
+            )
+        except RuntimeError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(backfill.format_report(report))
+
+    def _report_progress(self, chunk_result):
+        seconds = chunk_result.seconds
+        self.stdout.write(
+            f"Up to track {chunk_result.last_track_id}: "
+            f"{chunk_result.segments} segments of {chunk_result.tracks} "
+            f"tracks in {seconds:.2f}s "
+            f"({chunk_result.segments / seconds if seconds > 0 else 0:.0f} "
+            f"segments/s)"
+        )
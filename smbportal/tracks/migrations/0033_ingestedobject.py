@@ -0,0 +1,24 @@
+# Generated by Django 2.0 on 2019-08-02 10:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracks', '0032_delete_regionofinterest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestedObject',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(help_text="Hash of the object's contents, as reported by the storage backend", max_length=255, unique=True, verbose_name='content hash')),
+                ('object_key', models.CharField(max_length=1024, verbose_name='object key')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('track', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ingested_objects', to='tracks.Track', verbose_name='track')),
+            ],
+        ),
+    ]
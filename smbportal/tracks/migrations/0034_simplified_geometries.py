@@ -0,0 +1,34 @@
+# Generated by Django 2.0 on 2019-08-05 09:41
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracks', '0033_ingestedobject'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='segment',
+            name='geom_low',
+            field=django.contrib.gis.db.models.fields.LineStringField(blank=True, help_text="Simplified version of the segment's geometry, with fewer vertices than the medium resolution one", null=True, srid=4326, verbose_name='low resolution geometry'),
+        ),
+        migrations.AddField(
+            model_name='segment',
+            name='geom_medium',
+            field=django.contrib.gis.db.models.fields.LineStringField(blank=True, help_text="Simplified version of the segment's geometry", null=True, srid=4326, verbose_name='medium resolution geometry'),
+        ),
+        migrations.AddField(
+            model_name='track',
+            name='geom_low',
+            field=django.contrib.gis.db.models.fields.LineStringField(blank=True, help_text="Simplified version of the track's geometry, with fewer vertices than the medium resolution one", null=True, srid=4326, verbose_name='low resolution geometry'),
+        ),
+        migrations.AddField(
+            model_name='track',
+            name='geom_medium',
+            field=django.contrib.gis.db.models.fields.LineStringField(blank=True, help_text="Simplified version of the track's geometry", null=True, srid=4326, verbose_name='medium resolution geometry'),
+        ),
+    ]
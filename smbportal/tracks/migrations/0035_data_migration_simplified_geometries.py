@@ -0,0 +1,29 @@
+# Generated by Django 2.0 on 2019-08-05 09:48
+
+from django.db import migrations
+
+# these are the default tolerances of the faas settings, in degrees
+MEDIUM_TOLERANCE = 0.00005
+LOW_TOLERANCE = 0.0002
+
+
+def simplify_geometries(apps, schema_editor):
+    for table in ("tracks_track", "tracks_segment"):
+        schema_editor.execute(
+            "UPDATE {} SET "
+            "geom_medium = ST_SimplifyPreserveTopology(geom, %s), "
+            "geom_low = ST_SimplifyPreserveTopology(geom, %s) "
+            "WHERE geom IS NOT NULL".format(table),
+            (MEDIUM_TOLERANCE, LOW_TOLERANCE)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracks', '0034_simplified_geometries'),
+    ]
+
+    operations = [
+        migrations.RunPython(simplify_geometries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 2.0 on 2019-08-12 10:30
+
+from django.db import migrations
+
+# UNLOGGED tables, without indexes, where the faas functions stage rows
+# before moving them to the real tables. See faas.datareceiver
+STAGING_TABLES = [
+    ("smb_staging_collectedpoint", "tracks_collectedpoint", True),
+    ("smb_staging_segment", "tracks_segment", False),
+    ("smb_staging_emission", "tracks_emission", True),
+    ("smb_staging_cost", "tracks_cost", True),
+    ("smb_staging_health", "tracks_health", True),
+]
+
+
+def _get_create_sql():
+    statements = []
+    for staging_table, table, drop_id in STAGING_TABLES:
+        statements.append(
+            "CREATE UNLOGGED TABLE {} (LIKE {})".format(staging_table, table))
+        if drop_id:
+            # ids are assigned when rows are moved to the real table
+            statements.append(
+                "ALTER TABLE {} DROP COLUMN id".format(staging_table))
+    return statements
+
+
+def _get_drop_sql():
+    return [
+        "DROP TABLE {}".format(staging_table)
+        for staging_table, _, _ in STAGING_TABLES
+    ]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracks', '0035_data_migration_simplified_geometries'),
+    ]
+
+    operations = [
+        migrations.RunSQL(_get_create_sql(), _get_drop_sql()),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 2.0 on 2019-09-02 09:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracks', '0036_staging_tables'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cost',
+            name='segment',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='tracks.Segment', verbose_name='segment'),
+        ),
+        migrations.AlterField(
+            model_name='emission',
+            name='segment',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='tracks.Segment', verbose_name='segment'),
+        ),
+        migrations.AlterField(
+            model_name='health',
+            name='segment',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='tracks.Segment', verbose_name='segment'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 2.0 on 2019-09-09 11:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracks', '0037_partitioning_foreign_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PackedPoints',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('num_points', models.PositiveIntegerField(verbose_name='number of points')),
+                ('start_date', models.DateTimeField(blank=True, help_text='timestamp of the first point', null=True, verbose_name='start date')),
+                ('end_date', models.DateTimeField(blank=True, help_text='timestamp of the last point', null=True, verbose_name='end date')),
+                ('data', models.BinaryField(help_text='Points, as serialized by faas.pointarrays.pack_points', verbose_name='data')),
+                ('track', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='packed_points', to='tracks.Track', verbose_name='track')),
+            ],
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 2.0 on 2019-09-16 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracks', '0038_packedpoints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='segment',
+            name='avg_speed_kmh',
+            field=models.FloatField(blank=True, help_text='Average speed, measured in km/h', null=True, verbose_name='average speed'),
+        ),
+        migrations.AddField(
+            model_name='segment',
+            name='duration_s',
+            field=models.FloatField(blank=True, help_text='Segment duration, measured in seconds', null=True, verbose_name='duration'),
+        ),
+        migrations.AddField(
+            model_name='segment',
+            name='length_m',
+            field=models.FloatField(blank=True, help_text='Geodesic length of the segment, measured in meters. It is pre-computed during ingestion in order to improve runtime performance.', null=True, verbose_name='length'),
+        ),
+        # the staging table must keep the columns of tracks_segment
+        migrations.RunSQL(
+            [
+                "ALTER TABLE smb_staging_segment "
+                "ADD COLUMN length_m double precision, "
+                "ADD COLUMN duration_s double precision, "
+                "ADD COLUMN avg_speed_kmh double precision",
+            ],
+            [
+                "ALTER TABLE smb_staging_segment "
+                "DROP COLUMN length_m, "
+                "DROP COLUMN duration_s, "
+                "DROP COLUMN avg_speed_kmh",
+            ]
+        ),
+    ]
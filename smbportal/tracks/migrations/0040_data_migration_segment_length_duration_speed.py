@@ -0,0 +1,43 @@
+# Generated by Django 2.0 on 2019-09-16 10:07
+
+from django.db import migrations
+
+# segments are updated in batches of ids, each one committed on its own
+BATCH_SIZE = 10000
+
+
+def calculate_segment_metrics(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT coalesce(max(id), 0) FROM tracks_segment")
+        max_id = cursor.fetchone()[0]
+        for lower_id in range(0, max_id, BATCH_SIZE):
+            cursor.execute(
+                "UPDATE tracks_segment SET "
+                "length_m = sq.length_m, "
+                "duration_s = sq.duration_s, "
+                "avg_speed_kmh = CASE WHEN sq.duration_s > 0 "
+                "THEN (sq.length_m / 1000) / (sq.duration_s / 3600) "
+                "ELSE 0 END "
+                "FROM ("
+                "SELECT id, "
+                "ST_Length(geom::geography) AS length_m, "
+                "EXTRACT(EPOCH FROM end_date - start_date) AS duration_s "
+                "FROM tracks_segment "
+                "WHERE id > %s AND id <= %s AND length_m IS NULL"
+                ") AS sq "
+                "WHERE tracks_segment.id = sq.id",
+                (lower_id, lower_id + BATCH_SIZE)
+            )
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('tracks', '0039_segment_length_duration_speed'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            calculate_segment_metrics, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 2.0 on 2019-09-23 09:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracks', '0040_data_migration_segment_length_duration_speed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SegmentMetrics',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('so2', models.FloatField(blank=True, help_text='Sulphur Dioxide emissions (mg)', null=True, verbose_name='SO2')),
+                ('so2_saved', models.FloatField(blank=True, help_text='Dulphur Dioxide emissions that were prevented (mg)', null=True, verbose_name='SO2 saved')),
+                ('nox', models.FloatField(blank=True, help_text='Nitrogen Oxides emissions (mg)', null=True, verbose_name='NOx')),
+                ('nox_saved', models.FloatField(blank=True, help_text='Nitrogen Oxides emissions that were prevented (mg)', null=True, verbose_name='NOx saved')),
+                ('co2', models.FloatField(blank=True, help_text='Carbon dioxide emissions (g)', null=True, verbose_name='CO2')),
+                ('co2_saved', models.FloatField(blank=True, help_text='Carbon dioxide emissions that were prevented (g)', null=True, verbose_name='CO2 saved')),
+                ('co', models.FloatField(blank=True, help_text='Carbon monoxide emissions (mg)', null=True, verbose_name='CO')),
+                ('co_saved', models.FloatField(blank=True, help_text='Carbon monoxide emissions that were prevented (mg)', null=True, verbose_name='CO saved')),
+                ('pm10', models.FloatField(blank=True, help_text='Particulate Matter up to 10um emissions (mg)', null=True, verbose_name='PM10')),
+                ('pm10_saved', models.FloatField(blank=True, help_text='Particulate Matter up to 10um emissions that were prevented (mg)', null=True, verbose_name='PM10 saved')),
+                ('fuel_cost', models.FloatField(blank=True, help_text='Fuel consumption cost (eur)', null=True, verbose_name='fuel cost')),
+                ('time_cost', models.FloatField(blank=True, help_text='Time spent cost (eur)', null=True, verbose_name='time cost')),
+                ('depreciation_cost', models.FloatField(blank=True, help_text='Vehicle depreciation cost (eur)', null=True, verbose_name='depreciation cost')),
+                ('operation_cost', models.FloatField(blank=True, help_text='Vehicle operation cost (eur)', null=True, verbose_name='operational cost')),
+                ('total_cost', models.FloatField(blank=True, help_text='Total cost (eur)', null=True, verbose_name='total cost')),
+                ('calories_consumed', models.FloatField(blank=True, help_text='Calories consumed (cal)', null=True, verbose_name='calories consumed')),
+                ('benefit_index', models.FloatField(blank=True, help_text="Benefit Index, adapted from World Health Organization's 'Health economic assessment tools (HEAT) for walking and for cycling - Methods and user guide on physical activity, air pollution, injuries and carbon impact assessments'", null=True, verbose_name='benefit index')),
+                ('segment', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='metrics', to='tracks.Segment', verbose_name='segment')),
+            ],
+            options={
+                'verbose_name_plural': 'segment metrics',
+            },
+        ),
+        # the faas functions stage metrics in a single table too
+        migrations.RunSQL(
+            [
+                "CREATE UNLOGGED TABLE smb_staging_segmentmetrics "
+                "(LIKE tracks_segmentmetrics)",
+                "ALTER TABLE smb_staging_segmentmetrics DROP COLUMN id",
+            ],
+            ["DROP TABLE smb_staging_segmentmetrics"],
+        ),
+    ]
@@ -0,0 +1,110 @@
+# Generated by Django 2.0 on 2019-09-23 09:42
+
+from django.db import migrations
+
+# metrics are copied in batches of segment ids, each one committed on its own
+BATCH_SIZE = 10000
+
+EMISSION_COLUMNS = [
+    "so2",
+    "so2_saved",
+    "nox",
+    "nox_saved",
+    "co2",
+    "co2_saved",
+    "co",
+    "co_saved",
+    "pm10",
+    "pm10_saved",
+]
+
+COST_COLUMNS = [
+    "fuel_cost",
+    "time_cost",
+    "depreciation_cost",
+    "operation_cost",
+    "total_cost",
+]
+
+HEALTH_COLUMNS = [
+    "calories_consumed",
+    "benefit_index",
+]
+
+OLD_TABLES = [
+    ("tracks_emission", EMISSION_COLUMNS),
+    ("tracks_cost", COST_COLUMNS),
+    ("tracks_health", HEALTH_COLUMNS),
+]
+
+
+def _get_max_segment_id(cursor, table_names):
+    cursor.execute(
+        "SELECT coalesce(max(segment_id), 0) FROM ({}) AS ids".format(
+            " UNION ALL ".join(
+                "SELECT max(segment_id) AS segment_id FROM {}".format(name)
+                for name in table_names
+            )
+        )
+    )
+    return cursor.fetchone()[0]
+
+
+def copy_to_segment_metrics(apps, schema_editor):
+    columns = [
+        "{}.{}".format(table, column)
+        for table, table_columns in OLD_TABLES for column in table_columns
+    ]
+    segment_ids = " UNION ".join(
+        "SELECT segment_id FROM {} "
+        "WHERE segment_id > %(lower)s AND segment_id <= %(upper)s".format(
+            table)
+        for table, _ in OLD_TABLES
+    )
+    joins = " ".join(
+        "LEFT JOIN {} USING (segment_id)".format(table)
+        for table, _ in OLD_TABLES
+    )
+    query = (
+        "INSERT INTO tracks_segmentmetrics (segment_id, {}) "
+        "SELECT ids.segment_id, {} FROM ({}) AS ids {} "
+        "ON CONFLICT (segment_id) DO NOTHING".format(
+            ", ".join(column.split(".")[1] for column in columns),
+            ", ".join(columns),
+            segment_ids,
+            joins
+        )
+    )
+    with schema_editor.connection.cursor() as cursor:
+        max_id = _get_max_segment_id(
+            cursor, [table for table, _ in OLD_TABLES])
+        for lower_id in range(0, max_id, BATCH_SIZE):
+            cursor.execute(
+                query, {"lower": lower_id, "upper": lower_id + BATCH_SIZE})
+
+
+def copy_from_segment_metrics(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        max_id = _get_max_segment_id(cursor, ["tracks_segmentmetrics"])
+        for lower_id in range(0, max_id, BATCH_SIZE):
+            for table, table_columns in OLD_TABLES:
+                cursor.execute(
+                    "INSERT INTO {0} (segment_id, {1}) "
+                    "SELECT segment_id, {1} FROM tracks_segmentmetrics "
+                    "WHERE segment_id > %s AND segment_id <= %s".format(
+                        table, ", ".join(table_columns)),
+                    (lower_id, lower_id + BATCH_SIZE)
+                )
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('tracks', '0041_segmentmetrics'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            copy_to_segment_metrics, copy_from_segment_metrics),
+    ]
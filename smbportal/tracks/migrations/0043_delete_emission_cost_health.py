@@ -0,0 +1,43 @@
+# Generated by Django 2.0 on 2019-09-23 09:45
+
+from django.db import migrations
+
+OLD_STAGING_TABLES = [
+    ("smb_staging_emission", "tracks_emission"),
+    ("smb_staging_cost", "tracks_cost"),
+    ("smb_staging_health", "tracks_health"),
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracks', '0042_data_migration_segmentmetrics'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            [
+                "DROP TABLE {}".format(staging_table)
+                for staging_table, _ in OLD_STAGING_TABLES
+            ],
+            [
+                statement
+                for staging_table, table in OLD_STAGING_TABLES
+                for statement in (
+                    "CREATE UNLOGGED TABLE {} (LIKE {})".format(
+                        staging_table, table),
+                    "ALTER TABLE {} DROP COLUMN id".format(staging_table),
+                )
+            ],
+        ),
+        migrations.DeleteModel(
+            name='Cost',
+        ),
+        migrations.DeleteModel(
+            name='Emission',
+        ),
+        migrations.DeleteModel(
+            name='Health',
+        ),
+    ]
@@ -8,12 +8,20 @@
 #
 #########################################################################
 
+import datetime as dt
+
 from django.conf import settings
 from django.db import models
 from django.contrib.gis.db import models as gismodels
 from django.contrib.gis.db.models.functions import Length
+from django.contrib.gis.geos import Point
+from django.contrib.gis.measure import Distance
 from django.contrib.postgres.fields import JSONField
 from django.utils.translation import gettext_lazy as _
+import numpy as np
+import pytz
+
+from faas import pointarrays
 
 BIKE = "bike"
 BUS = "bus"
@@ -31,8 +39,40 @@ VEHICLE_CHOICES = (
     (TRAIN, _("train")),
 )
 
+FULL_RESOLUTION = "full"
+MEDIUM_RESOLUTION = "medium"
+LOW_RESOLUTION = "low"
+
+# name of the geometry field that stores each resolution
+GEOMETRY_RESOLUTIONS = {
+    FULL_RESOLUTION: "geom",
+    MEDIUM_RESOLUTION: "geom_medium",
+    LOW_RESOLUTION: "geom_low",
+}
+
+
+class MultiResolutionGeometryMixin:
+    """Provides access to the simplified versions of a model's geometry
+
+    Simplified geometries are generated by the ingestion functions, using
+    the tolerances defined in the faas settings.
+
+    """
 
-class Track(models.Model):
+    def get_geom(self, resolution=FULL_RESOLUTION):
+        """Return the geometry with the requested resolution
+
+        Falls back to the full resolution geometry when the simplified one
+        has not been generated.
+
+        """
+
+        field_name = GEOMETRY_RESOLUTIONS[resolution]
+        geom = getattr(self, field_name)
+        return geom if geom is not None else self.geom
+
+
+class Track(MultiResolutionGeometryMixin, models.Model):
     owner = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE
@@ -87,6 +127,19 @@ class Track(models.Model):
         null=True,
         blank=True,
     )
+    geom_medium = gismodels.LineStringField(
+        _("medium resolution geometry"),
+        null=True,
+        blank=True,
+        help_text=_("Simplified version of the track's geometry")
+    )
+    geom_low = gismodels.LineStringField(
+        _("low resolution geometry"),
+        null=True,
+        blank=True,
+        help_text=_("Simplified version of the track's geometry, with fewer "
+                    "vertices than the medium resolution one")
+    )
     length = models.FloatField(
         _("length"),
         blank=True,
@@ -109,6 +162,37 @@ class Track(models.Model):
         ordering = ["-start_date"]
 
 
+class IngestedObject(models.Model):
+    """Ledger of the track data files that have already been ingested
+
+    Objects are identified by a hash of their contents, which allows
+    rejecting duplicate uploads before downloading them.
+
+    """
+
+    track = models.ForeignKey(
+        "Track",
+        on_delete=models.CASCADE,
+        verbose_name=_("track"),
+        related_name="ingested_objects",
+    )
+    content_hash = models.CharField(
+        _("content hash"),
+        max_length=255,
+        unique=True,
+        help_text=_("Hash of the object's contents, as reported by the "
+                    "storage backend")
+    )
+    object_key = models.CharField(
+        _("object key"),
+        max_length=1024,
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.object_key
+
+
 class CollectedPoint(gismodels.Model):
 
     vehicle_id = models.CharField(
@@ -154,7 +238,110 @@ class CollectedPoint(gismodels.Model):
         ordering = ["timestamp"]
 
 
-class Segment(gismodels.Model):
+class PackedPointsManager(models.Manager):
+
+    def iter_points(self, start_date=None, end_date=None, vehicle_types=None,
+                    tracks=None):
+        """Yield the packed points that match the filters
+
+        Points are rebuilt as unsaved :model:`tracks.CollectedPoint`
+        instances, so that they can be used in place of stored ones.
+
+        """
+
+        packed_qs = self.get_queryset()
+        if start_date is not None:
+            packed_qs = packed_qs.filter(end_date__gte=start_date)
+        if end_date is not None:
+            packed_qs = packed_qs.filter(start_date__lte=end_date)
+        if tracks:
+            packed_qs = packed_qs.filter(track__in=tracks)
+        for packed_points in packed_qs.order_by("start_date").iterator():
+            yield from packed_points.get_points(
+                start_date=start_date,
+                end_date=end_date,
+                vehicle_types=vehicle_types
+            )
+
+
+class PackedPoints(models.Model):
+    """Stores all the collected points of a track in a single row
+
+    These replace :model:`tracks.CollectedPoint` rows when tracks are
+    ingested with the faas ``SMB_POINT_STORAGE_MODE`` setting set to
+    ``packed``. Points are kept as compressed arrays, one per column.
+
+    """
+
+    track = models.OneToOneField(
+        "Track",
+        on_delete=models.CASCADE,
+        verbose_name=_("track"),
+        related_name="packed_points",
+    )
+    num_points = models.PositiveIntegerField(
+        _("number of points"),
+    )
+    start_date = models.DateTimeField(
+        _("start date"),
+        blank=True,
+        null=True,
+        help_text=_("timestamp of the first point")
+    )
+    end_date = models.DateTimeField(
+        _("end date"),
+        blank=True,
+        null=True,
+        help_text=_("timestamp of the last point")
+    )
+    data = models.BinaryField(
+        _("data"),
+        help_text=_("Points, as serialized by faas.pointarrays.pack_points")
+    )
+
+    objects = PackedPointsManager()
+
+    def __str__(self):
+        return "{0.track} - {0.num_points} points".format(self)
+
+    def get_points(self, start_date=None, end_date=None, vehicle_types=None):
+        """Rebuild the points, sorted by timestamp"""
+        arrays = pointarrays.unpack_points(bytes(self.data))
+        vehicle_type_names = np.array(
+            pointarrays.get_vehicle_type_names(arrays.vehicle_types))
+        mask = np.ones(len(arrays), dtype=bool)
+        if start_date is not None:
+            mask &= arrays.timestamps >= start_date.timestamp() * 1000
+        if end_date is not None:
+            mask &= arrays.timestamps <= end_date.timestamp() * 1000
+        if vehicle_types:
+            mask &= np.isin(vehicle_type_names, list(vehicle_types))
+        indexes = np.flatnonzero(mask)
+        indexes = indexes[
+            np.argsort(arrays.timestamps[indexes], kind="mergesort")]
+        points = []
+        for index in indexes.tolist():
+            longitude, latitude = arrays.coordinates[index].tolist()
+            sensor_values = {
+                column: float(values[index])
+                for column, values in arrays.sensors.items()
+                if not np.isnan(values[index])
+            }
+            points.append(
+                CollectedPoint(
+                    track_id=self.track_id,
+                    vehicle_type=vehicle_type_names[index],
+                    the_geom=Point(longitude, latitude, srid=4326),
+                    sessionid=int(arrays.session_ids[index]),
+                    timestamp=dt.datetime.fromtimestamp(
+                        int(arrays.timestamps[index]) / 1000, pytz.utc),
+                    **sensor_values
+                )
+            )
+        return points
+
+
+class Segment(MultiResolutionGeometryMixin, gismodels.Model):
     """Stores a computed segment from a track.
 
     Computation is made from the relevant :model:`tracks.CollectedPoint`
@@ -188,6 +375,19 @@ class Segment(gismodels.Model):
     geom = gismodels.LineStringField(
         _("geometry"),
     )
+    geom_medium = gismodels.LineStringField(
+        _("medium resolution geometry"),
+        null=True,
+        blank=True,
+        help_text=_("Simplified version of the segment's geometry")
+    )
+    geom_low = gismodels.LineStringField(
+        _("low resolution geometry"),
+        null=True,
+        blank=True,
+        help_text=_("Simplified version of the segment's geometry, with "
+                    "fewer vertices than the medium resolution one")
+    )
     start_date = models.DateTimeField(
         _("start date"),
         help_text=_("timestamp of first collected point of the segment"),
@@ -196,6 +396,26 @@ class Segment(gismodels.Model):
         _("end date"),
         help_text=_("timestamp of last collected point of the segment")
     )
+    length_m = models.FloatField(
+        _("length"),
+        null=True,
+        blank=True,
+        help_text=_("Geodesic length of the segment, measured in meters. "
+                    "It is pre-computed during ingestion in order to "
+                    "improve runtime performance.")
+    )
+    duration_s = models.FloatField(
+        _("duration"),
+        null=True,
+        blank=True,
+        help_text=_("Segment duration, measured in seconds")
+    )
+    avg_speed_kmh = models.FloatField(
+        _("average speed"),
+        null=True,
+        blank=True,
+        help_text=_("Average speed, measured in km/h")
+    )
 
     class Meta:
         ordering = ["start_date"]
@@ -205,26 +425,73 @@ class Segment(gismodels.Model):
         """Duration of a segment"""
         return self.end_date - self.start_date
 
+    # emissions, costs and health data used to be stored in separate
+    # models. These accessors keep the old names working, they all return
+    # the segment's :model:`tracks.SegmentMetrics`
+
+    @property
+    def emission(self):
+        return self.metrics
+
+    @property
+    def cost(self):
+        return self.metrics
+
+    @property
+    def health(self):
+        return self.metrics
+
     def __str__(self):
         return "{0.track} - {0.vehicle_type} - {0.start_date}".format(self)
 
     def get_length(self):
-        annotated_qs = Segment.objects.filter(id=self.id).annotate(
-            length=Length("geom", spheroid=True))
-        return annotated_qs.first().length
+        """Return the segment's length as a ``Distance``
+
+        Segments that have not been updated with the pre-computed length
+        fall back to calculating it in the DB.
+
+        """
+
+        if self.length_m is not None:
+            result = Distance(m=self.length_m)
+        else:
+            annotated_qs = Segment.objects.filter(id=self.id).annotate(
+                length=Length("geom", spheroid=True))
+            result = annotated_qs.first().length
+        return result
+
+    def get_duration_seconds(self):
+        if self.duration_s is not None:
+            result = self.duration_s
+        else:
+            result = self.duration.total_seconds()
+        return result
 
     def get_average_speed(self):
         """Return average speed in km/h"""
-        length_km = self.get_length().km
-        duration_hour = self.duration.seconds / 3600
-        return length_km / duration_hour if duration_hour > 0 else 0
+        if self.avg_speed_kmh is not None:
+            result = self.avg_speed_kmh
+        else:
+            length_km = self.get_length().km
+            duration_hour = self.get_duration_seconds() / 3600
+            result = length_km / duration_hour if duration_hour > 0 else 0
+        return result
+
 
+class SegmentMetrics(models.Model):
+    """Emissions, costs and health data of a :model:`tracks.Segment`
+
+    All metrics are stored in a single row, so that reading or writing them
+    costs one join or one INSERT for each segment.
+
+    """
 
-class Emission(models.Model):
     segment = models.OneToOneField(
         "Segment",
         on_delete=models.CASCADE,
-        verbose_name=_("segment")
+        verbose_name=_("segment"),
+        related_name="metrics",
+        db_constraint=False,  # segments are stored in a partitioned table
     )
     so2 = models.FloatField(
         _("SO2"),
@@ -288,13 +555,6 @@ class Emission(models.Model):
                     "were prevented (mg)")
     )
 
-
-class Cost(models.Model):
-    segment = models.OneToOneField(
-        "Segment",
-        on_delete=models.CASCADE,
-        verbose_name=_("segment")
-    )
     fuel_cost = models.FloatField(
         _("fuel cost"),
         null=True,
@@ -326,16 +586,6 @@ class Cost(models.Model):
         help_text=_("Total cost (eur)")
     )
 
-    def __str__(self):
-        return "{0.segment} - {0.total_cost}".format(self)
-
-
-class Health(models.Model):
-    segment = models.OneToOneField(
-        "Segment",
-        on_delete=models.CASCADE,
-        verbose_name=_("segment")
-    )
     calories_consumed = models.FloatField(
         _("calories consumed"),
         null=True,
@@ -353,5 +603,8 @@ class Health(models.Model):
                     "assessments'")
     )
 
+    class Meta:
+        verbose_name_plural = _("segment metrics")
+
     def __str__(self):
-        return "{0.segment} - {0.benefit_index}".format(self)
+        return "{0.segment} - {0.total_cost}".format(self)
@@ -184,7 +184,6 @@ Calories consumption
 """
 
 from django.db.models import Sum
-from django.contrib.gis.db.models.functions import Length as gis_length
 
 from . import models
 
@@ -192,14 +191,14 @@ from . import models
 def get_total_distance_by_vehicle_type(user):
     """Return the total distance (in km) traveled with each vehicle type"""
     annotated_segments = _get_annotated_segment_data(
-        annotations={"distance": gis_length("geom", spheroid=True)},
+        annotations={"distance": Sum("length_m")},
         annotate_by=["vehicle_type"],
         segment_filters={"track__owner": user}
     )
     result = {}
     for item in annotated_segments:
         result.setdefault(item["vehicle_type"], 0)
-        result[item["vehicle_type"]] += item["distance"].km
+        result[item["vehicle_type"]] += (item["distance"] or 0) / 1000
     return result
 
 
@@ -246,7 +245,7 @@ def get_aggregated_data(data_type, annotate_by=None, segment_filters=None,
 def get_annotated_health(annotate_by=None, segment_filters=None,
                          annotation_prefix="", annotation_function=Sum):
     aggregation_functions = get_health_aggregation_functions(
-        lookup_pattern="health__{}",
+        lookup_pattern="metrics__{}",
         name_prefix=annotation_prefix,
         annotation_function=annotation_function
     )
@@ -260,7 +259,7 @@ def get_annotated_health(annotate_by=None, segment_filters=None,
 def get_annotated_emissions(annotate_by=None, segment_filters=None,
                             annotation_prefix="", annotation_function=Sum):
     aggregation_functions = get_emission_aggregation_functions(
-        lookup_pattern="emission__{}",
+        lookup_pattern="metrics__{}",
         name_prefix=annotation_prefix,
         annotation_function=annotation_function
     )
@@ -274,7 +273,7 @@ def get_annotated_emissions(annotate_by=None, segment_filters=None,
 def get_annotated_costs(annotate_by=None, segment_filters=None,
                         annotation_prefix="", annotation_function=Sum):
     aggregation_functions = get_cost_aggregation_functions(
-        lookup_pattern="cost__{}",
+        lookup_pattern="metrics__{}",
         name_prefix=annotation_prefix,
         annotation_function=annotation_function
     )
@@ -0,0 +1,20 @@
+# Generated by Django 2.0 on 2019-09-02 09:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracks', '0037_partitioning_foreign_keys'),
+        ('vehicles', '0019_auto_20180806_1327'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='bike',
+            name='last_position',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='tracks.CollectedPoint', verbose_name='last position'),
+        ),
+    ]
@@ -43,7 +43,8 @@ class Vehicle(models.Model):
         models.CASCADE,
         verbose_name=_("last position"),
         blank=True,
-        null=True
+        null=True,
+        db_constraint=False,  # points are stored in a partitioned table
     )
 
     def save(self, *args, **kwargs):
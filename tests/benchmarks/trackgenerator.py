@@ -0,0 +1,145 @@
+#########################################################################
+#
+# Copyright 2018, GeoSolutions Sas.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+#
+#########################################################################
+
+"""Generate synthetic track data files in the smb-app format
+
+Files are zipped CSV files, with a header line and the columns defined in
+``faas.datareceiver._DATA_FIELDS``. They are saved with the same key layout
+used by the smb-app in S3 (``cognito/smb/<owner uuid>/<session>.zip``).
+
+"""
+
+import datetime as dt
+import io
+import math
+import pathlib
+import random
+import sys
+from typing import Iterator
+from typing import List
+from typing import Sequence
+import zipfile
+
+sys.path.insert(0, str(pathlib.Path(__file__).parents[2] / "smbportal"))
+
+from faas import datareceiver  # noqa: E402
+
+EARTH_RADIUS_METERS = 6371000
+
+# average speed (km/h) for each of the smb-app vehicle modes
+VEHICLE_MODE_SPEEDS = {
+    "1": 5,  # foot
+    "2": 16,  # bike
+    "3": 22,  # bus
+    "4": 35,  # car
+    "5": 28,  # moped
+    "6": 70,  # train
+}
+
+
+def generate_track_lines(session_id: int, duration_seconds: int,
+                         sampling_rate_hz: float = 1,
+                         vehicle_modes: Sequence[str] = ("2",),
+                         start: dt.datetime = None,
+                         seed: int = None) -> Iterator[str]:
+    """Yield the data lines of a synthetic track
+
+    The track's duration is split evenly between each of the input
+    ``vehicle_modes``, so that the track has a vehicle mode switch between
+    each of them.
+
+    """
+
+    randomizer = random.Random(seed)
+    start = start or dt.datetime(2018, 9, 1, 8, tzinfo=dt.timezone.utc)
+    num_points = int(duration_seconds * sampling_rate_hz)
+    step_seconds = 1 / sampling_rate_hz
+    points_per_mode = max(1, math.ceil(num_points / len(vehicle_modes)))
+    latitude = 43.77 + randomizer.uniform(-0.05, 0.05)
+    longitude = 11.25 + randomizer.uniform(-0.05, 0.05)
+    bearing = randomizer.uniform(0, 2 * math.pi)
+    for index in range(num_points):
+        vehicle_mode = vehicle_modes[
+            min(index // points_per_mode, len(vehicle_modes) - 1)]
+        speed_m_s = (
+            VEHICLE_MODE_SPEEDS.get(vehicle_mode, 10) / 3.6 *
+            randomizer.uniform(0.7, 1.3)
+        )
+        bearing += randomizer.gauss(0, 0.1)
+        distance = speed_m_s * step_seconds
+        latitude += math.degrees(
+            distance * math.cos(bearing) / EARTH_RADIUS_METERS)
+        longitude += math.degrees(
+            distance * math.sin(bearing) /
+            (EARTH_RADIUS_METERS * math.cos(math.radians(latitude)))
+        )
+        timestamp = start.timestamp() + index * step_seconds
+        values = {
+            "accelerationX": randomizer.uniform(-1, 1),
+            "accelerationY": randomizer.uniform(-1, 1),
+            "accelerationZ": randomizer.uniform(9, 10.5),
+            "accuracy": randomizer.uniform(3, 15),
+            "batConsumptionPerHour": randomizer.uniform(0, 5),
+            "batteryLevel": 80,
+            "deviceBearing": math.degrees(bearing) % 360,
+            "devicePitch": randomizer.uniform(-10, 10),
+            "deviceRoll": randomizer.uniform(-10, 10),
+            "elevation": randomizer.uniform(40, 60),
+            "gps_bearing": math.degrees(bearing) % 360,
+            "humidity": 0,
+            "latitude": latitude,
+            "longitude": longitude,
+            "lumen": 0,
+            "pressure": 0,
+            "proximity": 0,
+            "sessionId": session_id,
+            "speed": speed_m_s,
+            "temperature": 0,
+            "timeStamp": int(timestamp * 1000),
+            "vehicleMode": vehicle_mode,
+            "serialVersionUID": 1,
+        }
+        yield ",".join(
+            str(values[field]) for field in datareceiver._DATA_FIELDS)
+
+
+def get_zipped_track(lines: Iterator[str]) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(
+            buffer, mode="w", compression=zipfile.ZIP_DEFLATED) as zh:
+        contents = "\n".join(
+            [",".join(datareceiver._DATA_FIELDS)] + list(lines))
+        zh.writestr("data.csv", contents + "\n")
+    return buffer.getvalue()
+
+
+def generate_track_files(root: pathlib.Path, owner_uuid: str,
+                         num_tracks: int, duration_seconds: int,
+                         sampling_rate_hz: float = 1,
+                         vehicle_modes: Sequence[str] = ("2",),
+                         seed: int = None) -> List[str]:
+    """Write synthetic track files under ``root`` and return their keys"""
+    randomizer = random.Random(seed)
+    keys = []
+    for _ in range(num_tracks):
+        session_id = randomizer.getrandbits(40)
+        key = "cognito/smb/{}/{}.zip".format(owner_uuid, session_id)
+        path = root / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        lines = generate_track_lines(
+            session_id,
+            duration_seconds,
+            sampling_rate_hz=sampling_rate_hz,
+            vehicle_modes=vehicle_modes,
+            seed=randomizer.getrandbits(32)
+        )
+        path.write_bytes(get_zipped_track(lines))
+        keys.append(key)
+    return keys
@@ -0,0 +1,76 @@
+#########################################################################
+#
+# Copyright 2018, GeoSolutions Sas.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+#
+#########################################################################
+
+import json
+from unittest import mock
+
+import numpy as np
+import pytest
+
+from faas import backfill
+from faas import metrics
+
+pytestmark = pytest.mark.unit
+
+
+def test_get_aggregated_metrics_by_track():
+    segment_metrics = metrics.calculate_segment_metrics(
+        vehicle_types=[4, 4, 2],
+        lengths_km=[10, 5, 3],
+        durations_hours=[0.5, 0.25, 0.2],
+    )
+    result = backfill.get_aggregated_metrics_by_track(
+        np.array([1, 1, 2]), segment_metrics)
+    assert sorted(result) == [1, 2]
+    assert result[1]["emissions"]["co2"] == pytest.approx(
+        segment_metrics["co2"][:2].sum())
+    assert result[2]["costs"]["time_cost"] == pytest.approx(
+        segment_metrics["time_cost"][2])
+
+
+@mock.patch("faas.backfill.queries.registry", autospec=True)
+def test_recompute_track_metrics(mock_registry):
+    cursor = mock.MagicMock()
+    cursor.fetchall.return_value = [
+        (10, 1, "car", 10000.0, 1800.0),
+        (11, 1, "bike", 3000.0, 0.0),
+    ]
+    num_segments = backfill.recompute_track_metrics([1, 2], cursor)
+    assert num_segments == 2
+    calls = {
+        c[0][1]: c[0][2] for c in mock_registry.execute_values.call_args_list}
+    metric_rows = calls["upsert-segmentmetrics-values.sql"]
+    assert [row[-1] for row in metric_rows] == [10, 11]
+    assert [row[-2] for row in metric_rows] == [0.0, 0.0]
+    track_rows = calls["update-track-aggregated-values.sql"]
+    assert [row[0] for row in track_rows] == [1, 2]
+    assert json.loads(track_rows[0][2])["time_cost"] == pytest.approx(
+        0.5 * metrics.COEFFICIENTS.time_cost_per_hour)
+    assert track_rows[1][1:] == (None, None, None)
+
+
+def test_checkpoint_round_trip(tmpdir):
+    path = str(tmpdir.join("checkpoint.json"))
+    assert backfill.load_checkpoint(path) is None
+    checkpoint = backfill.Checkpoint(
+        since="2018-01-01T00:00:00+00:00", until=None, last_track_id=42)
+    backfill.save_checkpoint(path, checkpoint)
+    assert backfill.load_checkpoint(path) == checkpoint
+    backfill.remove_checkpoint(path)
+    assert backfill.load_checkpoint(path) is None
+
+
+@mock.patch("faas.backfill.datareceiver.get_db_connection", autospec=True)
+def test_recompute_chunk_connects_lazily(mock_get_db_connection):
+    mock_get_db_connection.side_effect = ConnectionError("DB is down")
+    backfill._init_worker({"dbname": "smb", "user": "smb", "password": "smb"})
+    mock_get_db_connection.assert_not_called()
+    with pytest.raises(ConnectionError):
+        backfill._recompute_chunk([1, 2])
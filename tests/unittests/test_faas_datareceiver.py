@@ -0,0 +1,297 @@
+#########################################################################
+#
+# Copyright 2018, GeoSolutions Sas.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+#
+#########################################################################
+
+import datetime as dt
+import io
+import struct
+from unittest import mock
+import zipfile
+
+import pytest
+import pytz
+
+from faas import datareceiver
+
+pytestmark = pytest.mark.unit
+
+_HEADER = ",".join(datareceiver._DATA_FIELDS)
+
+
+def _get_point_line(timestamp, vehicle_mode="2"):
+    values = dict.fromkeys(datareceiver._DATA_FIELDS, "1")
+    values.update({
+        "latitude": "43.77",
+        "longitude": "11.25",
+        "sessionId": "123",
+        "timeStamp": str(timestamp),
+        "vehicleMode": vehicle_mode,
+    })
+    return ",".join(values[field] for field in datareceiver._DATA_FIELDS)
+
+
+def _parse_points(lines, header=_HEADER):
+    field_columns = datareceiver.get_field_columns(header)
+    return list(datareceiver.iter_track_points(
+        (field_columns, line) for line in lines))
+
+
+def _get_zipped_track(*members, header=_HEADER):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, mode="w") as zip_handler:
+        for index, lines in enumerate(members):
+            zip_handler.writestr(
+                "member{}.csv".format(index),
+                "\r\n".join([header] + lines) + "\r\n"
+            )
+    buffer.seek(0)
+    return buffer
+
+
+def test_iter_track_data_lines_skips_member_headers():
+    first = [_get_point_line(1536000000000), _get_point_line(1536000001000)]
+    second = [_get_point_line(1536000002000)]
+    data_file = _get_zipped_track(first, second)
+    lines = list(datareceiver.iter_track_data_lines(data_file))
+    assert [line for _, line in lines] == first + second
+
+
+def test_iter_track_data_lines_maps_columns_by_header():
+    header = "timeStamp,extra,vehicleMode,sessionId,latitude,longitude"
+    data_file = _get_zipped_track(
+        ["1536000000000,x,4,123,43.77,11.25"], header=header)
+    points = list(datareceiver.iter_track_points(
+        datareceiver.iter_track_data_lines(data_file)))
+    assert len(points) == 1
+    assert points[0].timeStamp == "1536000000000"
+    assert points[0].vehicleMode == "4"
+    assert (points[0].longitude, points[0].latitude) == ("11.25", "43.77")
+    assert points[0].accuracy is None
+
+
+def test_iter_track_data_lines_missing_required_field():
+    data_file = _get_zipped_track(
+        ["1536000000000,43.77"], header="timeStamp,latitude")
+    with pytest.raises(RuntimeError):
+        list(datareceiver.iter_track_data_lines(data_file))
+
+
+def test_iter_track_points():
+    line = _get_point_line(1536000000000, vehicle_mode="4")
+    points = _parse_points([line])
+    assert len(points) == 1
+    assert points[0].vehicleMode == "4"
+    assert points[0].timeStamp == "1536000000000"
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("1.5", "1.5"),
+    ("a\tb", "a\\tb"),
+    ("a\\b", "a\\\\b"),
+])
+def test_get_point_copy_line_escapes_values(value, expected):
+    point = datareceiver.parse_track_data_line(
+        _get_point_line(1536000000000))._replace(humidity=value)
+    fields = datareceiver._get_point_copy_line(1, point).split("\t")
+    assert fields[0] == "bike"
+    assert fields[2] == "SRID=4326;POINT(11.25 43.77)"
+    assert fields[14] == expected
+    assert fields[-1] == "2018-09-03T18:40:00+00:00\n"
+
+
+def test_insert_collected_points_invalid_strategy():
+    with pytest.raises(RuntimeError):
+        datareceiver.insert_collected_points(1, [], None, strategy="fake")
+
+
+@pytest.mark.parametrize("lock_acquired, exists, expected", [
+    (True, False, True),
+    (True, True, False),
+    (False, None, False),
+])
+def test_claim_track_session(lock_acquired, exists, expected):
+    cursor = mock.MagicMock()
+    cursor.fetchone.side_effect = [(lock_acquired,), (exists,)]
+    assert datareceiver.claim_track_session("123", cursor) == expected
+
+
+def test_is_duplicate_object_without_metadata():
+    connection = mock.MagicMock()
+    metadata = datareceiver.ObjectMetadata(
+        size=10, content_hash=None, session_id=None)
+    assert not datareceiver.is_duplicate_object(metadata, connection)
+    connection.cursor.assert_not_called()
+
+
+@mock.patch("faas.datareceiver.is_duplicate_object", autospec=True)
+def test_ingest_object_rejects_duplicate_before_download(mock_is_duplicate):
+    mock_is_duplicate.return_value = True
+    storage = mock.MagicMock()
+    with pytest.raises(datareceiver.DuplicateTrackError):
+        datareceiver.ingest_object("data.zip", storage, mock.MagicMock())
+    storage.open.assert_not_called()
+
+
+def test_track_points_summary():
+    points = _parse_points([
+        _get_point_line(1535788802000),
+        _get_point_line(1535788800000),
+        _get_point_line(1535788801000),
+    ])
+    summary = datareceiver.TrackPointsSummary()
+    assert list(summary.iter_points(points)) == points
+    assert len(summary) == 3
+    wkb = summary.get_wkb()
+    assert struct.unpack("<BII", wkb[:9]) == (1, 2, 3)
+    assert struct.unpack("<6d", wkb[9:]) == (11.25, 43.77) * 3
+    assert summary.get_start_date() == dt.datetime(
+        2018, 9, 1, 8, tzinfo=pytz.utc)
+    assert summary.get_end_date() == dt.datetime(
+        2018, 9, 1, 8, 0, 2, tzinfo=pytz.utc)
+    assert summary.get_duration_minutes() == pytest.approx(2 / 60)
+
+
+def test_track_points_summary_validates_median_accuracy():
+    lines = [
+        _get_point_line(1535788800000 + index * 10000)
+        for index in range(61)
+    ]
+    summary = datareceiver.TrackPointsSummary()
+    list(summary.iter_points(
+        point._replace(accuracy="100") for point in _parse_points(lines)))
+    assert "Median GPS accuracy is 100 m" in summary.get_validation_error()
+
+
+def test_track_points_summary_without_enough_points():
+    summary = datareceiver.TrackPointsSummary()
+    assert summary.get_wkb() is None
+    assert summary.get_start_date() is None
+    assert summary.get_duration_minutes() is None
+
+
+@mock.patch("faas.datareceiver._insert_batch_tracks", autospec=True)
+@mock.patch("faas.datareceiver._prepare_batch_track", autospec=True)
+def test_ingest_objects_isolates_failures(mock_prepare, mock_insert):
+    def prepare(object_key, storage, db_cursor):
+        if object_key == "bad.zip":
+            raise RuntimeError("Invalid data")
+        return mock.MagicMock(object_key=object_key, track_id=1, segments=[])
+
+    mock_prepare.side_effect = prepare
+    connection = mock.MagicMock()
+    cursor = connection.cursor.return_value.__enter__.return_value
+    results = datareceiver.ingest_objects(
+        ["good.zip", "bad.zip", "good.zip"], mock.MagicMock(), connection)
+    assert [r.object_key for r in results] == ["good.zip", "bad.zip"]
+    assert results[0].error is None
+    assert results[0].result.track_id == 1
+    assert results[1].result is None
+    assert isinstance(results[1].error, RuntimeError)
+    cursor.execute.assert_any_call("ROLLBACK TO SAVEPOINT smb_batch_object")
+    batch_tracks = mock_insert.call_args[0][0]
+    assert [t.object_key for t in batch_tracks] == ["good.zip"]
+
+
+@mock.patch("faas.datareceiver.ingest_object", autospec=True)
+@mock.patch("faas.datareceiver._insert_batch_tracks", autospec=True)
+@mock.patch("faas.datareceiver._prepare_batch_track", autospec=True)
+def test_ingest_objects_falls_back_to_single_objects(mock_prepare,
+                                                     mock_insert,
+                                                     mock_ingest_object):
+    mock_prepare.side_effect = lambda key, *args: mock.MagicMock(
+        object_key=key)
+    mock_insert.side_effect = RuntimeError("Could not insert batch")
+    mock_ingest_object.side_effect = lambda key, *args, **kwargs: key
+    results = datareceiver.ingest_objects(
+        ["a.zip", "b.zip"], mock.MagicMock(), mock.MagicMock())
+    assert [r.result for r in results] == ["a.zip", "b.zip"]
+    assert mock_ingest_object.call_count == 2
+
+
+@mock.patch("faas.datareceiver.update_track_summary", autospec=True)
+@mock.patch("faas.datareceiver.queries.registry", autospec=True)
+def test_insert_batch_tracks_staged(mock_registry, mock_update_summary):
+    track_points = datareceiver.TrackPointsSummary()
+    list(track_points.iter_points(_parse_points([
+        _get_point_line(1535788800000),
+        _get_point_line(1535788860000),
+    ])))
+    track_segments = track_points.get_segments()
+    batch_track = datareceiver._BatchTrack(
+        object_key="a.zip",
+        track_id=1,
+        track_owner="owner",
+        session_id="123",
+        track_points=track_points,
+        copy_data="",
+        packed_points_row=None,
+        num_stored_points=2,
+        validation_error=None,
+        segments=track_segments,
+        segment_metrics=datareceiver._calculate_segment_metrics(
+            track_segments)
+    )
+    cursor = mock.MagicMock()
+    cursor.fetchall.return_value = [(42,)]
+    datareceiver._insert_batch_tracks_staged([batch_track], cursor)
+    staged_segments = mock_registry.execute_values.call_args_list[0][0]
+    assert staged_segments[1] == "insert-staging-segments-values.sql"
+    assert staged_segments[2][0][:2] == (42, 1)
+    executed = [c[0][1:] for c in mock_registry.execute.call_args_list]
+    assert executed[0] == ("get-segment-ids.sql", {"count": 1})
+    assert executed[1:] == [
+        ("merge-staging-collectedpoints.sql", {"track_ids": [1]}),
+        ("merge-staging-segments.sql", {"track_ids": [1]}),
+        ("merge-staging-segmentmetrics.sql", {"segment_ids": [42]}),
+    ]
+    mock_update_summary.assert_called_once()
+
+
+@mock.patch("faas.datareceiver._settings.POINT_STORAGE_MODE", "packed")
+@mock.patch("faas.datareceiver.update_track_summary", autospec=True)
+@mock.patch("faas.datareceiver.queries.registry", autospec=True)
+def test_insert_batch_tracks_packed(mock_registry, mock_update_summary):
+    batch_track = datareceiver._BatchTrack(
+        object_key="a.zip",
+        track_id=1,
+        track_owner="owner",
+        session_id="123",
+        track_points=datareceiver.TrackPointsSummary(),
+        copy_data=None,
+        packed_points_row=(1, 2, None, None, b"packed"),
+        num_stored_points=2,
+        validation_error=None,
+        segments=[],
+        segment_metrics=datareceiver._calculate_segment_metrics([])
+    )
+    datareceiver._insert_batch_tracks([batch_track], mock.MagicMock())
+    mock_registry.copy.assert_not_called()
+    inserted = mock_registry.execute_values.call_args_list[0][0]
+    assert inserted[1:3] == (
+        "insert-packed-points-values.sql", [(1, 2, None, None, b"packed")])
+
+
+@mock.patch("faas.datareceiver._settings.POINT_STORAGE_MODE", "columns")
+def test_is_packed_storage_invalid_mode():
+    with pytest.raises(RuntimeError):
+        datareceiver.is_packed_storage()
+
+
+def test_get_segment_row_includes_length_duration_and_speed():
+    track_points = datareceiver.TrackPointsSummary()
+    list(track_points.iter_points(_parse_points([
+        _get_point_line(1535788800000),
+        _get_point_line(1535788860000),
+    ])))
+    segment = track_points.get_segments()[0]
+    row = datareceiver._get_segment_row(1, "owner", segment)
+    length_m, duration_s, avg_speed_kmh = row[-3:]
+    assert length_m == pytest.approx(segment.length_km * 1000)
+    assert duration_s == pytest.approx(60)
+    assert avg_speed_kmh == pytest.approx(segment.speed_km_h)
@@ -0,0 +1,82 @@
+#########################################################################
+#
+# Copyright 2018, GeoSolutions Sas.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+#
+#########################################################################
+
+import threading
+from unittest import mock
+
+import pytest
+
+from faas import datareceiver
+from faas import fetcher
+from faas import storage
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture
+def local_storage(tmpdir):
+    for name in ("a.zip", "b.zip", "c.zip"):
+        tmpdir.join(name).write_binary(name.encode("utf-8"))
+    return storage.LocalStorage(str(tmpdir))
+
+
+@mock.patch("faas.fetcher.datareceiver", autospec=True)
+def test_ingest_objects(mock_datareceiver, local_storage):
+    mock_datareceiver.is_duplicate_object.side_effect = (
+        lambda metadata, connection: metadata.size == 0)
+    mock_datareceiver.ingest_track_data.side_effect = (
+        lambda data_file, object_key, *args, **kwargs: data_file.read())
+    results = fetcher.ingest_objects(
+        ["a.zip", "b.zip", "missing.zip", "a.zip", "c.zip"],
+        local_storage,
+        mock.MagicMock(),
+        max_downloads=2,
+        queue_size=1
+    )
+    assert [r.object_key for r in results] == [
+        "a.zip", "b.zip", "missing.zip", "c.zip"]
+    assert [r.result for r in results] == [b"a.zip", b"b.zip", None, b"c.zip"]
+    assert isinstance(results[2].error, FileNotFoundError)
+
+
+@mock.patch("faas.fetcher.datareceiver", autospec=True)
+def test_ingest_objects_skips_duplicates(mock_datareceiver, local_storage):
+    mock_datareceiver.is_duplicate_object.return_value = True
+    local_storage.open = mock.MagicMock()
+    results = fetcher.ingest_objects(["a.zip"], local_storage, None)
+    assert isinstance(results[0].error, datareceiver.DuplicateTrackError)
+    local_storage.open.assert_not_called()
+    mock_datareceiver.ingest_track_data.assert_not_called()
+
+
+@mock.patch("faas.fetcher.datareceiver", autospec=True)
+def test_ingest_objects_limits_downloads_in_flight(mock_datareceiver,
+                                                   local_storage):
+    mock_datareceiver.is_duplicate_object.return_value = False
+    lock = threading.Lock()
+    counts = {"current": 0, "max": 0}
+    original_open = local_storage.open
+
+    def open_object(object_key):
+        with lock:
+            counts["current"] += 1
+            counts["max"] = max(counts["max"], counts["current"])
+        threading.Event().wait(0.05)
+        with lock:
+            counts["current"] -= 1
+        return original_open(object_key)
+
+    local_storage.open = open_object
+    fetcher.ingest_objects(
+        ["a.zip", "b.zip", "c.zip"], local_storage, mock.MagicMock(),
+        max_downloads=2
+    )
+    assert counts["max"] == 2
+    assert mock_datareceiver.ingest_track_data.call_count == 3
@@ -0,0 +1,117 @@
+#########################################################################
+#
+# Copyright 2018, GeoSolutions Sas.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+#
+#########################################################################
+
+from unittest import mock
+
+import pytest
+
+from faas import ingestionqueue
+from faas.ingestionqueue import BACKFILL
+from faas.ingestionqueue import INTERACTIVE
+
+pytestmark = pytest.mark.unit
+
+
+def test_interactive_items_are_served_first():
+    queue = ingestionqueue.IngestionQueue()
+    queue.put("b1", BACKFILL)
+    queue.put("i1", INTERACTIVE)
+    queue.put("b2", BACKFILL)
+    queue.put("i2")
+    served = [queue.get(timeout=0).object_key for _ in range(4)]
+    assert served == ["i1", "i2", "b1", "b2"]
+    assert queue.get(timeout=0) is None
+
+
+def test_backfill_is_limited():
+    queue = ingestionqueue.IngestionQueue(max_backfill_in_progress=1)
+    queue.put("b1", BACKFILL)
+    queue.put("b2", BACKFILL)
+    first = queue.get(timeout=0)
+    assert queue.get(timeout=0) is None
+    queue.put("i1", INTERACTIVE)
+    assert queue.get(timeout=0).object_key == "i1"
+    queue.task_done(first)
+    assert queue.get(timeout=0).object_key == "b2"
+
+
+def test_stats():
+    queue = ingestionqueue.IngestionQueue()
+    queue.put("b1", BACKFILL)
+    queue.put("b2", BACKFILL)
+    queue.put("i1", INTERACTIVE)
+    queue.get(timeout=0)
+    stats = queue.get_stats()
+    assert stats[INTERACTIVE].depth == 0
+    assert stats[INTERACTIVE].in_progress == 1
+    assert stats[INTERACTIVE].waits == 1
+    assert stats[INTERACTIVE].max_wait_seconds >= 0
+    assert stats[BACKFILL].depth == 2
+    assert stats[BACKFILL].waits == 0
+
+
+def test_invalid_priority():
+    queue = ingestionqueue.IngestionQueue()
+    with pytest.raises(RuntimeError):
+        queue.put("a", "urgent")
+
+
+def test_closed_queue():
+    queue = ingestionqueue.IngestionQueue()
+    queue.put("a")
+    queue.close()
+    with pytest.raises(RuntimeError):
+        queue.put("b")
+    assert queue.get().object_key == "a"
+    assert queue.get() is None
+
+
+_DB_PARAMS = {"dbname": "smb", "user": "smb", "password": "smb"}
+
+
+@mock.patch("faas.ingestionqueue.datareceiver", autospec=True)
+def test_ingestion_service(mock_datareceiver):
+    mock_datareceiver.DuplicateTrackError = RuntimeError
+    mock_datareceiver.get_db_connection.side_effect = (
+        lambda **kwargs: mock.MagicMock(closed=0))
+    mock_datareceiver.ingest_object.side_effect = (
+        lambda object_key, storage, connection, priority: (
+            object_key.upper(), priority))
+    with ingestionqueue.IngestionService(
+            _DB_PARAMS, mock.MagicMock(), num_workers=2) as service:
+        futures = [
+            service.submit("a"),
+            service.submit("b", priority=BACKFILL),
+        ]
+    assert [future.result(timeout=5) for future in futures] == [
+        ("A", INTERACTIVE), ("B", BACKFILL)]
+    assert mock_datareceiver.get_db_connection.call_count <= 2
+    stats = service.queue.get_stats()
+    assert stats[INTERACTIVE].waits == 1
+    assert stats[BACKFILL].waits == 1
+    assert stats[BACKFILL].in_progress == 0
+
+
+@mock.patch("faas.ingestionqueue.datareceiver", autospec=True)
+def test_ingestion_service_survives_connection_errors(mock_datareceiver):
+    mock_datareceiver.DuplicateTrackError = RuntimeError
+    mock_datareceiver.get_db_connection.side_effect = [
+        ConnectionError("DB is down"),
+        mock.MagicMock(closed=0),
+    ]
+    mock_datareceiver.ingest_object.return_value = "ingested"
+    with ingestionqueue.IngestionService(
+            _DB_PARAMS, mock.MagicMock(), num_workers=1) as service:
+        first = service.submit("a")
+        second = service.submit("b")
+    with pytest.raises(ConnectionError):
+        first.result(timeout=5)
+    assert second.result(timeout=5) == "ingested"
+    mock_datareceiver.get_db_connection.assert_called_with(**_DB_PARAMS)
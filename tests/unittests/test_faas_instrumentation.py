@@ -0,0 +1,54 @@
+#########################################################################
+#
+# Copyright 2018, GeoSolutions Sas.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+#
+#########################################################################
+
+import pytest
+
+from faas import instrumentation
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture
+def collector():
+    collector = instrumentation.MetricsCollector()
+    instrumentation.add_collector(collector)
+    yield collector
+    instrumentation.remove_collector(collector)
+
+
+def test_instrument_upload_records_stages(collector):
+    with instrumentation.instrument_upload("data.zip"):
+        with instrumentation.stage("download") as stage:
+            stage.bytes = 10
+        items = list(instrumentation.iter_stage("decode", "abc"))
+    assert items == ["a", "b", "c"]
+    records = collector.get_records()
+    assert [r.stage for r in records] == [
+        "download", "decode", instrumentation.TOTAL]
+    assert all(r.object_key == "data.zip" for r in records)
+    summary = collector.get_summary()
+    assert summary["download"].bytes == 10
+    assert summary["decode"].rows == 3
+
+
+def test_instrument_upload_records_failed_uploads(collector):
+    with pytest.raises(RuntimeError):
+        with instrumentation.instrument_upload("data.zip"):
+            with instrumentation.stage("download"):
+                raise RuntimeError()
+    assert [r.stage for r in collector.get_records()] == [
+        "download", instrumentation.TOTAL]
+
+
+def test_stages_outside_upload_are_not_recorded(collector):
+    with instrumentation.stage("download"):
+        pass
+    assert list(instrumentation.iter_stage("decode", "ab")) == ["a", "b"]
+    assert collector.get_records() == []
@@ -0,0 +1,109 @@
+#########################################################################
+#
+# Copyright 2018, GeoSolutions Sas.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+#
+#########################################################################
+
+from unittest import mock
+
+import numpy as np
+import pytest
+
+from faas import datareceiver
+from faas import metrics
+from faas._constants import VehicleType
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture(scope="module")
+def random_segments():
+    random_state = np.random.RandomState(42)
+    size = 2000
+    vehicle_types = random_state.choice(
+        [vehicle_type.value for vehicle_type in VehicleType], size)
+    lengths = random_state.uniform(0, 50, size)
+    durations = random_state.uniform(0.01, 3, size)
+    speeds = lengths / durations
+    # make sure speeds that match the calory steps exactly are covered
+    speeds[:50] = random_state.choice([0, 5.5, 6.5, 13, 19, 30, 100], 50)
+    return vehicle_types, lengths, durations, speeds
+
+
+def test_calculate_segment_metrics_matches_per_segment_functions(
+        random_segments):
+    vehicle_types, lengths, durations, speeds = random_segments
+    result = metrics.calculate_segment_metrics(
+        vehicle_types, lengths, durations, speeds)
+    for index, value in enumerate(vehicle_types):
+        vehicle_type = VehicleType(value)
+        expected = {}
+        expected.update(
+            datareceiver.calculate_emissions(vehicle_type, lengths[index]))
+        expected.update(
+            datareceiver.calculate_costs(
+                vehicle_type, lengths[index], durations[index]))
+        expected.update(
+            datareceiver.calculate_health(
+                vehicle_type, durations[index] * 60, speeds[index]))
+        for name, expected_value in expected.items():
+            assert result[name][index] == expected_value, (
+                name, vehicle_type)
+
+
+def test_calculate_segment_metrics_columns():
+    result = metrics.calculate_segment_metrics(
+        [VehicleType.car.value], [1], [1])
+    assert sorted(result.keys()) == sorted(
+        metrics.EMISSION_COLUMNS + metrics.COST_COLUMNS +
+        metrics.HEALTH_COLUMNS
+    )
+
+
+@mock.patch("faas.metrics.queries.registry", autospec=True)
+def test_insert_segment_metrics(mock_registry):
+    result = metrics.calculate_segment_metrics(
+        [VehicleType.bike.value, VehicleType.car.value], [1, 2], [1, 1])
+    metrics.insert_segment_metrics([10, 11], result, "fake_cursor")
+    mock_registry.execute_values.assert_called_once()
+    query_name, rows = mock_registry.execute_values.call_args[0][1:3]
+    assert query_name == "insert-segmentmetrics-values.sql"
+    assert [len(row) for row in rows] == [
+        len(metrics.SEGMENT_METRICS_COLUMNS) + 1] * 2
+    assert [row[-2:] for row in rows] == [
+        (result["calories_consumed"][0], 10), (0, 11)]
+
+
+@mock.patch("faas.metrics.queries.registry", autospec=True)
+def test_insert_segment_metrics_staging(mock_registry):
+    result = metrics.calculate_segment_metrics(
+        [VehicleType.bike.value], [1], [1])
+    metrics.insert_segment_metrics([10], result, "fake_cursor", staging=True)
+    query_name = mock_registry.execute_values.call_args[0][1]
+    assert query_name == "insert-staging-segmentmetrics-values.sql"
+
+
+def test_get_aggregated_metrics():
+    segment_metrics = metrics.calculate_segment_metrics(
+        vehicle_types=[VehicleType.car.value, VehicleType.bike.value],
+        lengths_km=[10, 2],
+        durations_hours=[0.25, 0.1],
+    )
+    result = metrics.get_aggregated_metrics(segment_metrics)
+    assert set(result["emissions"]) == set(metrics.EMISSION_COLUMNS)
+    assert set(result["costs"]) == set(metrics.COST_COLUMNS)
+    assert result["costs"]["time_cost"] == pytest.approx(
+        segment_metrics["time_cost"].sum())
+
+
+def test_get_aggregated_metrics_without_segments():
+    segment_metrics = metrics.calculate_segment_metrics([], [], [])
+    assert metrics.get_aggregated_metrics(segment_metrics) == {
+        "emissions": None,
+        "costs": None,
+        "health": None,
+    }
@@ -0,0 +1,112 @@
+#########################################################################
+#
+# Copyright 2018, GeoSolutions Sas.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+#
+#########################################################################
+
+import datetime as dt
+from unittest import mock
+
+import pytest
+
+from faas import partitions
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.mark.parametrize("month, months, expected", [
+    (dt.date(2019, 1, 1), 1, dt.date(2019, 2, 1)),
+    (dt.date(2019, 11, 1), 3, dt.date(2020, 2, 1)),
+    (dt.date(2019, 1, 1), -1, dt.date(2018, 12, 1)),
+])
+def test_add_months(month, months, expected):
+    assert partitions.add_months(month, months) == expected
+
+
+def test_iter_months():
+    result = list(
+        partitions.iter_months(dt.date(2018, 11, 20), dt.date(2019, 1, 1)))
+    assert result == [
+        dt.date(2018, 11, 1),
+        dt.date(2018, 12, 1),
+        dt.date(2019, 1, 1),
+    ]
+
+
+def test_partition_names():
+    name = partitions.get_partition_name(
+        "tracks_segment", dt.date(2019, 3, 1))
+    assert name == "tracks_segment_y2019m03"
+    assert partitions.get_partition_month(name) == dt.date(2019, 3, 1)
+    assert partitions.get_partition_month(
+        partitions.get_default_partition_name("tracks_segment")) is None
+
+
+def test_get_month_bounds():
+    assert partitions.get_month_bounds(dt.date(2019, 12, 1)) == (
+        "2019-12-01 00:00:00+00", "2020-01-01 00:00:00+00")
+
+
+def test_get_index_definition():
+    result = partitions.get_index_definition(
+        "CREATE INDEX tracks_collectedpoint_track_id_a1b2 ON "
+        "public.tracks_collectedpoint USING btree (track_id)",
+        "tracks_collectedpoint_partitioned"
+    )
+    assert result == (
+        "CREATE INDEX ON tracks_collectedpoint_partitioned "
+        "USING btree (track_id)"
+    )
+
+
+def test_get_table_rejects_unknown_tables():
+    with pytest.raises(RuntimeError):
+        partitions.get_table("tracks_track")
+
+
+def test_create_partition_skips_existing_partitions():
+    cursor = mock.MagicMock()
+    cursor.fetchone.return_value = (True,)
+    created = partitions.create_partition(
+        cursor,
+        partitions.get_table("tracks_segment"),
+        dt.date(2019, 1, 1)
+    )
+    assert not created
+    assert cursor.execute.call_count == 1
+
+
+def test_detach_partitions_before():
+    db_connection = mock.MagicMock()
+    cursor = db_connection.cursor.return_value.__enter__.return_value
+    cursor.fetchall.return_value = [
+        ("tracks_segment_default",),
+        ("tracks_segment_y2018m12",),
+        ("tracks_segment_y2019m01",),
+        ("tracks_segment_y2019m02",),
+    ]
+    detached = partitions.detach_partitions_before(
+        db_connection,
+        dt.date(2019, 2, 1),
+        drop=True,
+        table_names=["tracks_segment"]
+    )
+    assert detached == ["tracks_segment_y2018m12", "tracks_segment_y2019m01"]
+    # one query to list the partitions, then detach and drop each one
+    assert cursor.execute.call_count == 5
+
+
+def test_get_detached_partitions():
+    cursor = mock.MagicMock()
+    cursor.fetchall.return_value = [
+        ("tracks_collectedpoint_y2018m12",),
+        ("tracks_collectedpoint_yearly",),
+        ("tracks_collectedpointXy2019m01",),
+    ]
+    result = partitions.get_detached_partitions(
+        cursor, "tracks_collectedpoint")
+    assert result == ["tracks_collectedpoint_y2018m12"]
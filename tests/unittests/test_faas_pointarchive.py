@@ -0,0 +1,120 @@
+#########################################################################
+#
+# Copyright 2018, GeoSolutions Sas.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+#
+#########################################################################
+
+import datetime as dt
+
+import pytest
+import pytz
+
+from faas import pointarchive
+
+pytestmark = pytest.mark.unit
+
+_SEPTEMBER = dt.date(2018, 9, 1)
+
+
+def _get_row(point_id, timestamp, vehicle_type="bike", track_id=1):
+    sensors = [None] * (len(pointarchive.ARCHIVE_COLUMNS) - 9)
+    sensors[0] = 1.5
+    return (
+        point_id, track_id, timestamp, 11.25, 43.77, vehicle_type, None,
+        123, None, *sensors
+    )
+
+
+def test_write_and_read_part(tmpdir):
+    columns = pointarchive.get_columns([
+        _get_row(2, 1536000060000),
+        _get_row(1, 1536000000000, vehicle_type=None),
+    ])
+    assert pointarchive.write_part(tmpdir, _SEPTEMBER, "1", columns) == 2
+    paths = pointarchive.get_month_paths(tmpdir, _SEPTEMBER)
+    assert [path.name for path in paths] == ["collectedpoints_2018-09_1.npz"]
+    points = list(pointarchive.iter_points(pointarchive.read_part(paths[0])))
+    assert [p["id"] for p in points] == [1, 2]
+    assert points[0]["vehicle_type"] is None
+    assert points[1]["vehicle_type"] == "bike"
+    assert points[1]["vehicle_id"] is None
+    assert points[1]["sessionid"] == 123
+    assert points[1]["accelerationx"] == 1.5
+    assert points[1]["accelerationy"] is None
+    assert pointarchive.read_ids(paths[0]).tolist() == [1, 2]
+    assert pointarchive.get_archive_months(tmpdir) == [_SEPTEMBER]
+
+
+def test_write_part_replaces_existing_part(tmpdir):
+    pointarchive.write_part(
+        tmpdir, _SEPTEMBER, "1", pointarchive.get_columns([
+            _get_row(1, 1536000000000),
+        ])
+    )
+    pointarchive.write_part(
+        tmpdir, _SEPTEMBER, "1", pointarchive.get_columns([
+            _get_row(1, 1536000000000),
+            _get_row(3, 1535999990000),
+        ])
+    )
+    pointarchive.write_part(
+        tmpdir, _SEPTEMBER, "4", pointarchive.get_columns([
+            _get_row(4, 1536000060000),
+        ])
+    )
+    paths = pointarchive.get_month_paths(tmpdir, _SEPTEMBER)
+    assert [pointarchive.read_ids(path).tolist() for path in paths] == [
+        [3, 1], [4]]
+
+
+def test_remove_parts(tmpdir):
+    columns = pointarchive.get_columns([_get_row(1, 1536000000000)])
+    for part in ("p1", "p2", "3"):
+        pointarchive.write_part(tmpdir, _SEPTEMBER, part, columns)
+    assert pointarchive.remove_parts(tmpdir, _SEPTEMBER, "p") == 2
+    assert [p.name for p in pointarchive.get_month_paths(
+        tmpdir, _SEPTEMBER)] == ["collectedpoints_2018-09_3.npz"]
+
+
+def test_pending_part(tmpdir):
+    assert pointarchive.get_pending(tmpdir, _SEPTEMBER) is None
+    pointarchive.set_pending(tmpdir, _SEPTEMBER, "00000000000000000001")
+    assert pointarchive.get_pending(
+        tmpdir, _SEPTEMBER) == "00000000000000000001"
+    assert pointarchive.get_archive_months(tmpdir) == []
+    pointarchive.clear_pending(tmpdir, _SEPTEMBER)
+    assert pointarchive.get_pending(tmpdir, _SEPTEMBER) is None
+
+
+def test_get_filter_mask():
+    columns = pointarchive.get_columns([
+        _get_row(1, 1536000000000),
+        _get_row(2, 1536000060000, vehicle_type="car"),
+        _get_row(3, 1536000120000, track_id=2),
+        _get_row(4, 1536000180000, vehicle_type=None),
+    ])
+    start = dt.datetime(2018, 9, 3, 18, 41, tzinfo=pytz.utc)
+    mask = pointarchive.get_filter_mask(columns, start=start)
+    assert mask.tolist() == [False, True, True, True]
+    mask = pointarchive.get_filter_mask(columns, vehicle_types=["bike"])
+    assert mask.tolist() == [True, False, True, False]
+    mask = pointarchive.get_filter_mask(columns, track_ids=[2])
+    assert mask.tolist() == [False, False, True, False]
+
+
+def test_get_archive_months_within_range(tmpdir):
+    for month in (8, 9, 10):
+        pointarchive.write_part(
+            tmpdir, dt.date(2018, month, 1), "1",
+            pointarchive.get_columns([])
+        )
+    months = pointarchive.get_archive_months(
+        tmpdir,
+        start=dt.datetime(2018, 9, 15, tzinfo=pytz.utc),
+        end=dt.datetime(2018, 10, 2, tzinfo=pytz.utc)
+    )
+    assert months == [dt.date(2018, 9, 1), dt.date(2018, 10, 1)]
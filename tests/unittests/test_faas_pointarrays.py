@@ -0,0 +1,122 @@
+#########################################################################
+#
+# Copyright 2018, GeoSolutions Sas.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+#
+#########################################################################
+
+import datetime as dt
+import io
+import zipfile
+
+import numpy as np
+import pytest
+import pytz
+
+from faas import pointarrays
+from faas._constants import VehicleType
+
+pytestmark = pytest.mark.unit
+
+_HEADER = "sessionId,timeStamp,vehicleMode,longitude,latitude,humidity"
+
+
+def _get_zipped_track(*members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, mode="w") as zip_handler:
+        for index, lines in enumerate(members):
+            zip_handler.writestr(
+                "member{}.csv".format(index), "\r\n".join(lines) + "\r\n")
+    buffer.seek(0)
+    return buffer
+
+
+def test_read_track_data_file_uses_member_headers():
+    data_file = _get_zipped_track(
+        [
+            _HEADER,
+            "123,1535788801000,2,11.25,43.77,50",
+            "123,1535788802000,4,11.26,43.78,",
+        ],
+        [
+            "latitude,longitude,timeStamp,sessionId,vehicleMode",
+            "43.79,11.27,1535788800000,123,9",
+        ]
+    )
+    points = pointarrays.read_track_data_file(data_file)
+    assert len(points) == 3
+    assert points.timestamps.tolist() == [
+        1535788801000, 1535788802000, 1535788800000]
+    assert points.coordinates.tolist() == [
+        [11.25, 43.77], [11.26, 43.78], [11.27, 43.79]]
+    assert points.vehicle_types.tolist() == [
+        VehicleType.bike.value, VehicleType.car.value,
+        VehicleType.unknown.value
+    ]
+    humidity = points.sensors["humidity"]
+    assert humidity[0] == 50
+    assert np.isnan(humidity[1:]).all()
+    assert points.get_session_id() == "123"
+    assert points.get_start_date() == dt.datetime(
+        2018, 9, 1, 8, tzinfo=pytz.utc)
+    assert points.get_duration_minutes() == pytest.approx(2 / 60)
+    assert [s.vehicle_type for s in points.get_segments()] == [
+        VehicleType.unknown, VehicleType.bike, VehicleType.car]
+
+
+def test_parse_lines_requires_coordinates():
+    with pytest.raises(RuntimeError):
+        pointarrays.parse_lines("sessionId,timeStamp,vehicleMode", [])
+
+
+def test_get_copy_data():
+    points = pointarrays.parse_lines(
+        _HEADER, ["123,1536000000000,2,11.25,43.77,1.5"])
+    fields = points.get_copy_data(1).split("\t")
+    assert len(fields) == len(pointarrays.SENSOR_FIELDS) + 5
+    assert fields[:3] == ["bike", "1", "SRID=4326;POINT(11.25 43.77)"]
+    assert fields[3] == r"\N"
+    assert fields[14] == "1.5"
+    assert fields[-2] == "123"
+    assert fields[-1] == "2018-09-03T18:40:00.000Z\n"
+
+
+def test_nbytes():
+    points = pointarrays.parse_lines(
+        _HEADER, ["123,1536000000000,2,11.25,43.77,1.5"] * 10)
+    per_point = points.nbytes / len(points)
+    assert per_point == 8 + 16 + 1 + 8 + 8 * len(pointarrays.SENSOR_FIELDS)
+
+
+def test_iter_parsed_chunks():
+    lines = [
+        "123,{},2,11.25,43.77,".format(1536000000000 + index * 1000)
+        for index in range(5)
+    ]
+    chunks = list(pointarrays.iter_parsed_chunks(_HEADER, lines, 2))
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    points = pointarrays.parse_lines(_HEADER, lines)
+    assert points.timestamps.tolist() == [
+        1536000000000 + index * 1000 for index in range(5)]
+
+
+def test_pack_points():
+    lines = [
+        "123,{},2,11.25,43.{},{}".format(
+            1536000000000 + index * 1000, 770 + index, index % 3 or "")
+        for index in range(100)
+    ]
+    points = pointarrays.parse_lines(_HEADER, lines)
+    packed = pointarrays.pack_points(points)
+    assert len(packed) < points.nbytes / 10
+    unpacked = pointarrays.unpack_points(packed)
+    assert unpacked.timestamps.tolist() == points.timestamps.tolist()
+    assert unpacked.coordinates.tolist() == points.coordinates.tolist()
+    assert unpacked.vehicle_types.tolist() == points.vehicle_types.tolist()
+    assert unpacked.session_ids.tolist() == points.session_ids.tolist()
+    for column, _ in pointarrays.SENSOR_FIELDS:
+        np.testing.assert_array_equal(
+            unpacked.sensors[column], points.sensors[column])
@@ -0,0 +1,95 @@
+#########################################################################
+#
+# Copyright 2018, GeoSolutions Sas.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+#
+#########################################################################
+
+from unittest import mock
+
+import pytest
+
+from faas import pointarrays
+from faas import pointfilter
+
+pytestmark = pytest.mark.unit
+
+_HEADER = "sessionId,timeStamp,vehicleMode,longitude,latitude,accuracy"
+
+
+def _get_filter():
+    return pointfilter.PointFilter(
+        max_accuracy=50,
+        min_interval=1,
+        min_distance=5,
+        max_stationary_interval=30
+    )
+
+
+@pytest.mark.parametrize("points, expected", [
+    pytest.param(
+        [(0, 11.25, 43.77, 2, 10), (1000, 11.26, 43.77, 2, 100)],
+        [True, False],
+        id="low accuracy"
+    ),
+    pytest.param(
+        [(0, 11.25, 43.77, 2, 10), (0, 11.25, 43.77, 2, 10)],
+        [True, False],
+        id="duplicate"
+    ),
+    pytest.param(
+        [(0, 11.25, 43.77, 2, None), (500, 11.26, 43.77, 2, None)],
+        [True, False],
+        id="over-sampled"
+    ),
+    pytest.param(
+        [
+            (0, 11.25, 43.77, 2, None),
+            (10000, 11.25001, 43.77, 2, None),
+            (30000, 11.25002, 43.77, 2, None),
+        ],
+        [True, False, True],
+        id="stationary"
+    ),
+    pytest.param(
+        [(0, 11.25, 43.77, 2, None), (500, 11.25, 43.77, 4, None)],
+        [True, True],
+        id="vehicle change"
+    ),
+])
+def test_point_filter(points, expected):
+    point_filter = _get_filter()
+    assert [point_filter.accept(*point) for point in points] == expected
+    assert point_filter.accepted == expected.count(True)
+
+
+def test_point_filter_remembers_a_bounded_window():
+    point_filter = pointfilter.PointFilter(duplicate_window=2)
+    points = [(index * 1000, 11.25 + index, 43.77, 2, None)
+              for index in range(3)]
+    assert all(point_filter.accept(*point) for point in points)
+    assert not point_filter.accept(*points[-1])
+    # the first point is no longer in the window
+    assert point_filter.accept(*points[0])
+    assert len(point_filter._recent) == 2
+
+
+def test_get_filter_mask():
+    track_points = pointarrays.parse_lines(_HEADER, [
+        "123,0,2,11.25,43.77,10",
+        "123,0,2,11.25,43.77,10",
+        "123,2000,2,11.26,43.77,",
+    ])
+    mask = pointfilter.get_filter_mask(track_points, _get_filter())
+    assert mask.tolist() == [True, False, True]
+    assert len(track_points.select(mask)) == 2
+
+
+@mock.patch("faas.pointfilter._settings")
+def test_get_point_filter_disabled(mock_settings):
+    mock_settings.FILTER_POINTS = False
+    assert pointfilter.get_point_filter() is None
+    assert list(pointfilter.filter_points([1, 2], None)) == [1, 2]
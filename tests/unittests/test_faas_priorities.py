@@ -0,0 +1,49 @@
+#########################################################################
+#
+# Copyright 2018, GeoSolutions Sas.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+#
+#########################################################################
+
+from unittest import mock
+
+import pytest
+
+from faas import priorities
+
+pytestmark = pytest.mark.unit
+
+
+def _get_executed(mock_registry):
+    return [c[0][1] for c in mock_registry.execute.call_args_list]
+
+
+@mock.patch("faas.priorities.queries.registry", autospec=True)
+def test_interactive_slot_holds_lock(mock_registry):
+    connection = mock.MagicMock(closed=0)
+    with priorities.ingestion_slot(priorities.INTERACTIVE, connection):
+        assert _get_executed(mock_registry) == [
+            "lock-interactive-ingestion.sql"]
+    assert _get_executed(mock_registry)[-1] == (
+        "unlock-interactive-ingestion.sql")
+
+
+@mock.patch("faas.priorities.time.sleep", autospec=True)
+@mock.patch("faas.priorities.queries.registry", autospec=True)
+def test_backfill_slot_waits_for_interactive(mock_registry, mock_sleep):
+    connection = mock.MagicMock(closed=0)
+    cursor = connection.cursor.return_value.__enter__.return_value
+    cursor.fetchone.side_effect = [(2,), (1,), (0,)]
+    with priorities.ingestion_slot(priorities.BACKFILL, connection):
+        assert mock_sleep.call_count == 2
+    assert set(_get_executed(mock_registry)) == {
+        "get-interactive-ingestions.sql"}
+
+
+def test_invalid_priority():
+    with pytest.raises(RuntimeError):
+        with priorities.ingestion_slot("urgent", mock.MagicMock()):
+            pass
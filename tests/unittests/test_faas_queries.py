@@ -0,0 +1,75 @@
+#########################################################################
+#
+# Copyright 2018, GeoSolutions Sas.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+#
+#########################################################################
+
+import pathlib
+from unittest import mock
+
+import pytest
+
+from faas import queries
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture
+def query_registry(tmpdir):
+    tmpdir.join("get-thing.sql").write(
+        "SELECT * FROM thing WHERE id = %(thing_id)s OR parent = %(thing_id)s")
+    tmpdir.join("insert-thing.sql").write(
+        "INSERT INTO thing (name, size) VALUES (%s, %s)")
+    tmpdir.join("insert-things.sql").write(
+        "INSERT INTO thing (name, size) VALUES %s")
+    return queries.QueryRegistry(
+        pathlib.Path(str(tmpdir)), prepare=True)
+
+
+def test_query_with_named_parameters(query_registry):
+    query = query_registry._get_query("get-thing.sql")
+    assert query.prepare_sql == (
+        "PREPARE smb_get_thing AS "
+        "SELECT * FROM thing WHERE id = $1 OR parent = $1"
+    )
+    assert query.execute_sql == "EXECUTE smb_get_thing (%(thing_id)s)"
+
+
+def test_query_with_positional_parameters(query_registry):
+    query = query_registry._get_query("insert-thing.sql")
+    assert query.prepare_sql == (
+        "PREPARE smb_insert_thing AS "
+        "INSERT INTO thing (name, size) VALUES ($1, $2)"
+    )
+    assert query.execute_sql == "EXECUTE smb_insert_thing (%s, %s)"
+
+
+def test_bulk_query_is_not_prepared(query_registry):
+    assert not query_registry._get_query("insert-things.sql").is_preparable
+
+
+def test_execute_prepares_once_per_connection(query_registry):
+    cursor = mock.MagicMock()
+    other_cursor = mock.MagicMock()
+    params = {"thing_id": 1}
+    query_registry.execute(cursor, "get-thing.sql", params)
+    query_registry.execute(cursor, "get-thing.sql", params)
+    query_registry.execute(other_cursor, "get-thing.sql", params)
+    prepare_call = mock.call(
+        query_registry._get_query("get-thing.sql").prepare_sql)
+    execute_call = mock.call(
+        "EXECUTE smb_get_thing (%(thing_id)s)", params)
+    assert cursor.execute.call_args_list == [
+        prepare_call, execute_call, execute_call]
+    assert other_cursor.execute.call_args_list == [
+        prepare_call, execute_call]
+    assert query_registry.get_stats()["get-thing.sql"].calls == 3
+
+
+def test_unknown_query(query_registry):
+    with pytest.raises(RuntimeError):
+        query_registry.get("fake.sql")
@@ -0,0 +1,82 @@
+#########################################################################
+#
+# Copyright 2018, GeoSolutions Sas.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+#
+#########################################################################
+
+import struct
+
+import numpy as np
+import pytest
+
+from faas import segmentation
+from faas._constants import VehicleType
+
+pytestmark = pytest.mark.unit
+
+
+def _get_degrees(degrees, minutes, seconds):
+    sign = -1 if degrees < 0 else 1
+    return sign * (abs(degrees) + minutes / 60 + seconds / 3600)
+
+
+def test_get_geodesic_distances():
+    # Flinders Peak to Buninyong, the example used in Vincenty's paper
+    result = segmentation.get_geodesic_distances(
+        [_get_degrees(144, 25, 29.52440)],
+        [_get_degrees(-37, 57, 3.72030)],
+        [_get_degrees(143, 55, 35.38390)],
+        [_get_degrees(-37, 39, 10.15610)],
+    )
+    assert result[0] == pytest.approx(54972.271, abs=0.001)
+
+
+def test_get_geodesic_distances_coincident_points():
+    result = segmentation.get_geodesic_distances([11.25], [0], [11.25], [0])
+    assert result[0] == 0
+
+
+def test_get_segments_splits_by_vehicle_type():
+    result = segmentation.get_segments(
+        timestamps=np.array([0, 1000, 2000, 3000, 4000]),
+        coordinates=np.array([
+            [11.25, 43.77],
+            [11.26, 43.77],
+            [11.27, 43.77],
+            [11.28, 43.77],
+            [11.29, 43.77],
+        ]),
+        vehicle_types=np.array([
+            VehicleType.bike.value,
+            VehicleType.bike.value,
+            VehicleType.car.value,
+            VehicleType.car.value,
+            VehicleType.bike.value,
+        ])
+    )
+    assert [s.vehicle_type for s in result] == [
+        VehicleType.bike, VehicleType.car, VehicleType.bike]
+    assert [(s.start_timestamp, s.end_timestamp) for s in result] == [
+        (0, 1000), (2000, 3000), (4000, 4000)]
+    assert result[0].length_km == pytest.approx(0.805, abs=0.001)
+    assert result[0].duration_hours == pytest.approx(1 / 3600)
+    # single point segments get a zero length line
+    assert result[2].coordinates.tolist() == [[11.29, 43.77]] * 2
+    assert result[2].length_km == 0
+    assert result[2].speed_km_h == 0
+
+
+def test_get_segments_without_points():
+    result = segmentation.get_segments(
+        np.array([]), np.empty((0, 2)), np.array([]))
+    assert result == []
+
+
+def test_get_linestring_wkb():
+    result = segmentation.get_linestring_wkb(
+        np.array([[1.0, 2.0], [3.0, 4.0]]))
+    assert struct.unpack("<BII4d", result) == (1, 2, 2, 1.0, 2.0, 3.0, 4.0)
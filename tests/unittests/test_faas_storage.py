@@ -0,0 +1,116 @@
+#########################################################################
+#
+# Copyright 2018, GeoSolutions Sas.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+#
+#########################################################################
+
+import io
+import pathlib
+import pickle
+from unittest import mock
+import zipfile
+
+import pytest
+
+from faas import storage
+
+pytestmark = pytest.mark.unit
+
+
+def test_local_storage_open(tmpdir):
+    tmpdir.mkdir("cognito").join("data.zip").write_binary(b"data")
+    local_storage = storage.LocalStorage(str(tmpdir))
+    with local_storage.open("cognito/data.zip") as data_file:
+        assert data_file.read() == b"data"
+
+
+def test_local_storage_get_metadata(tmpdir):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, mode="w") as zip_handler:
+        zip_handler.writestr(
+            "data.csv",
+            "timeStamp,sessionId,latitude\r\n1535788800000,123,43.77\r\n"
+        )
+    tmpdir.join("data.zip").write_binary(buffer.getvalue())
+    local_storage = storage.LocalStorage(str(tmpdir))
+    result = local_storage.get_metadata("data.zip")
+    assert result.size == len(buffer.getvalue())
+    assert result.content_hash.startswith("local-")
+    assert result.session_id == "123"
+    assert local_storage.get_metadata("data.zip") == result
+    tmpdir.join("data.zip").setmtime(0)
+    assert local_storage.get_metadata("data.zip") != result
+
+
+def test_local_storage_get_metadata_of_invalid_file(tmpdir):
+    tmpdir.join("data.zip").write_binary(b"data")
+    local_storage = storage.LocalStorage(str(tmpdir))
+    result = local_storage.get_metadata("data.zip")
+    assert result.size == 4
+    assert result.session_id is None
+
+
+@mock.patch("faas.storage._settings")
+def test_get_storage_local(mock_settings, tmpdir):
+    mock_settings.LOCAL_STORAGE_ROOT = str(tmpdir)
+    result = storage.get_storage("bucket", backend=storage.LOCAL)
+    assert isinstance(result, storage.LocalStorage)
+    assert result.root == pathlib.Path(str(tmpdir)) / "bucket"
+
+
+def test_get_storage_s3():
+    result = storage.get_storage("bucket", backend=storage.S3)
+    assert isinstance(result, storage.S3Storage)
+    assert result.bucket_name == "bucket"
+
+
+def test_get_storage_invalid_backend():
+    with pytest.raises(RuntimeError):
+        storage.get_storage("bucket", backend="fake")
+
+
+@mock.patch("faas.storage._settings")
+@mock.patch("faas.storage.boto3", autospec=True)
+def test_s3_storage_open(mock_boto3, mock_settings):
+    mock_settings.MAX_IN_MEMORY_DOWNLOAD_SIZE = 100
+    mock_settings.DOWNLOAD_CHUNK_SIZE = 2
+    mock_object = mock_boto3.resource.return_value.Object.return_value
+    mock_object.get.return_value = {
+        "ContentLength": 4,
+        "Body": io.BytesIO(b"data"),
+    }
+    s3_storage = storage.S3Storage("bucket")
+    with s3_storage.open("key") as data_file:
+        assert data_file.read() == b"data"
+    mock_boto3.resource.return_value.Object.assert_called_with(
+        "bucket", "key")
+
+
+@mock.patch("faas.storage.boto3", autospec=True)
+def test_s3_storage_get_metadata(mock_boto3):
+    mock_client = mock_boto3.resource.return_value.meta.client
+    mock_client.head_object.return_value = {
+        "ContentLength": 4,
+        "ETag": '"8d777f385d3dfec8815d20f7496026dc"',
+        "Metadata": {"session-id": "123"},
+    }
+    result = storage.S3Storage("bucket").get_metadata("data.zip")
+    mock_client.head_object.assert_called_with(
+        Bucket="bucket", Key="data.zip")
+    assert result == storage.ObjectMetadata(
+        size=4,
+        content_hash="8d777f385d3dfec8815d20f7496026dc",
+        session_id="123"
+    )
+
+
+def test_s3_storage_can_be_pickled():
+    s3_storage = storage.S3Storage("bucket")
+    s3_storage._local.resource = mock.MagicMock()
+    unpickled = pickle.loads(pickle.dumps(s3_storage))
+    assert unpickled.bucket_name == "bucket"
+    assert getattr(unpickled._local, "resource", None) is None
@@ -0,0 +1,112 @@
+#########################################################################
+#
+# Copyright 2018, GeoSolutions Sas.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+#
+#########################################################################
+
+import numpy as np
+import pytest
+
+from faas import validation
+from faas._constants import VehicleType
+
+pytestmark = pytest.mark.unit
+
+
+def _get_track(num_points=61, step_seconds=10, step_degrees=0.0001,
+               vehicle_type=VehicleType.bike):
+    """Return a track going east along a parallel at a constant speed"""
+    timestamps = np.arange(num_points, dtype=np.int64) * step_seconds * 1000
+    coordinates = np.column_stack((
+        11.25 + np.arange(num_points) * step_degrees,
+        np.full(num_points, 43.77)
+    ))
+    vehicle_types = np.full(num_points, vehicle_type.value, dtype=np.int8)
+    return timestamps, coordinates, vehicle_types
+
+
+def test_valid_track():
+    timestamps, coordinates, vehicle_types = _get_track()
+    assert validation.get_validation_error(
+        timestamps, coordinates, vehicle_types,
+        accuracies=np.full(len(timestamps), 10.0)
+    ) is None
+
+
+def test_too_few_points():
+    timestamps, coordinates, vehicle_types = _get_track(num_points=1)
+    error = validation.get_validation_error(
+        timestamps, coordinates, vehicle_types)
+    assert error == "Track has 1 points, at least 2 are needed"
+
+
+def test_short_track():
+    timestamps, coordinates, vehicle_types = _get_track(num_points=3)
+    error = validation.get_validation_error(
+        timestamps, coordinates, vehicle_types)
+    assert error.split("; ") == [
+        "Track lasts 20 s, the minimum is 60 s",
+        "Track is 16 m long, the minimum is 100 m",
+    ]
+
+
+def test_implausible_speed():
+    # about 29 km/h on foot
+    timestamps, coordinates, vehicle_types = _get_track(
+        step_seconds=1, step_degrees=0.0001, vehicle_type=VehicleType.foot)
+    timestamps = timestamps * 10
+    coordinates[:, 0] = 11.25 + (coordinates[:, 0] - 11.25) * 10
+    error = validation.get_validation_error(
+        timestamps, coordinates, vehicle_types)
+    assert error == (
+        "Average speed of foot segment is 29 km/h, the maximum is 20 km/h")
+
+
+def test_gps_jump():
+    timestamps, coordinates, vehicle_types = _get_track()
+    coordinates[30:, 0] += 1
+    vehicle_types[:] = VehicleType.unknown.value
+    error = validation.get_validation_error(
+        timestamps, coordinates, vehicle_types)
+    assert error == "Track has 1 GPS jumps"
+
+
+def test_low_accuracy():
+    timestamps, coordinates, vehicle_types = _get_track()
+    accuracies = np.full(len(timestamps), 100.0)
+    accuracies[:10] = np.nan
+    error = validation.get_validation_error(
+        timestamps, coordinates, vehicle_types, accuracies=accuracies)
+    assert error == "Median GPS accuracy is 100 m, the maximum is 50 m"
+
+
+def test_low_median_accuracy():
+    timestamps, coordinates, vehicle_types = _get_track()
+    error = validation.get_validation_error(
+        timestamps, coordinates, vehicle_types, median_accuracy=100.0)
+    assert error == "Median GPS accuracy is 100 m, the maximum is 50 m"
+
+
+def test_accuracy_histogram():
+    histogram = validation.AccuracyHistogram()
+    assert histogram.get_median() is None
+    for accuracy in [np.nan, 3.2, 10.0, 12.0, 5000.0, 200.0]:
+        histogram.add(accuracy)
+    assert len(histogram) == 5
+    assert histogram.get_median() == 12
+    histogram.add(2000.0)
+    histogram.add(300.0)
+    assert histogram.get_median() == 200
+
+
+def test_non_monotonic_timestamps():
+    timestamps, coordinates, vehicle_types = _get_track()
+    shuffled = np.random.RandomState(0).permutation(len(timestamps))
+    error = validation.get_validation_error(
+        timestamps[shuffled], coordinates[shuffled], vehicle_types[shuffled])
+    assert error.endswith(
+        "of 61 timestamps are earlier than the previous one")
@@ -0,0 +1,73 @@
+#########################################################################
+#
+# Copyright 2018, GeoSolutions Sas.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+#
+#########################################################################
+
+from unittest import mock
+
+import pytest
+
+from faas import workerpool
+
+pytestmark = pytest.mark.unit
+
+
+def _get_result(worker, status, num_points=0, seconds=1.0):
+    return workerpool.TaskResult(
+        worker=worker,
+        object_key="fake",
+        status=status,
+        track_id=None,
+        num_points=num_points,
+        num_segments=1 if status == workerpool.INGESTED else 0,
+        seconds=seconds,
+        error=None
+    )
+
+
+def test_get_worker_reports():
+    results = [
+        _get_result("worker-1", workerpool.INGESTED, num_points=100),
+        _get_result("worker-1", workerpool.DUPLICATE, seconds=0.5),
+        _get_result("worker-2", workerpool.INGESTED, num_points=50),
+        _get_result("worker-2", workerpool.FAILED, seconds=1.5),
+    ]
+    first, second = workerpool.get_worker_reports(results)
+    assert first.worker == "worker-1"
+    assert (first.tracks, first.duplicates, first.failures) == (1, 1, 0)
+    assert first.points == 100
+    assert first.points_per_second == pytest.approx(100 / 1.5)
+    assert (second.tracks, second.duplicates, second.failures) == (1, 0, 1)
+    assert second.segments == 1
+    assert second.points_per_second == pytest.approx(50 / 2.5)
+
+
+def test_format_report():
+    results = [_get_result("worker-1", workerpool.INGESTED, num_points=10)]
+    report = workerpool.PoolReport(
+        workers=workerpool.get_worker_reports(results),
+        results=results,
+        seconds=2
+    )
+    formatted = workerpool.format_report(report)
+    assert formatted.splitlines()[-1] == (
+        "Total: 1 objects, 10 points in 2.00s (5 points/s)")
+
+
+@mock.patch("faas.workerpool.datareceiver.get_db_connection", autospec=True)
+def test_ingest_object_reports_connection_errors(mock_get_db_connection):
+    mock_get_db_connection.side_effect = ConnectionError("DB is down")
+    workerpool._init_worker(
+        {"dbname": "smb", "user": "smb", "password": "smb"},
+        mock.MagicMock(),
+        "interactive"
+    )
+    mock_get_db_connection.assert_not_called()
+    result = workerpool._ingest_object("fake")
+    assert result.status == workerpool.FAILED
+    assert result.error == "DB is down"
@@ -0,0 +1,48 @@
+#########################################################################
+#
+# Copyright 2019, GeoSolutions Sas.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+#
+#########################################################################
+
+from unittest import mock
+
+import pytest
+from rest_framework import serializers as drf_serializers
+from rest_framework.request import Request
+
+from tracks import models
+from tracks.api import serializers
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.mark.parametrize("query_params, expected", [
+    ({}, models.FULL_RESOLUTION),
+    ({"resolution": "medium"}, models.MEDIUM_RESOLUTION),
+    ({"resolution": "low"}, models.LOW_RESOLUTION),
+])
+def test_get_geometry_resolution(api_request_factory, query_params,
+                                 expected):
+    request = Request(api_request_factory.get("/", query_params))
+    result = serializers.get_geometry_resolution({"request": request})
+    assert result == expected
+
+
+def test_get_geometry_resolution_invalid(api_request_factory):
+    request = Request(api_request_factory.get("/", {"resolution": "fake"}))
+    with pytest.raises(drf_serializers.ValidationError):
+        serializers.get_geometry_resolution({"request": request})
+
+
+@pytest.mark.parametrize("geom_low, expected", [
+    ("low", "low"),
+    (None, "full"),
+])
+def test_segment_get_geom_falls_back_to_full_resolution(geom_low, expected):
+    segment = mock.MagicMock(geom="full", geom_low=geom_low)
+    result = models.Segment.get_geom(segment, models.LOW_RESOLUTION)
+    assert result == expected